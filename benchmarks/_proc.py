@@ -0,0 +1,21 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Helpers to read process statistics from /proc, shared by the benchmarks (Linux only).
+
+import os
+
+
+def get_cpu_time(pid):
+    """
+    returns user + system CPU time (in s) used by the process pid so far.
+    """
+    with open(f"/proc/{pid}/stat") as stat_file:
+        # The process name can contain spaces, the interesting fields come after it.
+        fields = stat_file.read().rsplit(")", 1)[1].split()
+    (utime, stime) = (int(fields[11]), int(fields[12]))
+    return (utime + stime) / os.sysconf("SC_CLK_TCK")
@@ -0,0 +1,91 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Measures the per frame cost of the display filters (see filters.py): the brightness
+## adjustment the display process used to do with ImageEnhance, the same brightness through a
+## lookup table, apply_filters for the brightness alone and with the full filter chain, and a
+## FilteredImageCache hit.
+## Run with:
+##     python benchmarks/filters.py [--frames 500]
+
+from os import path
+import argparse
+import sys
+import time
+
+_REPO_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, _REPO_ROOT)
+
+from filters import (
+    FilteredImageCache,
+    FilterSettings,
+    apply_filters,
+    apply_lut,
+    build_lut,
+)
+from PIL import Image, ImageEnhance
+import numpy as np
+
+_BRIGHTNESS = 0.4
+_NIGHT_FILTERS = FilterSettings(gain=(1.0, 0.9, 0.85), gamma=1.2, color_temperature=3400)
+
+
+def _image_enhance(img):
+    return ImageEnhance.Brightness(img.convert("RGBA")).enhance(_BRIGHTNESS).convert("RGB")
+
+
+def _lut_brightness(img):
+    return apply_lut(img, build_lut(FilterSettings(), _BRIGHTNESS))
+
+
+def _filters_brightness(img):
+    return apply_filters(img, FilterSettings(), _BRIGHTNESS)
+
+
+def _filters(img):
+    return apply_filters(img, _NIGHT_FILTERS, _BRIGHTNESS)
+
+
+def measure(filter_fn, images):
+    """
+    returns the mean time (in ms) filter_fn takes per image.
+    """
+    start = time.perf_counter()
+    for img in images:
+        filter_fn(img)
+    return 1000 * (time.perf_counter() - start) / len(images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the per frame cost of filters.")
+    parser.add_argument("--frames", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = [
+        Image.fromarray(rng.integers(0, 256, (32, 64, 3), dtype=np.uint8))
+        for _ in range(args.frames)
+    ]
+
+    cache = FilteredImageCache(len(images))
+    filter_state = (_BRIGHTNESS, _NIGHT_FILTERS)
+    for img in images:
+        cache.put(img, filter_state, _filters(img))
+
+    results = {
+        "ImageEnhance brightness": measure(_image_enhance, images),
+        "LUT brightness": measure(_lut_brightness, images),
+        "apply_filters brightness": measure(_filters_brightness, images),
+        "apply_filters + filters": measure(_filters, images),
+        "cache hit": measure(lambda img: cache.get(img, filter_state), images),
+    }
+    for name, ms in results.items():
+        print(f"{name:<26} {ms:>8.4f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
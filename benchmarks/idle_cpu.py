@@ -0,0 +1,85 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Measures CPU used by the display process at 0 brightness, with and without idle mode.
+## Uses the headless display backend, so it runs without the panel (Linux only). Run with:
+##     python benchmarks/idle_cpu.py [--seconds 20]
+##
+## On the Pi, rgbmatrix's refresh thread adds a constant load in both cases, which this
+## benchmark doesn't capture.
+
+from os import path
+import argparse
+import sys
+import tempfile
+import time
+
+_REPO_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, _REPO_ROOT)
+
+from _proc import get_cpu_time
+from PIL import Image
+from display_controller import DisplayControllerDelegator
+
+_SETTLE_TIME = 1  # time (in s) to let the display process settle before measuring
+
+
+def _create_animation(output_path, frame_ms):
+    frames = [
+        Image.new("RGB", (64, 32), color)
+        for color in [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+    ]
+    frames[0].save(
+        output_path,
+        save_all=True,
+        append_images=frames[1:],
+        duration=frame_ms,
+        loop=0,
+    )
+
+
+def measure(animation_path, idle_at_zero_brightness, seconds):
+    """
+    returns CPU time (in s) the display process used over seconds, at 0 brightness.
+    """
+    with DisplayControllerDelegator(
+        idle_at_zero_brightness=idle_at_zero_brightness, backend="headless"
+    ) as display_controller:
+        display_controller.queue_gif_to_display(animation_path, "animation")
+        display_controller.set_brightness(0)
+        time.sleep(_SETTLE_TIME)
+
+        pid = display_controller.get_display_pid()
+        start = get_cpu_time(pid)
+        time.sleep(seconds)
+        return get_cpu_time(pid) - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures display process CPU at 0 brightness."
+    )
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument(
+        "--frame-ms", type=int, default=100, help="frame duration of the animation shown"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        animation_path = path.join(tmp_dir, "animation.gif")
+        _create_animation(animation_path, args.frame_ms)
+
+        busy = measure(animation_path, False, args.seconds)
+        idle = measure(animation_path, True, args.seconds)
+
+    print(f"{'mode':<20} {'cpu s':>8} {'cpu %':>8}")
+    for mode, cpu_time in [("previous behaviour", busy), ("idle mode", idle)]:
+        print(f"{mode:<20} {cpu_time:>8.3f} {100 * cpu_time / args.seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Measures the render host / display agent split with both ends on this machine: how many
+## scenes per second RemoteDisplay can decode, encode and send, how many bytes each scene takes
+## on the wire, and how much CPU display_agent.py (and its display process) uses to draw them.
+## The agent uses the headless display backend, so no panel is needed (Linux only). Run with:
+##     python benchmarks/remote_display.py [--transport tcp|unix] [--scenes 200] [--seconds 20]
+
+from os import path
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+_REPO_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, _REPO_ROOT)
+
+from _proc import get_cpu_time
+from PIL import Image, ImageDraw
+from remote_display import RemoteDisplay
+
+_TCP_ADDRESS = "127.0.0.1:9091"
+_SETTLE_TIME = 1  # time (in s) to let the agent catch up before and after measuring
+_DISTINCT_SCENES = 60  # number of different scenes to cycle through
+
+
+def _get_agent_cpu_time(agent_pid):
+    """
+    returns CPU time (in s) used so far by the agent and its display process.
+    """
+    cpu_time = get_cpu_time(agent_pid)
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/stat") as stat_file:
+                parent_pid = int(stat_file.read().rsplit(")", 1)[1].split()[1])
+            if parent_pid == agent_pid:
+                cpu_time += get_cpu_time(pid)
+        except (FileNotFoundError, ProcessLookupError):
+            # Process exited while listing
+            pass
+    return cpu_time
+
+
+def _create_scenes(output_dir, frame_count):
+    """
+    Creates clock like animations: every scene, and every frame in it, differs from the last
+    in a few characters.
+    returns the paths of the animations created.
+    """
+    scene_paths = []
+    for scene_index in range(_DISTINCT_SCENES):
+        frames = []
+        for frame_index in range(frame_count):
+            img = Image.new("RGB", (64, 32))
+            draw = ImageDraw.Draw(img)
+            draw.text((4, 4), f"12:{scene_index:02}", fill=(255, 200, 0))
+            draw.text((4, 18), f"frame {frame_index}", fill=(0, 160, 255))
+            frames.append(img)
+
+        scene_path = path.join(output_dir, f"scene{scene_index}.gif")
+        frames[0].save(
+            scene_path, save_all=True, append_images=frames[1:], duration=100, loop=0
+        )
+        scene_paths.append(scene_path)
+    return scene_paths
+
+
+def _queue_scene(remote_display, scene_paths, index):
+    # Unique hash for every scene queued, so none is skipped as unchanged
+    remote_display.queue_gif_to_display(
+        scene_paths[index % len(scene_paths)], f"scene{index}", index
+    )
+
+
+def measure_burst(remote_display, agent_pid, scene_paths, scene_count):
+    """
+    Sends scene_count scenes as fast as possible.
+    returns (scenes per second, agent CPU time (in s) used to receive them)
+    """
+    cpu_start = _get_agent_cpu_time(agent_pid)
+    start = time.perf_counter()
+    for index in range(scene_count):
+        _queue_scene(remote_display, scene_paths, index)
+    elapsed = time.perf_counter() - start
+
+    time.sleep(_SETTLE_TIME)
+    return (scene_count / elapsed, _get_agent_cpu_time(agent_pid) - cpu_start)
+
+
+def measure_steady(remote_display, agent_pid, scene_paths, seconds, interval):
+    """
+    Sends a scene every interval seconds, for seconds.
+    returns CPU time (in s) used by the agent over seconds.
+    """
+    cpu_start = _get_agent_cpu_time(agent_pid)
+    start = time.perf_counter()
+    index = 0
+    while time.perf_counter() - start < seconds:
+        _queue_scene(remote_display, scene_paths, index)
+        index += 1
+        time.sleep(max(0, start + index * interval - time.perf_counter()))
+    return _get_agent_cpu_time(agent_pid) - cpu_start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures scene throughput, bandwidth and agent CPU over loopback."
+    )
+    parser.add_argument("--transport", choices=["tcp", "unix"], default="tcp")
+    parser.add_argument(
+        "--scenes", type=int, default=200, help="scenes sent in the burst phase"
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=20, help="length of the steady phase"
+    )
+    parser.add_argument(
+        "--interval-ms",
+        type=int,
+        default=1500,
+        help="time between scenes in the steady phase",
+    )
+    parser.add_argument("--frames", type=int, default=10, help="frames per scene")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scene_paths = _create_scenes(tmp_dir, args.frames)
+        address = (
+            _TCP_ADDRESS
+            if args.transport == "tcp"
+            else "unix:" + path.join(tmp_dir, "display.sock")
+        )
+
+        with RemoteDisplay(address) as remote_display:
+            agent = subprocess.Popen(
+                [
+                    sys.executable,
+                    path.join(_REPO_ROOT, "display_agent.py"),
+                    "--connect",
+                    address,
+                    "--backend",
+                    "headless",
+                ],
+                stdout=subprocess.DEVNULL,
+            )
+            try:
+                while not remote_display.is_agent_connected():
+                    time.sleep(0.05)
+                time.sleep(_SETTLE_TIME)
+
+                (scenes_per_sec, burst_cpu) = measure_burst(
+                    remote_display, agent.pid, scene_paths, args.scenes
+                )
+                stats = remote_display.get_stats()
+                steady_cpu = measure_steady(
+                    remote_display,
+                    agent.pid,
+                    scene_paths,
+                    args.seconds,
+                    args.interval_ms / 1000,
+                )
+            finally:
+                # SIGINT lets the agent shut its display process down
+                agent.send_signal(signal.SIGINT)
+                agent.wait()
+
+    bytes_per_scene = stats["bytes_sent"] / stats["scenes_sent"]
+    raw_bytes_per_scene = stats["raw_bytes_sent"] / stats["scenes_sent"]
+    print(f"transport:              {args.transport}")
+    print(f"throughput:             {scenes_per_sec:.1f} scenes/s")
+    print(
+        f"bytes per scene:        {bytes_per_scene:.0f} "
+        f"(raw {raw_bytes_per_scene:.0f}, {raw_bytes_per_scene / bytes_per_scene:.1f}x)"
+    )
+    print(f"agent cpu per scene:    {1000 * burst_cpu / args.scenes:.2f} ms")
+    print(
+        f"agent cpu, 1 scene/{args.interval_ms}ms: "
+        f"{100 * steady_cpu / args.seconds:.2f}%"
+    )
+
+
+if __name__ == "__main__":
+    main()
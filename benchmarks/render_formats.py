@@ -0,0 +1,99 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Compares render time, decode time and output size of every render format.
+## Needs the 'pixlet' binary in PATH. Run from anywhere with:
+##     python benchmarks/render_formats.py [-n 10] [applets/clock.star ...]
+
+from os import path
+import argparse
+import glob
+import os
+import sys
+import time
+
+_REPO_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, _REPO_ROOT)
+
+from pixlet_wrapper import PixletWrapper
+from scene import RENDER_FORMATS, decode_scene
+
+_S_TO_MS = 1000
+
+
+def benchmark_applet(pixlet_wrapper, applet, iterations):
+    """
+    returns (mean render time in ms, mean decode time in ms, mean output size in bytes,
+             frame count), or None if the applet failed to render
+    """
+    render_times = []
+    decode_times = []
+    output_sizes = []
+    frame_count = 0
+
+    for _ in range(iterations):
+        start = time.perf_counter()
+        (output_path, _) = pixlet_wrapper.create_gif_from_sketch(applet)
+        rendered = time.perf_counter()
+        if output_path is None:
+            return None
+
+        frames = decode_scene(output_path)
+        decoded = time.perf_counter()
+
+        render_times.append(rendered - start)
+        decode_times.append(decoded - rendered)
+        output_sizes.append(path.getsize(output_path))
+        frame_count = len(frames)
+
+    return (
+        _S_TO_MS * sum(render_times) / iterations,
+        _S_TO_MS * sum(decode_times) / iterations,
+        sum(output_sizes) / iterations,
+        frame_count,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares pixlet render formats on the given applets."
+    )
+    parser.add_argument("-n", "--iterations", type=int, default=10)
+    parser.add_argument("applets", nargs="*")
+    args = parser.parse_args()
+
+    applet_paths = [path.abspath(p) for p in args.applets]
+    # PixletWrapper works relative to the current directory
+    os.chdir(_REPO_ROOT)
+    applet_paths = applet_paths or sorted(glob.glob("applets/*.star"))
+
+    print(
+        f"{'applet':<24} {'format':<6} {'render ms':>10} {'decode ms':>10} "
+        f"{'bytes':>8} {'frames':>7}"
+    )
+    for render_format in RENDER_FORMATS:
+        with PixletWrapper(render_format=render_format) as pixlet_wrapper:
+            for applet_path in applet_paths:
+                applet = {
+                    "name": path.basename(applet_path),
+                    "path": applet_path,
+                    "cmd_args": [],
+                }
+                result = benchmark_applet(pixlet_wrapper, applet, args.iterations)
+                if result is None:
+                    print(f"{applet['name']:<24} {render_format:<6} failed to render")
+                    continue
+
+                (render_ms, decode_ms, size, frame_count) = result
+                print(
+                    f"{applet['name']:<24} {render_format:<6} {render_ms:>10.1f} "
+                    f"{decode_ms:>10.2f} {size:>8.0f} {frame_count:>7}"
+                )
+
+
+if __name__ == "__main__":
+    main()
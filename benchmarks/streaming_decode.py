@@ -0,0 +1,150 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Compares decoding scenes up front with streaming them to the display process (see
+## scene.FrameStream) on a long animation: time to first frame, and peak resident memory of the
+## main and display processes. Every mode runs in a fresh interpreter so peaks don't carry over.
+## Uses the headless display backend, so it runs without the panel (Linux only). Run with:
+##     python benchmarks/streaming_decode.py [--frames 600] [--seconds 15]
+
+from os import path
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+_REPO_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, _REPO_ROOT)
+
+from PIL import Image
+from display_controller import DisplayControllerDelegator
+from scene import FrameStreamConfig
+from tracing import Tracer
+import numpy as np
+
+_SCENE_ID = 1
+_MODES = {
+    "up front": {"enabled": False},
+    "streaming": {"enabled": True},
+    "streaming, no resident": {"enabled": True, "max_resident_frames": 0},
+}
+
+
+def _get_peak_rss_kb(pid):
+    """
+    returns the peak resident set size (in KiB) of the process pid.
+    """
+    with open(f"/proc/{pid}/status") as status_file:
+        for line in status_file:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _create_animation(output_path, frame_count, frame_ms):
+    # Noise doesn't compress, which makes every frame as expensive to decode as it gets.
+    rng = np.random.default_rng(0)
+    frames = [
+        Image.fromarray(rng.integers(0, 256, (32, 64, 3), dtype=np.uint8)).quantize()
+        for _ in range(frame_count)
+    ]
+    frames[0].save(
+        output_path,
+        save_all=True,
+        append_images=frames[1:],
+        duration=frame_ms,
+        loop=0,
+    )
+
+
+def measure(animation_path, streaming_config, seconds):
+    """
+    Plays animation_path for seconds.
+    returns {"ttff_ms": time to first frame, "main_peak_rss_kb", "display_peak_rss_kb"}
+    """
+    with DisplayControllerDelegator(
+        tracer=Tracer(enabled=True),
+        backend="headless",
+        frame_stream_config=FrameStreamConfig(streaming_config),
+    ) as display_controller:
+        queued_at = time.perf_counter()
+        display_controller.queue_gif_to_display(animation_path, "animation", _SCENE_ID)
+        time.sleep(seconds)
+
+        display_pid = display_controller.get_display_pid()
+        display_peak_rss_kb = _get_peak_rss_kb(display_pid)
+        first_swap = min(
+            span.start + span.duration
+            for span in display_controller.get_display_trace_spans()
+            if span.name == "swap_on_vsync" and span.args.get("scene_id") == _SCENE_ID
+        )
+
+    return {
+        "ttff_ms": 1000 * (first_swap - queued_at),
+        "main_peak_rss_kb": _get_peak_rss_kb(os.getpid()),
+        "display_peak_rss_kb": display_peak_rss_kb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures time to first frame and peak RSS with and without streaming."
+    )
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--frame-ms", type=int, default=20)
+    parser.add_argument(
+        "--seconds", type=float, default=15, help="time to play the animation for"
+    )
+    # Internal. Measures a single mode and prints the result as JSON.
+    parser.add_argument("--measure", choices=_MODES.keys(), help=argparse.SUPPRESS)
+    parser.add_argument("--animation", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        result = measure(args.animation, _MODES[args.measure], args.seconds)
+        print(json.dumps(result))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        animation_path = path.join(tmp_dir, "animation.gif")
+        _create_animation(animation_path, args.frames, args.frame_ms)
+        animation_kib = path.getsize(animation_path) // 1024
+
+        for mode in _MODES:
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    path.abspath(__file__),
+                    "--measure",
+                    mode,
+                    "--animation",
+                    animation_path,
+                    "--seconds",
+                    str(args.seconds),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{args.frames} frames, {animation_kib} KiB")
+    print(f"{'mode':<24} {'ttff ms':>8} {'main peak MiB':>14} {'display peak MiB':>17}")
+    for mode, result in results.items():
+        print(
+            f"{mode:<24} {result['ttff_ms']:>8.1f} "
+            f"{result['main_peak_rss_kb'] / 1024:>14.1f} "
+            f"{result['display_peak_rss_kb'] / 1024:>17.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
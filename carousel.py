@@ -0,0 +1,155 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from user_config import UserConfig
+
+_MS_TO_S = 0.001
+# time (in s) before its turn an applet that never rendered is rendered ahead of time
+_DEFAULT_PRELOAD_LEAD = 2
+# Applets that rendered before are rendered ahead this many times their last render time
+_PRELOAD_LEAD_FACTOR = 2
+
+
+class Carousel:
+    """
+    The applets of the current time slot, and what is known about their last render. A slot with
+    a "rotation" cycles through its applets, showing each for its "dwell_ms". Any other slot is a
+    rotation of one applet, that never rotates.
+
+    The applet after the current one is rendered ahead of its turn, only if its last render will
+    have expired by then (see get_preload_time). Its scene waits in the display's SceneLibrary,
+    so rotating to it is a switch between scenes the display already has.
+
+    All times are clock.monotonic() times, in s.
+    """
+
+    def __init__(self, slot, clock):
+        self.slot = slot
+        self._clock = clock
+        self._applets = UserConfig.get_rotation(slot)
+        self._index = 0
+        # time at which the current applet went on display
+        self._shown_at = clock.monotonic()
+
+        # For every applet: when it last rendered, the hash of the scene it rendered, and how
+        # long the render took. None until it renders.
+        self._render_times = [None] * len(self._applets)
+        self._scene_hashes = [None] * len(self._applets)
+        self._render_durations = [None] * len(self._applets)
+
+    def current(self):
+        return self._applets[self._index]
+
+    def get_applet(self, index):
+        return self._applets[index]
+
+    def find(self, name):
+        """
+        returns the index of the applet called name, or None if it isn't part of the carousel.
+        """
+        for index, applet in enumerate(self._applets):
+            if applet["name"] == name:
+                return index
+        return None
+
+    def is_current(self, index):
+        return index == self._index
+
+    def get_upcoming_index(self):
+        """
+        returns the index of the applet shown after the current one, or None if the carousel
+        doesn't rotate.
+        """
+        if len(self._applets) == 1:
+            return None
+        return (self._index + 1) % len(self._applets)
+
+    def get_render_time(self, index=None):
+        """
+        returns when the applet at index (the current applet if None) last rendered, or None.
+        """
+        return self._render_times[self._index if index is None else index]
+
+    def get_scene_hash(self, index=None):
+        return self._scene_hashes[self._index if index is None else index]
+
+    def record_render(self, scene_hash, render_duration, index=None):
+        """
+        Records a successful render of the applet at index (the current applet if None), that
+        just finished.
+        """
+        index = self._index if index is None else index
+        self._render_times[index] = self._clock.monotonic()
+        self._scene_hashes[index] = scene_hash
+        self._render_durations[index] = render_duration
+
+    def forget_render(self, index=None):
+        """
+        Marks the applet at index (the current applet if None) as needing a render, like if it
+        had never rendered. Its render duration is kept.
+        """
+        index = self._index if index is None else index
+        self._render_times[index] = None
+        self._scene_hashes[index] = None
+
+    def start_dwell(self):
+        """
+        Starts the dwell time of the current applet. Called once it is on display.
+        """
+        self._shown_at = self._clock.monotonic()
+
+    def get_rotation_time(self):
+        """
+        returns the time at which the carousel should rotate to the next applet, or None if it
+        doesn't rotate.
+        """
+        if len(self._applets) == 1:
+            return None
+        return self._shown_at + self.current()["dwell_ms"] * _MS_TO_S
+
+    def should_rotate(self):
+        rotation_time = self.get_rotation_time()
+        return rotation_time is not None and self._clock.monotonic() >= rotation_time
+
+    def rotate(self):
+        """
+        Makes the next applet the current one.
+        """
+        self._index = self.get_upcoming_index()
+        self.start_dwell()
+
+    def get_preload_time(self):
+        """
+        returns the time at which the upcoming applet should be rendered, so it is up to date
+        when its turn comes, or None if it doesn't need a render before then.
+        """
+        index = self.get_upcoming_index()
+        if index is None:
+            return None
+
+        render_time = self._render_times[index]
+        if render_time is None:
+            # Never rendered, or forgotten. As soon as possible.
+            return self._clock.monotonic()
+
+        applet = self._applets[index]
+        if not applet["dynamic"]:
+            return None
+
+        rotation_time = self.get_rotation_time()
+        expiry = render_time + applet["refresh_interval_ms"] * _MS_TO_S
+        if expiry >= rotation_time:
+            # Still up to date when it goes on display. It re-renders on display if needed.
+            return None
+
+        render_duration = self._render_durations[index]
+        lead = (
+            _DEFAULT_PRELOAD_LEAD
+            if render_duration is None
+            else _PRELOAD_LEAD_FACTOR * render_duration
+        )
+        return max(expiry, rotation_time - lead)
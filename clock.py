@@ -0,0 +1,103 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+import asyncio
+import time
+
+SECS_IN_A_DAY = 24 * 60 * 60
+
+
+def secs_until_day_time(clock, day_time_secs):
+    """
+    returns the time (in s) until clock next reaches day_time_secs, today or tomorrow. A full day
+    if it is day_time_secs right now.
+    """
+    return (day_time_secs - clock.day_time_secs() - 1) % SECS_IN_A_DAY + 1
+
+
+class SystemClock:
+    """
+    Clock backed by the system time. Used by the script when driving the real display.
+    """
+
+    def monotonic(self):
+        """
+        returns a monotonically increasing time in seconds. Only useful to measure intervals.
+        """
+        return time.perf_counter()
+
+    def day_time_secs(self):
+        """
+        returns the time passed in seconds since 00:00:00 hrs (midnight)
+        Time resolution is of seconds
+        output range: [0, 86400)
+        """
+        curr_time = time.localtime()
+        hh = int(time.strftime("%H", curr_time))
+        mm = int(time.strftime("%M", curr_time))
+        ss = int(time.strftime("%S", curr_time))
+        return (hh * 60 * 60) + (mm * 60) + ss
+
+    async def wait_for_items(self, queues, timeout):
+        """
+        returns a list of (queue, item), with at most one item from each of queues, waiting up
+        to timeout seconds for any of them to have one. Raises asyncio.TimeoutError if no item
+        arrives in time.
+        """
+        getters = {asyncio.ensure_future(queue.get()): queue for queue in queues}
+        try:
+            (done, _) = await asyncio.wait(
+                getters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            # Cancelling a get() that hasn't returned leaves its item in the queue
+            for getter in getters:
+                getter.cancel()
+
+        if not done:
+            raise asyncio.TimeoutError()
+        return [(getters[getter], getter.result()) for getter in done]
+
+
+class VirtualClock:
+    """
+    Clock that only moves when told to. Waiting on it returns immediately, which lets a full day
+    of scheduling run in a few seconds.
+    """
+
+    def __init__(self, start_day_time_secs=0):
+        # virtual time (in s) passed since the clock was created
+        self._elapsed = 0.0
+        # day time (in s) at which the clock was created
+        self._start_day_time_secs = start_day_time_secs
+
+    def monotonic(self):
+        return self._elapsed
+
+    def day_time_secs(self):
+        return int(self._start_day_time_secs + self._elapsed) % SECS_IN_A_DAY
+
+    def day(self):
+        """
+        returns the number of midnights passed since the clock was created.
+        """
+        return int(self._start_day_time_secs + self._elapsed) // SECS_IN_A_DAY
+
+    def advance(self, secs):
+        self._elapsed += max(0.0, secs)
+
+    async def wait_for_items(self, queues, timeout):
+        """
+        returns a list of (queue, item), with one item from each of queues that already has
+        one. If none do, jumps timeout seconds ahead and raises asyncio.TimeoutError.
+        """
+        items = [(queue, queue.get_nowait()) for queue in queues if not queue.empty()]
+        if items:
+            return items
+
+        self.advance(timeout)
+        raise asyncio.TimeoutError()
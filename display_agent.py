@@ -0,0 +1,131 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Display side of a split setup: applets are rendered by main.py on a render host (with the
+## "remote" display backend), and this script only draws the scenes it receives. It doesn't
+## need pixlet or the applets.
+##
+## Run with:
+##     sudo python display_agent.py --connect <render host>:9090 [--config agent.json]
+##
+## If the connection drops, the last scene keeps playing while the agent reconnects.
+
+from display_controller import DISPLAY_BACKENDS, DisplayControllerDelegator
+from filters import FilterSettings
+from process_scheduling import ProcessScheduling
+import argparse
+import json
+import scene_transport
+import time
+
+_CONNECT_TIMEOUT = 5  # time (in s) to wait for the render host to accept a connection
+_MIN_RECONNECT_INTERVAL = 1  # time (in s) to wait before reconnecting
+_MAX_RECONNECT_INTERVAL = 30
+
+
+def run_agent(address, display_controller):
+    """
+    Connects to the render host at address and forwards everything it sends to
+    display_controller. Reconnects whenever the connection drops. Never returns.
+    """
+    decoder = scene_transport.SceneDecoder()
+    # hash of the scene on display. Sent to the render host when (re-)connecting, so an
+    # unchanged scene isn't sent again.
+    scene_hash = None
+    reconnect_interval = _MIN_RECONNECT_INTERVAL
+
+    while True:
+        try:
+            sock = scene_transport.connect(address, _CONNECT_TIMEOUT)
+        except OSError as e:
+            print(
+                f"Could not connect to {address}: {e}. Retrying in {reconnect_interval}s"
+            )
+            time.sleep(reconnect_interval)
+            reconnect_interval = min(2 * reconnect_interval, _MAX_RECONNECT_INTERVAL)
+            continue
+
+        print(f"Connected to render host {address}")
+        reconnect_interval = _MIN_RECONNECT_INTERVAL
+        decoder.reset()
+        try:
+            with sock:
+                hello = json.dumps(
+                    {
+                        "protocol": scene_transport.PROTOCOL_VERSION,
+                        "scene_hash": scene_hash,
+                    }
+                ).encode("utf-8")
+                scene_transport.send_message(sock, scene_transport.MSG_HELLO, hello)
+                while True:
+                    (msg_type, payload) = scene_transport.recv_message(sock)
+                    scene_hash = _handle_message(
+                        display_controller, decoder, msg_type, payload, scene_hash
+                    )
+        except (OSError, ValueError) as e:
+            print(f"Lost connection to render host: {e}. Showing the last scene.")
+
+
+def _handle_message(display_controller, decoder, msg_type, payload, scene_hash):
+    """
+    returns the hash of the scene on display after handling the message.
+    """
+    if msg_type == scene_transport.MSG_SCENE:
+        (scene_hash, scene) = decoder.decode(payload)
+        display_controller.queue_frames_to_display(
+            scene.frames, scene_hash, scene.scene_id
+        )
+    elif msg_type == scene_transport.MSG_BRIGHTNESS:
+        brightness = json.loads(payload)
+        display_controller.set_scene_brightness(brightness["scene_brightness"])
+        if brightness["brightness"] is not None:
+            display_controller.set_brightness(brightness["brightness"])
+    elif msg_type == scene_transport.MSG_FILTERS:
+        display_controller.set_filters(FilterSettings.from_config(json.loads(payload)))
+    else:
+        print(f"Ignoring unknown message {msg_type}")
+
+    return scene_hash
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Draws scenes streamed by main.py running on a render host."
+    )
+    parser.add_argument(
+        "--connect",
+        required=True,
+        help="address of the render host. <host>:<port> or unix:<path>",
+    )
+    parser.add_argument("--backend", default="rgbmatrix", choices=DISPLAY_BACKENDS)
+    parser.add_argument(
+        "--config",
+        help="JSON file with the optional process_scheduling and display sections of "
+        "config.json. Only display > idle_at_zero_brightness is used.",
+    )
+    args = parser.parse_args()
+
+    config = {}
+    if args.config is not None:
+        with open(args.config) as config_file:
+            config = json.load(config_file)
+
+    with DisplayControllerDelegator(
+        ProcessScheduling(config.get("process_scheduling")),
+        idle_at_zero_brightness=config.get("display", {}).get(
+            "idle_at_zero_brightness", True
+        ),
+        backend=args.backend,
+    ) as display_controller:
+        try:
+            run_agent(args.connect, display_controller)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
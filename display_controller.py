@@ -6,43 +6,125 @@
 ###############################################################################
 
 from collections import deque
-from copy import deepcopy
-from dataclasses import dataclass
+from dataclasses import replace
+from filters import FilteredImageCache, FilterSettings, apply_filters
 from multiprocessing import Process, Queue, Value
-from PIL import Image, ImageEnhance
-from rgbmatrix import FrameCanvas, RGBMatrix, RGBMatrixOptions
+from PIL import Image
+from headless_matrix import HeadlessMatrix
+from scene import (
+    DEFAULT_DISPLAY_TIME,
+    EncodedScene,
+    Frame,
+    FrameStream,
+    FrameStreamConfig,
+    Scene,
+    SceneLibrary,
+    ShowScene,
+    decode_scene,
+)
+from tracing import Tracer
 import numpy as np
 import queue
 import time
 
 _DISPLAY_SIZE = (32, 64, 3)  # 32 rows, 64 columns, 3 colors for each pixel
-_DEFAULT_DISPLAY_TIME = 1  # default time to wait for next frame, in seconds
-_MS_TO_S = 0.001
 _MAX_AD_HOC_BRIGHTNESS = 1000
+_JITTER_REPORT_INTERVAL = 60  # time (in s) between two frame jitter reports
+_S_TO_MS = 1000
+# time (in s) to wait for the display process to send its trace spans
+_TRACE_COLLECTION_TIMEOUT = 2
+# time (in s) before the current frame expires after which streamed frames are no longer decoded
+# ahead, so decoding doesn't delay the next frame.
+_STREAM_DECODE_MARGIN = 0.005
+# number of filtered frames kept by the display process. See FilteredImageCache
+_FILTER_CACHE_FRAMES = 1024
+
+# Sent over the scene queue to ask the display process for its trace spans.
+_TRACE_REQUEST = "trace_request"
+# Sent over the scene queue to wake the display process up when it should re-check its state.
+# Ex: when entering or leaving idle mode, or when quitting.
+_WAKE_UP = "wake_up"
+
+# Scene hash of the blank scene. See DisplayControllerDelegator.queue_blank_to_display
+BLANK_SCENE_HASH = "blank"
+
+# Backends the DisplayController can draw to
+DISPLAY_BACKENDS = ["rgbmatrix", "headless"]
+
+
+def create_blank_frames():
+    """
+    returns the frames of the blank scene, identified by BLANK_SCENE_HASH.
+    """
+    black_img = Image.new("RGB", (_DISPLAY_SIZE[1], _DISPLAY_SIZE[0]), (0, 0, 0))
+    return [Frame(img=black_img)]
+
+
+class FrameTimingStats:
+    """
+    Tracks how late frames are drawn compared to when they were due, and periodically prints a
+    summary. Used to judge the effect of ProcessScheduling on frame timing.
+    """
+
+    def __init__(self, report_interval=_JITTER_REPORT_INTERVAL):
+        self._report_interval = report_interval
+        # lateness (in s) of every frame drawn since the last report
+        self._samples = []
+        self._last_report_time = time.perf_counter()
+
+    def record(self, due_at, drawn_at):
+        """
+        Records a frame that was supposed to be drawn at due_at, but was drawn at drawn_at.
+        """
+        self._samples.append(max(0.0, drawn_at - due_at))
+        if drawn_at - self._last_report_time >= self._report_interval:
+            self.report(drawn_at)
+
+    def summary(self):
+        """
+        returns (frame_count, mean_ms, p95_ms, max_ms) of the frames recorded since the last
+        report, or None if no frames were recorded.
+        """
+        if not self._samples:
+            return None
 
+        samples = np.array(self._samples) * _S_TO_MS
+        return (
+            len(samples),
+            float(np.mean(samples)),
+            float(np.percentile(samples, 95)),
+            float(np.max(samples)),
+        )
 
-@dataclass
-class Frame:
-    # Original unadjusted image. Should be of size _DISPLAY_SIZE
-    img: Image
-    # This is the output of img when adjusted by brightness. Should be of size _DISPLAY_SIZE
-    brightness_adjusted_img: Image
-    # Brightness at which the frame was drawn. Value of [0, _MAX_AD_HOC_BRIGHTNESS] that maps
-    # a range of [0%, 100%]
-    brightness: int = -1
-    # time (in s) how long the frame should be on display.
-    duration: float = _DEFAULT_DISPLAY_TIME
-    # true if the frames should loop
-    should_loop: bool = False
-    # number of times the frames should loop. 0 for infinite
-    loop_count: int = 0
-    # used and filled by DisplayController. Time (in s) at which the frame was drawn
-    drawn_at: float = 0.0
+    def report(self, curr_time):
+        summary = self.summary()
+        if summary is not None:
+            (frame_count, mean_ms, p95_ms, max_ms) = summary
+            print(
+                f"Frame jitter over {frame_count} frames: mean {mean_ms:.2f}ms, "
+                f"p95 {p95_ms:.2f}ms, max {max_ms:.2f}ms"
+            )
+
+        self._samples.clear()
+        self._last_report_time = curr_time
 
 
 class DisplayController:
 
-    def __init__(self, should_exit, scene_queue, brightness):
+    def __init__(
+        self,
+        should_exit,
+        scene_queue,
+        brightness,
+        scene_brightness,
+        process_scheduling=None,
+        tracer=None,
+        trace_queue=None,
+        idle=None,
+        backend="rgbmatrix",
+        frame_stream_config=None,
+        scene_library_size=0,
+    ):
         # multiprocessing.Value [boolean] object.
         # Used to check if the process should terminate.
         # The value will the changed by DisplayControllerDelegator when the program
@@ -51,42 +133,84 @@ class DisplayController:
 
         # muliprocessing.Queue object to pull new scenes from.
         # This will be populated by DisplayControllerDelegator
-        # One scene consists of a list of Frames to display.
+        # Contains Scene, EncodedScene or ShowScene objects, FilterSettings to apply from then
+        # on, _TRACE_REQUEST, or _WAKE_UP
         self._scene_queue = scene_queue
 
         # multiprocessing.Value [int] object.
         # Used to store the brightness at which the image should be displayed.
         # This value will be applied by the DisplayControllerDelegator to the Frame.img
         # object right before it is displayed.
-        # Value of -1 means no brightness adjustment will be applied, i.e. Frame.img will be shown
-        # as is. See Frame.brightness for details.
+        # Value of -1 means no brightness was set through the API, and the scene brightness is
+        # applied instead. Range of [0, _MAX_AD_HOC_BRIGHTNESS] that maps to [0%, 100%]
         self._brightness = brightness
 
+        # multiprocessing.Value [int] object.
+        # Brightness of the scheduled applet, scaled by _MAX_AD_HOC_BRIGHTNESS. Set by
+        # DisplayControllerDelegator.set_scene_brightness. Scenes are sent without brightness,
+        # so a brightness change only needs the frames on display to be redrawn.
+        self._scene_brightness = scene_brightness
+
+        # ProcessScheduling object to apply to the display process. None to leave the process
+        # with default scheduling.
+        self._process_scheduling = process_scheduling
+
+        # Tracer to record display spans to. The display process gets its own copy of the
+        # Tracer, so spans are sent back to DisplayControllerDelegator over trace_queue when
+        # requested.
+        self._tracer = Tracer() if tracer is None else tracer
+        self._trace_queue = trace_queue
+
+        # multiprocessing.Value [boolean] object.
+        # Set by DisplayControllerDelegator when nothing would be visible on the display. The
+        # display process blanks the panel and blocks until the value is cleared.
+        self._idle = idle
+
+        # One of DISPLAY_BACKENDS
+        self._backend = backend
+
+        # FrameStreamConfig for EncodedScenes
+        self._frame_stream_config = (
+            FrameStreamConfig() if frame_stream_config is None else frame_stream_config
+        )
+
+        # Number of scenes to keep for ShowScene messages. See SceneLibrary
+        self._scene_library_size = scene_library_size
+
     def run(self):
         print("Running DisplayController process.")
 
+        if self._process_scheduling is not None:
+            # Must happen before the RGB Matrix is set up. See
+            # ProcessScheduling.apply_to_display_process
+            self._process_scheduling.apply_to_display_process()
+
         self._init_process()
 
         while self._should_exit.value == 0:
             self._process_frame()
 
     def _init_process(self):
-        # Set up RGB Matrix
-        options = RGBMatrixOptions()
-        options.rows = _DISPLAY_SIZE[0]
-        options.cols = _DISPLAY_SIZE[1]
-        options.chain_length = 1
-        options.parallel = 1
-        options.hardware_mapping = "adafruit-hat-pwm"
-        options.led_rgb_sequence = "RBG"
-        options.gpio_slowdown = 2
+        self._rgb_matrix = self._create_matrix()
 
-        self._rgb_matrix = RGBMatrix(options=options)
+        self._frame_timing_stats = FrameTimingStats()
 
         # Queue of Frames that need to be drawn.
         # The first frame is the frame currently on screen.
         self._frames_queue = deque()
 
+        # FrameStream of the current scene, if it is an EncodedScene that hasn't been fully
+        # queued yet. Frames are decoded from it into _frames_queue as they are needed.
+        self._frame_stream = None
+
+        # Scenes kept to be shown again by ShowScene messages, as they were received. Only
+        # copies of their frames are ever queued, as queued frames are modified as they play.
+        self._scene_library = SceneLibrary(self._scene_library_size)
+
+        # Applied to every frame along with the brightness. Sent by DisplayControllerDelegator.
+        self._filters = FilterSettings()
+        self._filtered_image_cache = FilteredImageCache(_FILTER_CACHE_FRAMES)
+
         # seed frames queue with white frame followed by a black frame
         # this forces the black frame to be drawn immediately upon start
         white_img = Image.new(
@@ -97,20 +221,40 @@ class DisplayController:
         self.canvas = self._rgb_matrix.SwapOnVSync(white_canvas)
 
         # Pretend this frame has already expired
-        white_frame_drawn_at = time.perf_counter() - (2 * _DEFAULT_DISPLAY_TIME)
-        white_frame = Frame(
-            img=white_img,
-            brightness_adjusted_img=white_img,
-            drawn_at=white_frame_drawn_at,
-        )
+        white_frame_drawn_at = time.perf_counter() - (2 * DEFAULT_DISPLAY_TIME)
+        white_frame = Frame(img=white_img, drawn_at=white_frame_drawn_at)
 
         black_img = Image.new("RGB", (_DISPLAY_SIZE[1], _DISPLAY_SIZE[0]), (0, 0, 0))
-        black_frame = Frame(img=black_img, brightness_adjusted_img=black_img)
+        black_frame = Frame(img=black_img)
 
         self._frames_queue.append(white_frame)
         self._frames_queue.append(black_frame)
 
+    def _create_matrix(self):
+        if self._backend == "headless":
+            return HeadlessMatrix()
+
+        # rgbmatrix is only available on the Raspberry Pi. Importing it here keeps this module
+        # importable elsewhere, e.g. by simulate.py
+        from rgbmatrix import RGBMatrix, RGBMatrixOptions
+
+        # Set up RGB Matrix
+        options = RGBMatrixOptions()
+        options.rows = _DISPLAY_SIZE[0]
+        options.cols = _DISPLAY_SIZE[1]
+        options.chain_length = 1
+        options.parallel = 1
+        options.hardware_mapping = "adafruit-hat-pwm"
+        options.led_rgb_sequence = "RBG"
+        options.gpio_slowdown = 2
+
+        return RGBMatrix(options=options)
+
     def _process_frame(self):
+        if self._idle is not None and self._idle.value:
+            self._idle_until_woken()
+            return
+
         curr_frame = self._frames_queue[0]
 
         # time (in s) when the current frame expires
@@ -120,19 +264,21 @@ class DisplayController:
             self._draw_next_frame()
             return
 
-        curr_brightness = curr_frame.brightness
-        if curr_brightness != self._brightness.value:
+        if curr_frame.filter_state != self._get_filter_state():
             # print(f"Redrawing frame with brightness: {self._brightness.value}")
             self._refresh_curr_frame()
             return
 
+        # Use the time until the next frame to decode ahead
+        self._fill_frame_window(curr_expiry - _STREAM_DECODE_MARGIN)
+
         try:
             # Wait for next scene to come in for as long
             # as the current frame lasts.
 
             # drop the refresh rate if there is only one frame to display
             curr_frame_duration = (
-                _DEFAULT_DISPLAY_TIME
+                DEFAULT_DISPLAY_TIME
                 if len(self._frames_queue) == 1
                 else curr_frame.duration
             )
@@ -143,31 +289,175 @@ class DisplayController:
             # Wait at least 1ms instead.
             timeout = max(0.001, curr_expiry - time.perf_counter())
 
-            scene = self._scene_queue.get(block=True, timeout=timeout)
+            message = self._scene_queue.get(block=True, timeout=timeout)
+            if self._handle_control_message(message):
+                return
+
             # print("Received new scene")
-            self._queue_raw_frames(scene)
-            self._draw_next_frame()
+            if self._queue_scene(message):
+                self._draw_next_frame()
         except queue.Empty:
             # print("Empty raw frames queue, do nothing.")
             pass
 
-    def _queue_raw_frames(self, scene):
+    def _handle_control_message(self, message):
+        """
+        returns True if message was a control message and has been handled, False if it is a
+        Scene.
+        """
+        if isinstance(message, FilterSettings):
+            # The frame on display is redrawn by the caller, as its filter state is outdated
+            self._filters = message
+            return True
+
+        if message == _TRACE_REQUEST:
+            self._trace_queue.put(self._tracer.get_spans())
+            return True
+
+        # Nothing to do for _WAKE_UP, the caller re-checks its state after every message.
+        return message == _WAKE_UP
+
+    def _idle_until_woken(self):
+        """
+        Blanks the panel and blocks until the display is no longer idle. New scenes received in
+        the meantime are queued, but not drawn.
+        """
+        print("Display idle. Blanking panel.")
+        self.canvas.Clear()
+        self.canvas = self._rgb_matrix.SwapOnVSync(self.canvas)
+
+        received_scene = False
+        while self._idle.value and self._should_exit.value == 0:
+            # No timeout: DisplayControllerDelegator sends _WAKE_UP when idle mode ends.
+            message = self._scene_queue.get(block=True)
+            if not self._handle_control_message(message):
+                received_scene |= self._queue_scene(message)
+
+        print("Display woken up.")
+        if received_scene:
+            # The current frame was set up to expire immediately by _replace_frames
+            self._draw_next_frame()
+        else:
+            # Put the current frame back on screen right away.
+            self._refresh_curr_frame()
+            self._frames_queue[0].drawn_at = time.perf_counter()
+
+    def _queue_scene(self, scene):
+        """
+        Replaces the frames queued with those of scene, a Scene, an EncodedScene, or a ShowScene
+        referring to one in the library.
+        returns True if the frames were replaced, False if the scene was only added to the
+        library, or couldn't be shown.
+        """
+        received_at = time.perf_counter()
+        self._tracer.add_span(
+            "scene_transfer",
+            scene.queued_at,
+            received_at - scene.queued_at,
+            {"scene_id": scene.scene_id},
+        )
+
+        if isinstance(scene, ShowScene):
+            library_scene = self._scene_library.get(
+                scene.library_name, scene.library_key
+            )
+            if library_scene is None:
+                # Shouldn't happen, the delegator only refers to scenes still in the library
+                print(f"Scene {scene.library_key} is not in the library. Skipping")
+                return False
+            # The scene might have been preloaded, with show False
+            scene = replace(library_scene, scene_id=scene.scene_id, show=True)
+        elif scene.library_name is not None:
+            self._scene_library.put(scene.library_name, scene.library_key, scene)
+
+        if not scene.show:
+            return False
+
+        if scene.library_name is not None and isinstance(scene, Scene):
+            # Keep the library's frames as they are. The copies share the images.
+            scene = replace(scene, frames=[replace(frame) for frame in scene.frames])
+
+        if self._frame_stream is not None:
+            self._frame_stream.close()
+            self._frame_stream = None
+
+        if isinstance(scene, EncodedScene):
+            return self._queue_encoded_scene(scene)
+        return self._queue_raw_frames(scene)
+
+    def _queue_encoded_scene(self, scene: EncodedScene):
+        """
+        Only decodes the first frame of scene, so it can be drawn right away. The remaining
+        frames are decoded by _fill_frame_window.
+        """
+        with self._tracer.span("decode_first_frame", scene_id=scene.scene_id):
+            frame_stream = FrameStream(scene, self._frame_stream_config)
+            first_frame = frame_stream.next_frame()
+        if first_frame is None:
+            print("Empty scene. Skipping")
+            frame_stream.close()
+            return False
+
+        self._prepare_frame(first_frame, scene.scene_id)
+        self._replace_frames([first_frame])
+        self._frame_stream = frame_stream
+        self._frame_stream_scene_id = scene.scene_id
+        return True
+
+    def _fill_frame_window(self, deadline):
+        """
+        Decodes frames of the current FrameStream until the window is full, or deadline
+        (perf_counter time, in s) is reached. At least one frame is decoded if none is waiting,
+        so there is always a next frame to draw.
+        """
+        # _frames_queue[0] is on screen, the rest are waiting to be drawn
+        while (
+            self._frame_stream is not None
+            and len(self._frames_queue) - 1 < self._frame_stream_config.window_frames
+            and (len(self._frames_queue) == 1 or time.perf_counter() < deadline)
+        ):
+            with self._tracer.span(
+                "decode_frame", scene_id=self._frame_stream_scene_id
+            ):
+                frame = self._frame_stream.next_frame()
+            if frame is None:
+                # Scene is over. Its last frame stays on screen.
+                self._frame_stream = None
+                return
+
+            self._prepare_frame(frame, self._frame_stream_scene_id)
+            self._frames_queue.append(frame)
+
+    def _prepare_frame(self, frame: Frame, scene_id):
+        frame.drawn_at = 0.0
+        frame.scene_id = scene_id
+        self._apply_filters(frame)
+
+    def _queue_raw_frames(self, scene: Scene):
         temp_frames = deque()
 
-        for frame in scene:
-            if np.shape(frame.img) != _DISPLAY_SIZE:
-                print("Invalid frame shape. Skipping")
-                print("Expected:", _DISPLAY_SIZE, "Received:", np.shape(frame.img))
-                continue
+        with self._tracer.span("queue_raw_frames", scene_id=scene.scene_id):
+            for frame in scene.frames:
+                if np.shape(frame.img) != _DISPLAY_SIZE:
+                    print("Invalid frame shape. Skipping")
+                    print("Expected:", _DISPLAY_SIZE, "Received:", np.shape(frame.img))
+                    continue
 
-            frame.drawn_at = 0.0
-            self._adjust_brightness(frame)
-            temp_frames.append(frame)
+                self._prepare_frame(frame, scene.scene_id)
+                temp_frames.append(frame)
 
         if len(temp_frames) == 0:
             # Don't do anything if we don't have new frames
-            return
+            return False
+
+        self._replace_frames(temp_frames)
+        return True
 
+    def _replace_frames(self, frames):
+        """
+        Replaces the queued frames with frames. The frame on screen is set up to be replaced by
+        the first of frames in the next cycle.
+        """
         last_frame = self._frames_queue.popleft()
         # Set up last frame to be immediately popped in the next cycle
         last_frame.should_loop = False
@@ -176,21 +466,21 @@ class DisplayController:
 
         self._frames_queue.clear()
         self._frames_queue.append(last_frame)  # re-insert last frame
-        self._frames_queue.extend(temp_frames)  # add new frames to queue, will be drawn
+        self._frames_queue.extend(frames)  # add new frames to queue, will be drawn
 
     def _refresh_curr_frame(self):
         """
         Redraw the current frame with brightness adjustments. Does NOT update
         drawn_at timestamp.
         """
-        self._adjust_brightness(self._frames_queue[0])
-        self.canvas.SetImage(self._frames_queue[0].brightness_adjusted_img)
+        self._apply_filters(self._frames_queue[0])
+        self.canvas.SetImage(self._frames_queue[0].display_img)
         self.canvas = self._rgb_matrix.SwapOnVSync(self.canvas)
 
     def _draw_next_frame(self):
         if (
             len(self._frames_queue) == 1
-            and self._brightness.value == self._frames_queue[0].brightness
+            and self._get_filter_state() == self._frames_queue[0].filter_state
         ):
             # print("Last frame in queue, resetting drawn_at timestamp")
             self._frames_queue[0].drawn_at = time.perf_counter()
@@ -203,19 +493,42 @@ class DisplayController:
             # print("Current frame has not expired yet")
             return
 
+        # Frame that is about to be drawn
+        next_frame = self._frames_queue[1 if len(self._frames_queue) > 1 else 0]
+        with self._tracer.span("draw_next_frame", scene_id=next_frame.scene_id):
+            self._draw_expired_frame()
+
+    def _draw_expired_frame(self):
+        """
+        Pops the current, expired, frame off the queue and draws the next one.
+        """
         curr_frame = self._frames_queue.popleft()
+        curr_expiry = curr_frame.drawn_at + curr_frame.duration
+        # time (in s) at which the next frame should have been drawn. 0 if curr_frame was
+        # never drawn, or was cut short by a new scene.
+        next_frame_due_at = (
+            curr_expiry if curr_frame.drawn_at > 0 and curr_frame.duration > 0 else 0.0
+        )
 
         # If this was the only frame in the queue, re-insert it to be drawn
         if len(self._frames_queue) == 0:
             # print("Only one frame in queue. Re-inserting it to be drawn again.")
             self._frames_queue.append(curr_frame)
 
-        self._adjust_brightness(self._frames_queue[0])
+        self._apply_filters(self._frames_queue[0])
 
-        self.canvas.SetImage(self._frames_queue[0].brightness_adjusted_img)
-        self.canvas = self._rgb_matrix.SwapOnVSync(self.canvas)
+        self.canvas.SetImage(self._frames_queue[0].display_img)
+        with self._tracer.span(
+            "swap_on_vsync", scene_id=self._frames_queue[0].scene_id
+        ):
+            self.canvas = self._rgb_matrix.SwapOnVSync(self.canvas)
         self._frames_queue[0].drawn_at = time.perf_counter()
 
+        if next_frame_due_at > 0:
+            self._frame_timing_stats.record(
+                next_frame_due_at, self._frames_queue[0].drawn_at
+            )
+
         if not curr_frame.should_loop:
             return
 
@@ -229,41 +542,94 @@ class DisplayController:
         curr_frame.drawn_at = 0.0
         self._frames_queue.append(curr_frame)
 
-    def _adjust_brightness(self, frame: Frame):
+    def _get_filter_state(self):
+        """
+        returns the (brightness multiplier, FilterSettings) frames should be drawn with.
+        """
+        if self._brightness.value == -1:
+            # No brightness set through the API. Keep the brightness of the scene.
+            brightness = max(0, self._scene_brightness.value)
+        else:
+            # The brightness set through the API replaces the brightness of the scene
+            brightness = self._brightness.value
+        return (brightness / _MAX_AD_HOC_BRIGHTNESS, self._filters)
+
+    def _apply_filters(self, frame: Frame):
         """
-        Adjusts the brightness of a given frame in place, if needed. The fields "brightness" and
-        "brightness_adjusted_img" are updated with the new values.
+        Sets frame.display_img to the frame with the current brightness and filters applied, if
+        it isn't up to date (see filters.apply_filters). The result is cached per source image
+        and filter state. Frames that aren't resident are drawn once, and are filtered without
+        caching them: the cache would keep their images alive, past the resident budget of
+        FrameStream.
         """
-        target_brightness = self._brightness.value
-        if target_brightness == -1 or frame.brightness == target_brightness:
+        filter_state = self._get_filter_state()
+        if frame.filter_state == filter_state:
             # Already calculated. Nothing to do.
-            frame.brightness = target_brightness
             return
 
-        if target_brightness == _MAX_AD_HOC_BRIGHTNESS:
-            # No brightness adjustment needed.
-            frame.brightness_adjusted_img = deepcopy(frame.img)
-            frame.brightness = target_brightness
+        (brightness, filters) = filter_state
+        frame.filter_state = filter_state
+        if brightness == 1.0 and filters.is_identity():
+            frame.display_img = frame.img
             return
 
-        # Change the brightness of Frame.img and store it
-        tmp_im = frame.img.convert("RGBA")
-        adjusted_img = ImageEnhance.Brightness(tmp_im).enhance(
-            target_brightness / _MAX_AD_HOC_BRIGHTNESS
-        )
-        frame.brightness_adjusted_img = adjusted_img.convert("RGB")
-        frame.brightness = target_brightness
+        display_img = None
+        if frame.resident:
+            display_img = self._filtered_image_cache.get(frame.img, filter_state)
+        if display_img is None:
+            with self._tracer.span("apply_filters", scene_id=frame.scene_id):
+                display_img = apply_filters(frame.img, filters, brightness)
+            if frame.resident:
+                self._filtered_image_cache.put(frame.img, filter_state, display_img)
+        frame.display_img = display_img
 
 
 class DisplayControllerDelegator:
-    def __init__(self):
+    def __init__(
+        self,
+        process_scheduling=None,
+        tracer=None,
+        idle_at_zero_brightness=True,
+        backend="rgbmatrix",
+        frame_stream_config=None,
+        scene_library_size=0,
+    ):
         self._should_exit = Value("b", 0, lock=False)
         self._brightness = Value("i", -1, lock=False)
+        # Brightness multiplier of the scheduled applet. See set_scene_brightness()
+        self._scene_brightness = 1.0
+        self._scene_brightness_value = Value("i", _MAX_AD_HOC_BRIGHTNESS, lock=False)
+        self._idle = Value("b", 0, lock=False)
         self._scene_queue = Queue()
-        self._current_scene_metadata = {"hash": None, "brightness": None}
+        self._trace_queue = Queue()
+        # Hash of the scene on display
+        self._current_scene_hash = None
+        self._tracer = Tracer() if tracer is None else tracer
+
+        # If True, the display goes idle when the effective brightness is 0. See is_idle()
+        self._idle_at_zero_brightness = idle_at_zero_brightness
+        # Filters last sent to the display process. See set_filters()
+        self._filters = FilterSettings()
+
+        # If enabled, scenes are sent to the display process encoded. See FrameStream
+        self._frame_stream_config = (
+            FrameStreamConfig() if frame_stream_config is None else frame_stream_config
+        )
+        # Keys of the scenes in the display process' SceneLibrary. See SceneLibrary
+        self._scene_library = SceneLibrary(scene_library_size)
 
         self._display_controller = DisplayController(
-            self._should_exit, self._scene_queue, self._brightness
+            self._should_exit,
+            self._scene_queue,
+            self._brightness,
+            self._scene_brightness_value,
+            process_scheduling,
+            self._tracer,
+            self._trace_queue,
+            self._idle,
+            backend,
+            self._frame_stream_config,
+            scene_library_size,
         )
 
     def __enter__(self):
@@ -275,78 +641,221 @@ class DisplayControllerDelegator:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._should_exit.value = True
+        # In case the display process is idle
+        self._scene_queue.put(_WAKE_UP)
         self._frame_writer_process.join()
         self._scene_queue.close()
+        self._trace_queue.close()
 
-    def queue_gif_to_display(self, gif_filepath, gif_hash, brightness):
-        if not self._update_scene_metadata_if_needed(gif_hash, brightness):
-            # The new gif has the same metadata as what is already displayed.
+    def queue_gif_to_display(self, gif_filepath, gif_hash, scene_id=0, library_name=None):
+        """
+        Decodes the GIF or WebP file at gif_filepath and queues it to be displayed, unless it is
+        the same as the scene currently displayed. If streaming is enabled, the file is sent to
+        the display process as is, and decoded there while it plays. The scene is shown at the
+        brightness set by set_scene_brightness.
+        scene_id is used to correlate the trace spans of the scene across processes.
+        If library_name is set, the display process keeps the scene in its scene library under
+        that name, or shows it from there if it is already kept.
+        """
+        if not self._update_scene_hash_if_needed(gif_hash):
+            # The new gif is the same as what is already displayed.
             # No need to queue this gif
             return
 
-        frames = []
-        with Image.open(gif_filepath) as im:
-            im_info = im.info
-            should_loop = False
-            loop_count = 0
-            frame_duration = _DEFAULT_DISPLAY_TIME
-
-            if "loop" in im_info:
-                should_loop = True
-                loop_count = im_info["loop"]
-
-            if "duration" in im_info:
-                frame_duration = im_info["duration"] * _MS_TO_S
-
-            frame_number = 0
-            try:
-                while True:
-                    im.seek(frame_number)
-                    frame_number += 1
-
-                    if brightness != 1:
-                        # temporary format to allow brightness changes
-                        tmp_im = im.convert("RGBA")
-                        img = ImageEnhance.Brightness(tmp_im).enhance(brightness)
-                    else:
-                        img = im
-
-                    raw_img = im.convert("RGB")
-                    rgb_img = img.convert("RGB")
-
-                    frame = Frame(
-                        img=raw_img,
-                        brightness_adjusted_img=rgb_img,
-                        brightness=brightness,
-                        should_loop=should_loop,
-                        duration=frame_duration,
-                        loop_count=loop_count,
-                    )
-
-                    frames.append(frame)
-
-            except EOFError:
-                # Finished processing all gif frames
-                pass
-
-        self._scene_queue.put(frames)
+        library_key = self._get_library_key(library_name, gif_hash)
+        if self._scene_library.has(library_name, library_key):
+            self._put_show_scene(library_name, library_key, scene_id)
+            return
+
+        self._put_gif(gif_filepath, scene_id, library_name, library_key, show=True)
+
+    def preload_gif(self, library_name, gif_filepath, gif_hash, scene_id=0):
+        """
+        Keeps the GIF or WebP file at gif_filepath in the display process' scene library under
+        library_name, without showing it, so show_cached_scene can switch to it later without
+        decoding or sending it again. Does nothing if the scene is already kept, or if there is
+        no library.
+        """
+        library_key = self._get_library_key(library_name, gif_hash)
+        if library_key is None or self._scene_library.has(library_name, library_key):
+            return
+
+        self._put_gif(gif_filepath, scene_id, library_name, library_key, show=False)
+
+    def show_cached_scene(self, library_name, gif_hash, scene_id=0):
+        """
+        Shows the scene gif_hash if it is still kept under library_name in the scene library.
+        Only its key crosses to the display process.
+        returns True if the scene is displayed, False if it isn't in the library, and needs to be
+        queued with queue_gif_to_display again.
+        """
+        library_key = self._get_library_key(library_name, gif_hash)
+        if library_key is None or not self._scene_library.has(library_name, library_key):
+            return False
+
+        if self._update_scene_hash_if_needed(gif_hash):
+            self._put_show_scene(library_name, library_key, scene_id)
+        return True
+
+    def queue_frames_to_display(self, frames, scene_hash, scene_id=0):
+        """
+        Queues already decoded frames to be displayed, unless scene_hash is the same as the scene
+        currently displayed. Used by display_agent.py, which receives decoded scenes from the
+        render host.
+        """
+        if not self._update_scene_hash_if_needed(scene_hash):
+            return
+
+        self._put_scene(frames, scene_id)
+
+    def queue_blank_to_display(self, scene_id=0):
+        """
+        Queues a black scene to be displayed. Used when there is nothing left worth showing.
+        """
+        if not self._update_scene_hash_if_needed(BLANK_SCENE_HASH):
+            return
+
+        self._put_scene(create_blank_frames(), scene_id)
+
+    def _get_library_key(self, library_name, gif_hash):
+        """
+        returns the key of the scene in the scene library, or None if it can't be kept there.
+        """
+        if (
+            library_name is None
+            or gif_hash is None
+            or self._scene_library.capacity <= 0
+        ):
+            return None
+        return gif_hash
+
+    def _put_gif(self, gif_filepath, scene_id, library_name, library_key, show):
+        if library_key is None:
+            library_name = None
+
+        if self._frame_stream_config.enabled:
+            # The file is overwritten by the next render, send its contents.
+            with open(gif_filepath, "rb") as gif_file:
+                data = gif_file.read()
+            scene = EncodedScene(
+                data,
+                scene_id,
+                library_name=library_name,
+                library_key=library_key,
+                show=show,
+            )
+        else:
+            with self._tracer.span("decode", scene_id=scene_id) as span:
+                frames = decode_scene(gif_filepath)
+                span.set_arg("frame_count", len(frames))
+            scene = Scene(
+                frames,
+                scene_id,
+                library_name=library_name,
+                library_key=library_key,
+                show=show,
+            )
+
+        if library_name is not None:
+            self._scene_library.put(library_name, library_key, None)
+        self._put(scene)
+
+    def _put_show_scene(self, library_name, library_key, scene_id):
+        # Marks the scene as used, like the display process will
+        self._scene_library.get(library_name, library_key)
+        self._put(ShowScene(library_name, library_key, scene_id))
+
+    def _put_scene(self, frames, scene_id):
+        self._put(Scene(frames, scene_id))
+
+    def _put(self, scene):
+        with self._tracer.span("scene_queue_put", scene_id=scene.scene_id):
+            scene.queued_at = time.perf_counter()
+            self._scene_queue.put(scene)
+
+    def get_display_pid(self):
+        return self._frame_writer_process.pid
+
+    def get_display_trace_spans(self):
+        """
+        returns the trace spans recorded by the display process. Blocks for up to
+        _TRACE_COLLECTION_TIMEOUT seconds, and returns [] if the display process doesn't respond
+        in time, or if tracing is disabled.
+        """
+        if not self._tracer.enabled:
+            return []
+
+        # Drop responses to earlier requests that timed out
+        try:
+            while True:
+                self._trace_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        self._scene_queue.put(_TRACE_REQUEST)
+        try:
+            return self._trace_queue.get(timeout=_TRACE_COLLECTION_TIMEOUT)
+        except queue.Empty:
+            print("Timed out waiting for trace spans from the display process.")
+            return []
 
     def set_brightness(self, brightness: float):
         self._brightness.value = round(brightness * _MAX_AD_HOC_BRIGHTNESS)
+        self._update_idle_state()
+
+    def set_filters(self, filters: FilterSettings):
+        """
+        Sets the colour filters applied to everything displayed from now on, including the
+        scene on display. See filters.FilterSettings
+        """
+        if filters == self._filters:
+            return
+        self._filters = filters
+        self._scene_queue.put(filters)
 
-    def _update_scene_metadata_if_needed(self, gif_hash, brightness):
+    def set_scene_brightness(self, brightness: float):
         """
-        returns True if metadata was updated, False instead
+        Sets the brightness the scheduled applet is shown at, including the scene on display.
+        Only the frames on display are redrawn: scenes don't need to be rendered or queued again.
+        A brightness of 0 puts the display in idle mode, see is_idle().
         """
-        curr_hash = self._current_scene_metadata["hash"]
-        curr_brightness = self._current_scene_metadata["brightness"]
+        if brightness == self._scene_brightness:
+            return
+        self._scene_brightness = brightness
+        self._scene_brightness_value.value = round(brightness * _MAX_AD_HOC_BRIGHTNESS)
+        if not self._update_idle_state():
+            # Redraw the scene on display right away, instead of when its frame expires
+            self._scene_queue.put(_WAKE_UP)
 
-        self._current_scene_metadata["hash"] = gif_hash
-        self._current_scene_metadata["brightness"] = brightness
+    def is_idle(self):
+        """
+        returns True if the effective brightness is 0, in which case the panel is blank and
+        there is no point rendering anything.
+        """
+        return self._idle.value != 0
+
+    def _update_idle_state(self):
+        """
+        returns True if the display entered or left idle mode.
+        """
+        idle = self._idle_at_zero_brightness and (
+            self._scene_brightness <= 0 or self._brightness.value == 0
+        )
+        if idle == self.is_idle():
+            return False
+
+        self._idle.value = idle
+        # Wake the display process up, so it can blank the panel or resume right away.
+        self._scene_queue.put(_WAKE_UP)
+        return True
+
+    def _update_scene_hash_if_needed(self, gif_hash):
+        """
+        returns True if gif_hash is a different scene than the one on display, False instead
+        """
+        curr_hash = self._current_scene_hash
+        self._current_scene_hash = gif_hash
 
         # return true if the current hash is None (can't detect if old and new gifs are same)
         #             or if the hash has changed
-        #             or if the brightness has changed
-        return (
-            curr_hash is None or curr_hash != gif_hash or curr_brightness != brightness
-        )
+        return curr_hash is None or curr_hash != gif_hash
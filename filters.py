@@ -0,0 +1,234 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from functools import lru_cache
+from PIL import Image, ImageEnhance
+from setup_exception import SetupException
+import math
+import numpy as np
+
+# Colour temperature (in K) of the panel's own white point. Leaves colours untouched.
+NEUTRAL_COLOR_TEMPERATURE = 6500
+_MIN_COLOR_TEMPERATURE = 1000
+_MAX_COLOR_TEMPERATURE = 40000
+
+# Offset of every channel's row in the flattened (3, 256) lookup table
+_CHANNEL_OFFSETS = np.array([0, 256, 512], dtype=np.uint16)
+
+
+@dataclass(frozen=True)
+class FilterSettings:
+    """
+    Colour filters applied by the display process to every frame, on top of the brightness.
+    Hashable, so it can key caches. See build_lut for how each setting is applied.
+    """
+
+    # Multiplier of the red, green and blue channels. Calibrates panels whose LEDs differ.
+    gain: tuple = (1.0, 1.0, 1.0)
+    # Exponent applied to every channel, scaled to [0, 1]. Above 1 darkens mid tones.
+    gamma: float = 1.0
+    # White point (in K). Lower is warmer. NEUTRAL_COLOR_TEMPERATURE leaves colours untouched.
+    color_temperature: int = NEUTRAL_COLOR_TEMPERATURE
+
+    def is_identity(self):
+        return self == FilterSettings()
+
+    @staticmethod
+    def from_config(config, base=None):
+        """
+        returns the FilterSettings of the config entry, with settings missing from it taken from
+        base (the defaults if None). Raises SetupException for invalid settings.
+        """
+        base = FilterSettings() if base is None else base
+        overrides = {
+            field.name: config[field.name]
+            for field in fields(FilterSettings)
+            if field.name in config
+        }
+        if isinstance(overrides.get("gain"), list):
+            overrides["gain"] = tuple(overrides["gain"])
+        settings = replace(base, **overrides)
+        settings._validate()
+        return settings
+
+    def _validate(self):
+        if (
+            not isinstance(self.gain, tuple)
+            or len(self.gain) != 3
+            or not all(_is_number(gain) and gain >= 0 for gain in self.gain)
+        ):
+            raise SetupException(
+                f"Invalid filter gain: {self.gain}. Must be 3 non-negative numbers."
+            )
+        if not _is_number(self.gamma) or self.gamma <= 0:
+            raise SetupException(f"Invalid filter gamma: {self.gamma}. Must be positive.")
+        if not _is_number(self.color_temperature) or not (
+            _MIN_COLOR_TEMPERATURE <= self.color_temperature <= _MAX_COLOR_TEMPERATURE
+        ):
+            raise SetupException(
+                f"Invalid filter color_temperature: {self.color_temperature}. Must be "
+                f"between {_MIN_COLOR_TEMPERATURE} and {_MAX_COLOR_TEMPERATURE}."
+            )
+
+
+def _is_number(value):
+    # bool is an int too, but true isn't a gain
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class FilterSchedule:
+    """
+    FilterSettings over the day. Built from the "filters" section of config.json: the settings at
+    the top level apply all day, and every "schedule" entry overrides some of them from its
+    start_time on, until the next entry. Like the brightness schedule, the last entry of the day
+    carries over past midnight.
+    parse_time turns a start_time ("hh:mm") into seconds since midnight.
+    """
+
+    def __init__(self, config, parse_time):
+        config = {} if config is None else config
+        self._base = FilterSettings.from_config(config)
+
+        # [(start_time in s since midnight, FilterSettings)], sorted by start_time
+        self._entries = []
+        for entry in config.get("schedule", []):
+            start_time = parse_time(entry["start_time"])
+            if any(start_time == entry_time for entry_time, _ in self._entries):
+                raise SetupException(
+                    f"Found two filter entries with the same start time: {entry['start_time']}"
+                )
+            self._entries.append(
+                (start_time, FilterSettings.from_config(entry, self._base))
+            )
+        self._entries.sort(key=lambda entry: entry[0])
+
+    def get_settings(self, day_time_secs):
+        """
+        returns the FilterSettings in effect at day_time_secs.
+        """
+        if not self._entries:
+            return self._base
+
+        settings = self._entries[-1][1]
+        for start_time, entry_settings in self._entries:
+            if start_time > day_time_secs:
+                break
+            settings = entry_settings
+        return settings
+
+    def get_next_change(self, day_time_secs):
+        """
+        returns the day time (in s since midnight) of the first schedule entry after
+        day_time_secs, possibly tomorrow, or None if the settings never change.
+        """
+        if not self._entries:
+            return None
+
+        for start_time, _ in self._entries:
+            if start_time > day_time_secs:
+                return start_time
+        return self._entries[0][0]
+
+
+def _color_temperature_gain(kelvin):
+    """
+    returns the (r, g, b) multipliers that turn white into the colour of a black body at kelvin,
+    relative to NEUTRAL_COLOR_TEMPERATURE. Uses Tanner Helland's fit of the black body curve.
+    """
+
+    def black_body_rgb(kelvin):
+        temp = kelvin / 100
+        if temp <= 66:
+            red = 255
+            green = 99.4708025861 * math.log(temp) - 161.1195681661
+        else:
+            red = 329.698727446 * (temp - 60) ** -0.1332047592
+            green = 288.1221695283 * (temp - 60) ** -0.0755148492
+        if temp >= 66:
+            blue = 255
+        elif temp <= 19:
+            blue = 0
+        else:
+            blue = 138.5177312231 * math.log(temp - 10) - 305.0447927307
+        return np.clip([red, green, blue], 0, 255)
+
+    return black_body_rgb(kelvin) / black_body_rgb(NEUTRAL_COLOR_TEMPERATURE)
+
+
+@lru_cache(maxsize=64)
+def build_lut(settings: FilterSettings, brightness=1.0):
+    """
+    returns a (3, 256) uint8 lookup table mapping every value of every channel to its filtered
+    value: gamma first, then the channel gain, colour temperature and brightness multipliers,
+    fused into a single multiplier per channel.
+    """
+    values = (np.arange(256) / 255) ** settings.gamma
+    channel_gain = (
+        np.array(settings.gain)
+        * _color_temperature_gain(settings.color_temperature)
+        * brightness
+    )
+    lut = np.rint(channel_gain[:, np.newaxis] * values[np.newaxis, :] * 255)
+    return np.clip(lut, 0, 255).astype(np.uint8)
+
+
+def apply_filters(img, settings: FilterSettings, brightness=1.0):
+    """
+    returns a new RGB image with settings and brightness applied to every pixel of img.
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if settings.is_identity():
+        # Scaling every channel by the same amount is cheaper in Pillow than a table lookup
+        return ImageEnhance.Brightness(img).enhance(brightness)
+    return apply_lut(img, build_lut(settings, brightness))
+
+
+def apply_lut(img, lut):
+    """
+    returns a new RGB image with lut (see build_lut) applied to every pixel of img.
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    # A single lookup in the flattened table, for all channels at once. Adding the uint16
+    # offsets widens the uint8 pixels, without copying them first.
+    indexes = np.asarray(img) + _CHANNEL_OFFSETS
+    return Image.frombytes("RGB", img.size, lut.ravel().take(indexes).tobytes())
+
+
+class FilteredImageCache:
+    """
+    Least recently used filtered images, keyed by source image and filter state. Frames played
+    again (loops, scene library replays, resident streamed frames) share their source images, so
+    each is only filtered once per filter state.
+    """
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        # {(id(source image), filter state): (source image, filtered image)}. Holding on to the
+        # source image keeps its id from being reused while it is cached.
+        self._images = OrderedDict()
+
+    def get(self, img, filter_state):
+        """
+        returns the filtered img for filter_state, or None.
+        """
+        key = (id(img), filter_state)
+        entry = self._images.get(key)
+        if entry is None:
+            return None
+        self._images.move_to_end(key)
+        return entry[1]
+
+    def put(self, img, filter_state, filtered_img):
+        key = (id(img), filter_state)
+        self._images[key] = (img, filtered_img)
+        self._images.move_to_end(key)
+        while len(self._images) > self._capacity:
+            self._images.popitem(last=False)
@@ -0,0 +1,56 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+import time
+
+_DEFAULT_REFRESH_RATE_HZ = 120
+
+
+class HeadlessCanvas:
+    """
+    Stands in for rgbmatrix.FrameCanvas. Only remembers the last image set on it.
+    """
+
+    def __init__(self):
+        self.image = None
+
+    def SetImage(self, image):
+        self.image = image
+
+    def Clear(self):
+        self.image = None
+
+
+class HeadlessMatrix:
+    """
+    Stands in for rgbmatrix.RGBMatrix when no panel is attached. SwapOnVSync waits for the next
+    (virtual) vsync like the real matrix does, so frame timing behaves the same. Used to run and
+    benchmark DisplayController on machines without the panel.
+    """
+
+    def __init__(self, refresh_rate_hz=_DEFAULT_REFRESH_RATE_HZ):
+        self._vsync_interval = 1 / refresh_rate_hz
+        # Canvas currently "on screen"
+        self.active_canvas = HeadlessCanvas()
+
+    def CreateFrameCanvas(self):
+        return HeadlessCanvas()
+
+    def SwapOnVSync(self, canvas):
+        """
+        Makes canvas the active canvas at the next vsync, and returns the previously active
+        canvas so it can be reused.
+        """
+        curr_time = time.perf_counter()
+        next_vsync = (curr_time // self._vsync_interval + 1) * self._vsync_interval
+        time.sleep(next_vsync - curr_time)
+
+        (prev_canvas, self.active_canvas) = (self.active_canvas, canvas)
+        return prev_canvas
+
+    def Clear(self):
+        self.active_canvas.Clear()
@@ -5,78 +5,367 @@
 # this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
 ###############################################################################
 
+import argparse
+import json
+import os
+import signal
 import time
 
 import asyncio
+from carousel import Carousel
+from clock import SECS_IN_A_DAY, SystemClock, secs_until_day_time
 from display_controller import DisplayControllerDelegator
 from pixlet_wrapper import PixletWrapper
+from refresh_requests import RefreshRequests
+from remote_display import REMOTE_BACKEND, RemoteDisplay
+from render_backoff import RenderFailureTracker
 from user_config import UserConfig
 from server import Server, Brightness
+from tracing import Tracer
 import uvicorn
 
 
 _SECS_IN_AN_HOUR = 60 * 60
-_SECS_IN_A_DAY = 24 * _SECS_IN_AN_HOUR
 _MS_TO_S = 0.001
 JSON_PATH = "config.json"
+TRACE_PATH_FORMAT = "trace-%Y%m%d-%H%M%S.json"  # formatted with time.strftime
 
 
 async def main():
-    with UserConfig(
-        JSON_PATH
-    ) as user_config, DisplayControllerDelegator() as display_controller, PixletWrapper() as pixlet_wrapper:
+    clock = SystemClock()
+    with UserConfig(JSON_PATH, clock) as user_config, _create_display_controller(
+        user_config
+    ) as display_controller, PixletWrapper(
+        user_config.get_process_scheduling(),
+        user_config.get_render_format(),
+        user_config.get_tracer(),
+    ) as pixlet_wrapper:
 
+        tracer = user_config.get_tracer()
         brightness_queue = asyncio.Queue[Brightness]()
+        render_tracker = RenderFailureTracker(
+            user_config.get_render_failure_policy(), clock
+        )
+        refresh_requests = RefreshRequests(user_config.get_applet_names())
+
+        def export_trace():
+            return _export_trace(tracer, display_controller)
 
-        if user_config.should_setup_brightness_api():
-            server_obj = Server(brightness_queue)
+        if tracer.enabled:
+            # `kill -USR1 <pid>` writes the current trace to a file. The event loop only keeps
+            # weak references to tasks, so the writes in progress are kept here.
+            trace_writes = set()
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR1,
+                lambda: _start_trace_write(export_trace, trace_writes),
+            )
+
+        if user_config.should_setup_server() or tracer.enabled:
+            server_obj = Server(
+                (
+                    brightness_queue
+                    if user_config.should_setup_brightness_api()
+                    else None
+                ),
+                export_trace if tracer.enabled else None,
+                render_tracker.get_status,
+                refresh_requests,
+            )
             config = uvicorn.Config(app=server_obj.app, host="0.0.0.0", port=8080)
             server = uvicorn.Server(config=config)
             asyncio.create_task(server.serve())
 
-        # start by forcing a render of the applet
-        (curr_applet, next_applet_time) = user_config.get_current_applet()
-        print(f"Displaying Applet: {curr_applet['name']}")
-        curr_render_time = _render_applet_if_needed(
-            pixlet_wrapper, display_controller, curr_applet
+        try:
+            await run_display_loop(
+                user_config,
+                display_controller,
+                pixlet_wrapper,
+                tracer,
+                render_tracker,
+                brightness_queue,
+                refresh_requests,
+                clock,
+            )
+        except KeyboardInterrupt:
+            pass
+
+
+def _create_display_controller(user_config):
+    """
+    returns the DisplayControllerDelegator to draw to, or a RemoteDisplay if the display is
+    driven by display_agent.py.
+    """
+    if user_config.get_display_backend() == REMOTE_BACKEND:
+        return RemoteDisplay(
+            user_config.get_display_listen_address(),
+            user_config.get_tracer(),
+            user_config.should_idle_at_zero_brightness(),
+            user_config.get_scene_library_size(),
         )
 
-        # main program loop
-        try:
-            while True:
-                if _should_update_applet(curr_applet, next_applet_time):
-                    (curr_applet, next_applet_time) = user_config.get_current_applet()
-                    # Force render the new applet
-                    print(f"Displaying Applet: {curr_applet['name']}")
-                    curr_render_time = _render_applet_if_needed(
-                        pixlet_wrapper, display_controller, curr_applet
+    return DisplayControllerDelegator(
+        user_config.get_process_scheduling(),
+        user_config.get_tracer(),
+        user_config.should_idle_at_zero_brightness(),
+        user_config.get_display_backend(),
+        user_config.get_frame_stream_config(),
+        user_config.get_scene_library_size(),
+    )
+
+
+async def run_display_loop(
+    user_config,
+    display_controller,
+    pixlet_wrapper,
+    tracer,
+    render_tracker,
+    brightness_queue,
+    refresh_requests,
+    clock,
+):
+    """
+    Main program loop. Keeps the display showing the applet scheduled for the current time (or
+    rotating through the applets scheduled), and re-renders dynamic applets as they expire, or
+    as refreshes are requested. Never returns.
+
+    All timing goes through clock, so the loop can be driven by a VirtualClock. See simulate.py
+    """
+    # The brightness and filters are applied by the display to whatever it shows, so their
+    # schedules are followed separately from the applets', without rendering anything.
+    brightness_changes_at = _update_scene_brightness(
+        clock, display_controller, user_config
+    )
+    filter_schedule = user_config.get_filter_schedule()
+    filters_change_at = _update_filters(clock, display_controller, filter_schedule)
+
+    # start by forcing a render of the applet
+    (slot, next_applet_time) = user_config.get_current_applet()
+    carousel = Carousel(slot, clock)
+    refresh_requests.set_slot(slot)
+    _start_slot(render_tracker, slot)
+    _show_current_applet(carousel)
+    _render_applet_if_needed(
+        pixlet_wrapper, display_controller, tracer, clock, render_tracker, carousel
+    )
+    carousel.start_dwell()
+    # Rotations are only worth rendering ahead for if the display keeps the scenes around
+    can_preload = user_config.get_scene_library_size() > 0
+
+    while True:
+        if (
+            brightness_changes_at is not None
+            and clock.monotonic() >= brightness_changes_at
+        ):
+            brightness_changes_at = _update_scene_brightness(
+                clock, display_controller, user_config
+            )
+        if filters_change_at is not None and clock.monotonic() >= filters_change_at:
+            filters_change_at = _update_filters(
+                clock, display_controller, filter_schedule
+            )
+
+        if _should_update_applet(clock, carousel.slot, next_applet_time):
+            (slot, next_applet_time) = user_config.get_current_applet()
+            carousel = Carousel(slot, clock)
+            refresh_requests.set_slot(slot)
+            _start_slot(render_tracker, slot)
+            # Force render the new applet
+            _show_current_applet(carousel)
+            _render_applet_if_needed(
+                pixlet_wrapper,
+                display_controller,
+                tracer,
+                clock,
+                render_tracker,
+                carousel,
+            )
+            carousel.start_dwell()
+        elif carousel.should_rotate() and not display_controller.is_idle():
+            carousel.rotate()
+            _show_current_applet(carousel)
+            backoff = render_tracker.get(carousel.current()["name"])
+            scene_hash = carousel.get_scene_hash()
+            if _is_past_stale_window(clock, backoff):
+                # Failing for too long: its last scene is too stale to be shown again. The
+                # fallback is shown below instead, until a render succeeds.
+                backoff.fallback_shown = False
+            elif scene_hash is None or not display_controller.show_cached_scene(
+                carousel.current()["name"], scene_hash, tracer.new_id()
+            ):
+                # Show the applet's last scene right away. It is re-rendered below if it
+                # expired, or if the display doesn't have it anymore.
+                carousel.forget_render()
+            if carousel.current()["dynamic"] or carousel.get_render_time() is None:
+                _render_applet_if_needed(
+                    pixlet_wrapper,
+                    display_controller,
+                    tracer,
+                    clock,
+                    render_tracker,
+                    carousel,
+                )
+            carousel.start_dwell()
+        elif carousel.current()["dynamic"] or carousel.get_render_time() is None:
+            # The render time is None if the applet still needs its first render. Ex: it was
+            # scheduled while the display was idle.
+            _render_applet_if_needed(
+                pixlet_wrapper,
+                display_controller,
+                tracer,
+                clock,
+                render_tracker,
+                carousel,
+            )
+
+        was_idle = display_controller.is_idle()
+        preload_time = (
+            _get_preload_time(carousel, render_tracker)
+            if can_preload and not was_idle
+            else None
+        )
+        if preload_time is not None and preload_time <= clock.monotonic():
+            _preload_applet(
+                pixlet_wrapper,
+                display_controller,
+                tracer,
+                clock,
+                render_tracker,
+                carousel,
+                carousel.get_upcoming_index(),
+            )
+            preload_time = _get_preload_time(carousel, render_tracker)
+
+        wakeup_time = _get_wake_up_time(
+            clock,
+            carousel.current(),
+            carousel.get_render_time(),
+            next_applet_time,
+            was_idle,
+            render_tracker.get(carousel.current()["name"]).get_next_action_time(),
+        )
+        for change_time in [brightness_changes_at, filters_change_at]:
+            if change_time is not None:
+                wakeup_time = min(wakeup_time, change_time)
+        if not was_idle:
+            # Nothing rotates while the display is idle
+            for event_time in [carousel.get_rotation_time(), preload_time]:
+                if event_time is not None:
+                    wakeup_time = min(wakeup_time, event_time)
+
+        while clock.monotonic() < wakeup_time:
+            try:
+                sleep_time = max(wakeup_time - clock.monotonic(), 0.001)
+                events = await clock.wait_for_items(
+                    [brightness_queue, refresh_requests.queue], sleep_time
+                )
+            except asyncio.TimeoutError:
+                # No new brightness or refresh. Let the loop continue
+                continue
+
+            should_wake_up = False
+            for queue, event in events:
+                if queue is brightness_queue:
+                    display_controller.set_brightness(event.brightness)
+                    # Entered or left idle mode. Re-evaluate what to render right away.
+                    should_wake_up |= display_controller.is_idle() != was_idle
+                    continue
+
+                schema_vals = refresh_requests.pop(event)
+                index = carousel.find(event)
+                if index is None:
+                    # Requested before the time slot changed. Applets are rendered from
+                    # scratch when they are shown next.
+                    print(f"Ignoring refresh of '{event}', it isn't scheduled anymore.")
+                    continue
+
+                print(f"Refreshing Applet: {event}")
+                applet = carousel.get_applet(index)
+                try:
+                    applet = UserConfig.with_schema_vals(applet, schema_vals)
+                except ValueError as e:
+                    # Checked against the time slot the request was made in
+                    print(f"Ignoring schema_vals of the refresh: {e}")
+                if carousel.is_current(index):
+                    _render_applet_if_needed(
+                        pixlet_wrapper,
+                        display_controller,
+                        tracer,
+                        clock,
+                        render_tracker,
+                        carousel,
+                        applet,
+                        force=True,
                     )
-                elif curr_applet["dynamic"]:
-                    curr_render_time = _render_applet_if_needed(
+                elif can_preload and not display_controller.is_idle():
+                    # Part of the rotation, but not on display. Ready it for its turn.
+                    _preload_applet(
                         pixlet_wrapper,
                         display_controller,
-                        curr_applet,
-                        curr_render_time,
+                        tracer,
+                        clock,
+                        render_tracker,
+                        carousel,
+                        index,
+                        applet,
                     )
+                # The applet's expiry moved
+                should_wake_up = True
 
-                wakeup_time = _get_wake_up_time(
-                    curr_applet, curr_render_time, next_applet_time
-                )
-                while time.perf_counter() < wakeup_time:
-                    try:
-                        sleep_time = max(wakeup_time - time.perf_counter(), 0.001)
-                        new_brightness = await asyncio.wait_for(
-                            brightness_queue.get(), timeout=sleep_time
-                        )
-                        display_controller.set_brightness(new_brightness.brightness)
-                    except asyncio.TimeoutError:
-                        # No new brightness. Let the loop continue
-                        pass
-        except KeyboardInterrupt:
-            pass
+            if should_wake_up:
+                break
+
+
+def _update_scene_brightness(clock, display_controller, user_config):
+    """
+    Applies the brightness scheduled for the current time to the display. The scene on display
+    is redrawn at the new brightness, it isn't rendered or queued again.
+    returns the clock.monotonic() time of the next scheduled change, or None if there is none.
+    """
+    (brightness, next_change) = user_config.get_current_brightness()
+    display_controller.set_scene_brightness(brightness)
+
+    if next_change is None:
+        return None
+    return clock.monotonic() + secs_until_day_time(clock, next_change)
+
+
+def _update_filters(clock, display_controller, filter_schedule):
+    """
+    Applies the filters scheduled for the current time to the display.
+    returns the clock.monotonic() time of the next scheduled change, or None if there is none.
+    """
+    day_time = clock.day_time_secs()
+    display_controller.set_filters(filter_schedule.get_settings(day_time))
+
+    next_change = filter_schedule.get_next_change(day_time)
+    if next_change is None:
+        return None
+    return clock.monotonic() + secs_until_day_time(clock, next_change)
+
+
+def _start_slot(render_tracker, slot):
+    """
+    Called as the time slot slot goes on display. Failures of its applets in earlier time slots
+    don't count towards their stale window in this one. Rotating between the applets of the
+    slot keeps their backoff and stale window going.
+    """
+    for applet in UserConfig.get_rotation(slot):
+        render_tracker.get(applet["name"]).reset_staleness()
+
+
+def _show_current_applet(carousel):
+    """
+    Called as the current applet of carousel goes on display, before it is shown.
+    """
+    print(f"Displaying Applet: {carousel.current()['name']}")
 
 
-def _should_update_applet(curr_applet, next_applet_time):
+def _is_past_stale_window(clock, backoff):
+    deadline = backoff.get_stale_deadline()
+    return deadline is not None and clock.monotonic() >= deadline
+
+
+def _should_update_applet(clock, curr_applet, next_applet_time):
     """
     returns True if the thread should ask UserConfig for a new applet, False otherwise
     """
@@ -85,7 +374,7 @@ def _should_update_applet(curr_applet, next_applet_time):
         return False
 
     curr_applet_time = curr_applet["start_time"]
-    curr_time = UserConfig.get_day_time_secs()
+    curr_time = clock.day_time_secs()
 
     # Simple case: next applet is scheduled for sometime today
     if curr_applet_time < next_applet_time:
@@ -103,15 +392,25 @@ def _should_update_applet(curr_applet, next_applet_time):
     return curr_time >= next_applet_time
 
 
-def _get_wake_up_time(curr_applet, curr_applet_render_time, next_applet_day_time):
+def _get_wake_up_time(
+    clock,
+    curr_applet,
+    curr_applet_render_time,
+    next_applet_day_time,
+    idle=False,
+    retry_time=None,
+):
     """
     Returns the time at which this thread should wake up. This could be to update the applet, to
     re-render the applet, or just to keep the OS from deprioritizing the script.
     This is calculated as minimum of time for curr_applet to update and time at which the current
     applet expires.
+    If idle is True, the display is blank and the current applet is never considered expired.
+    retry_time is the time at which a failing applet should be looked at again, or None if the
+    current applet isn't failing.
     """
-    curr_time = time.perf_counter()
-    curr_day_time = UserConfig.get_day_time_secs()
+    curr_time = clock.monotonic()
+    curr_day_time = clock.day_time_secs()
 
     # figure out time after which the applet should be updated
     if next_applet_day_time is None:
@@ -120,12 +419,18 @@ def _get_wake_up_time(curr_applet, curr_applet_render_time, next_applet_day_time
     elif curr_day_time > next_applet_day_time:
         # next_applet_time is the next day
         # Wait all of today + until next applet has to come up
-        time_to_next_applet = (_SECS_IN_A_DAY - curr_day_time) + next_applet_day_time
+        time_to_next_applet = (SECS_IN_A_DAY - curr_day_time) + next_applet_day_time
     else:
         # next_applet_time is on the same day
         time_to_next_applet = next_applet_day_time - curr_day_time
 
-    if not curr_applet["dynamic"]:
+    if idle:
+        # Nothing to show. Default to an hour
+        time_to_curr_applet = _SECS_IN_AN_HOUR
+    elif retry_time is not None:
+        # Failing applet, wait for the backoff
+        time_to_curr_applet = retry_time - curr_time
+    elif not curr_applet["dynamic"]:
         # Static applet, default to an hour
         time_to_curr_applet = _SECS_IN_AN_HOUR
     else:
@@ -141,36 +446,244 @@ def _get_wake_up_time(curr_applet, curr_applet_render_time, next_applet_day_time
 
 
 def _render_applet_if_needed(
-    pixlet_wrapper, display_controller, applet, curr_render_time=None
+    pixlet_wrapper,
+    display_controller,
+    tracer,
+    clock,
+    render_tracker,
+    carousel,
+    applet=None,
+    force=False,
 ):
     """
-    Queues passed applet to display_controller
-    current_render_time = None forces the applet to be queued
-    return the time at which the applet was queued to render
+    Renders the current applet of carousel and queues it to display_controller, if its last
+    render expired, or if it never rendered. The render is recorded in carousel.
+    applet replaces the current applet for this render. Ex: to render it with other schema_vals.
+    force = True renders the applet even if it hasn't expired, or is backing off from failures.
+    Used for refreshes requested through the API.
+    If the display is idle, nothing is rendered, and the applet renders once the display wakes
+    up.
+    Failing applets are only retried once their backoff expires. The last good scene keeps being
+    shown until the stale window expires, after which the fallback applet (or a blank screen)
+    is shown instead.
     """
-    if curr_render_time is None:
+    applet = carousel.current() if applet is None else applet
+    curr_render_time = carousel.get_render_time()
+    if display_controller.is_idle():
+        # Nothing would be visible. Render when the display wakes up.
+        carousel.forget_render()
+        return
+
+    backoff = render_tracker.get(applet["name"])
+    if force:
+        expired = True
+    elif backoff.is_failing():
+        # Retry as soon as the backoff allows, regardless of the refresh interval
+        expired = backoff.can_attempt()
+    elif curr_render_time is None:
         # Force expired
         expired = True
     else:
         expiry = curr_render_time + (applet["refresh_interval_ms"] * _MS_TO_S)
-        expired = time.perf_counter() >= expiry
+        expired = clock.monotonic() >= expiry
 
     if not expired:
         # return early if the applet has not expired yet
-        return curr_render_time
-
-    (gif_path, gif_hash) = pixlet_wrapper.create_gif_from_sketch(applet)
-    if gif_path is not None:
-        display_controller.queue_gif_to_display(
-            gif_path, gif_hash, applet["brightness"]
+        _show_fallback_if_stale(
+            pixlet_wrapper, display_controller, tracer, backoff, render_tracker, applet
         )
-    else:
+        return
+
+    render_start = clock.monotonic()
+    (gif_path, gif_hash) = _render_applet(
+        pixlet_wrapper, display_controller, tracer, applet
+    )
+
+    if gif_path is None:
         print(f"Error creating gif for '{applet['name']}'")
+        backoff.record_failure()
+        _show_fallback_if_stale(
+            pixlet_wrapper, display_controller, tracer, backoff, render_tracker, applet
+        )
         # didn't render, don't update render time
-        return curr_render_time
+        return
+
+    backoff.record_success()
+    carousel.record_render(gif_hash, clock.monotonic() - render_start)
+
+
+def _preload_applet(
+    pixlet_wrapper,
+    display_controller,
+    tracer,
+    clock,
+    render_tracker,
+    carousel,
+    index,
+    applet=None,
+):
+    """
+    Renders the applet at index of carousel, which isn't on display, into the display's scene
+    library, so rotating to it doesn't wait for the render. The render is recorded in carousel.
+    applet replaces the applet at index for this render.
+    Failures count towards the applet's backoff, but the fallback is only shown once the applet
+    is on display.
+    """
+    applet = carousel.get_applet(index) if applet is None else applet
+    backoff = render_tracker.get(applet["name"])
+
+    render_start = clock.monotonic()
+    (gif_path, gif_hash) = _render_applet(
+        pixlet_wrapper, display_controller, tracer, applet, preload=True
+    )
+    if gif_path is None:
+        print(f"Error creating gif for '{applet['name']}'")
+        backoff.record_failure()
+        return
+
+    backoff.record_success()
+    carousel.record_render(gif_hash, clock.monotonic() - render_start, index)
+
+
+def _get_preload_time(carousel, render_tracker):
+    """
+    returns the time at which the upcoming applet of carousel should be rendered ahead of its
+    turn, or None. Failing applets are rendered ahead no sooner than their backoff allows.
+    """
+    preload_time = carousel.get_preload_time()
+    if preload_time is None:
+        return None
+
+    backoff = render_tracker.get(carousel.get_applet(carousel.get_upcoming_index())["name"])
+    if backoff.is_failing():
+        return max(preload_time, backoff.next_attempt_time)
+    return preload_time
+
+
+def _render_applet(
+    pixlet_wrapper, display_controller, tracer, applet, preload=False, keep=True
+):
+    """
+    Renders applet and queues it to display_controller. The scene is kept in the display's scene
+    library under the applet's name, unless keep is False (Ex: for the fallback applet). If
+    preload is True, the scene is only added to the scene library.
+    returns (path of the rendered output, its hash), or (None, None) if the render failed.
+    """
+    library_name = applet["name"] if keep else None
+    render_id = tracer.new_id()
+    with tracer.span(
+        "render_applet", render_id=render_id, applet=applet["name"], preload=preload
+    ):
+        (gif_path, gif_hash) = pixlet_wrapper.create_gif_from_sketch(applet, render_id)
+        if gif_path is None:
+            return (None, None)
+
+        if preload:
+            display_controller.preload_gif(
+                applet["name"], gif_path, gif_hash, render_id
+            )
+        else:
+            display_controller.queue_gif_to_display(
+                gif_path, gif_hash, render_id, library_name
+            )
+    return (gif_path, gif_hash)
+
+
+def _show_fallback_if_stale(
+    pixlet_wrapper, display_controller, tracer, backoff, render_tracker, applet
+):
+    """
+    Replaces the stale scene of a failing applet with the fallback applet, or blanks the display
+    if there is no fallback (or it fails as well). Does nothing until the stale window expires.
+    """
+    if not backoff.should_show_fallback():
+        return
+
+    fallback_applet = render_tracker.policy.fallback_applet
+    print(f"'{applet['name']}' has been failing for too long. Showing fallback.")
+    if fallback_applet is None or (
+        _render_applet(
+            pixlet_wrapper,
+            display_controller,
+            tracer,
+            fallback_applet,
+            keep=False,
+        )[0]
+        is None
+    ):
+        display_controller.queue_blank_to_display(tracer.new_id())
+    backoff.fallback_shown = True
+
+
+def _export_trace(tracer, display_controller):
+    """
+    returns spans of both the main and the display process in the Chrome trace format.
+    Blocks while spans are collected from the display process.
+    """
+    spans = tracer.get_spans() + display_controller.get_display_trace_spans()
+    process_names = {os.getpid(): "main"}
+    display_pid = display_controller.get_display_pid()
+    if display_pid is not None:
+        process_names[display_pid] = "display"
+    return Tracer.to_chrome_trace(spans, process_names)
+
+
+def _start_trace_write(export_trace, trace_writes):
+    """
+    Writes the trace to a file in the background, keeping the task in trace_writes until it is
+    done.
+    """
+    task = asyncio.create_task(asyncio.to_thread(_write_trace, export_trace))
+    trace_writes.add(task)
+    task.add_done_callback(lambda task: _finish_trace_write(task, trace_writes))
+    return task
+
+
+def _finish_trace_write(task, trace_writes):
+    trace_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Failed to write trace: {task.exception()!r}")
+
+
+def _write_trace(export_trace):
+    trace_path = time.strftime(TRACE_PATH_FORMAT)
+    with open(trace_path, "w") as trace_file:
+        json.dump(export_trace(), trace_file)
+    print(f"Wrote trace to {trace_path}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(
+        description="Renders the applets of config.json to the LED matrix."
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="instead of driving the display, render every applet a few times and project the "
+        "renders and CPU time a day of the schedule",
+    )
+    parser.add_argument(
+        "--renders", type=int, default=5, help="renders per applet with --plan"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="applets rendered at the same time with --plan. 1 measures renders without "
+        "contention",
+    )
+    parser.add_argument("--json", help="file to also write the plan to with --plan")
+    args = parser.parse_args()
+
+    if not args.plan:
+        asyncio.run(main())
+        return
+
+    # planner replays the schedule with simulate.py, which imports this module
+    import planner
 
-    return time.perf_counter()
+    planner.run(JSON_PATH, args.renders, args.workers, args.json)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main_cli()
@@ -5,9 +5,13 @@
 # this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
 ###############################################################################
 
+import os
 import subprocess
+from dataclasses import dataclass
 from os import path, symlink, makedirs
 from setup_exception import SetupException
+from scene import RENDER_FORMATS
+from tracing import Tracer
 
 _WORKING_DIR_ROOT = ""
 _OUTPUT_DIR = path.join(_WORKING_DIR_ROOT, "gifs")
@@ -15,9 +19,39 @@ _OUTPUT_DIR = path.join(_WORKING_DIR_ROOT, "gifs")
 # this path is a workaround for pixlet bug https://github.com/tidbyt/pixlet/issues/1082
 _INPUT_DIR = path.join(_WORKING_DIR_ROOT, "input")
 
+# `pixlet render` flags selecting every one of scene.RENDER_FORMATS. pixlet renders to WebP
+# unless --gif is passed, and has no --webp flag.
+_RENDER_FORMAT_FLAGS = {"gif": ["--gif"], "webp": []}
+
+
+@dataclass(frozen=True)
+class RenderUsage:
+    """
+    Resources used by a pixlet process.
+    """
+
+    # CPU time (in s), user and system
+    cpu_secs: float
+    # Peak resident set size (in KiB)
+    max_rss_kb: int
+
 
 class PixletWrapper:
-    def __init__(self):
+    def __init__(self, process_scheduling=None, render_format="gif", tracer=None):
+        # ProcessScheduling object used to confine render processes. None to run them as is.
+        self._process_scheduling = process_scheduling
+
+        # Tracer to record render spans to.
+        self._tracer = Tracer() if tracer is None else tracer
+
+        # One of scene.RENDER_FORMATS. Format pixlet should render the applets to.
+        if render_format not in RENDER_FORMATS:
+            raise SetupException(f"Unsupported render format: {render_format}")
+        self._render_format = render_format
+
+        # {applet name: RenderUsage of its last pixlet run}. See get_last_usage()
+        self._last_usage = {}
+
         cmd_out = subprocess.run(["which", "pixlet"])
         if cmd_out.returncode != 0:
             print("Command 'pixlet' not found.")
@@ -52,9 +86,11 @@ class PixletWrapper:
         else:
             print("Deleted dir:", _INPUT_DIR)
 
-    def create_gif_from_sketch(self, applet):
+    def create_gif_from_sketch(self, applet, render_id=0):
         """
-        returns (path_to_gif, md5 checksum of gif)
+        returns (path_to_output, md5 checksum of output)
+        The output is a GIF or WebP file, depending on the render format.
+        render_id is attached to the trace spans of this render.
         """
         applet_path = path.abspath(applet["path"])
         applet_file = applet_path.split("/")[-1]
@@ -73,22 +109,36 @@ class PixletWrapper:
             makedirs(input_dir, exist_ok=True)
             symlink(applet_path, input_path)
 
-        output_name = applet_name + ".gif"
+        output_name = applet_name + RENDER_FORMATS[self._render_format]
         output_path = _OUTPUT_DIR + "/" + output_name
 
-        rm = subprocess.run(["rm", "-rf", output_path])
+        with self._tracer.span("remove_previous_output", render_id=render_id):
+            rm = subprocess.run(["rm", "-rf", output_path])
         if rm.returncode != 0:
             print("Failed to remove previous gif:", output_path)
             return (None, None)
 
-        cmd = ["pixlet", "render", "--gif", "--output", output_path, input_path]
-        cmd.extend(applet["cmd_args"])
-        pixlet_out = subprocess.run(cmd)
-        if pixlet_out.returncode != 0:
+        cmd = _get_render_cmd(
+            self._render_format,
+            input_path,
+            output_path,
+            applet["cmd_args"],
+            (
+                []
+                if self._process_scheduling is None
+                else self._process_scheduling.render_cmd_prefix()
+            ),
+        )
+        # pixlet startup, Starlark execution and writing the output all happen inside the
+        # pixlet process, so they can only be traced as one span.
+        with self._tracer.span("pixlet_render", render_id=render_id):
+            (returncode, self._last_usage[applet["name"]]) = _run_measured(cmd)
+        if returncode != 0:
             print("Failed to create gif from applet:", input_path)
             return (None, None)
 
-        md5_proc = subprocess.run(["md5sum", output_path], capture_output=True)
+        with self._tracer.span("hash_output", render_id=render_id):
+            md5_proc = subprocess.run(["md5sum", output_path], capture_output=True)
         if md5_proc.returncode != 0:
             print("Successfully created gif but failed to generate hash.")
             return (output_path, None)
@@ -98,3 +148,48 @@ class PixletWrapper:
         md5_hash = md5_output.split(" ")[0]
 
         return (output_path, md5_hash)
+
+    def get_last_usage(self, applet_name):
+        """
+        returns the RenderUsage of the last pixlet run for the applet called applet_name, or None
+        if it never ran.
+        """
+        return self._last_usage.get(applet_name)
+
+
+def _get_render_cmd(render_format, input_path, output_path, cmd_args, cmd_prefix=()):
+    """
+    returns the command rendering the applet at input_path to output_path in render_format.
+    cmd_args are the applet's pixlet arguments, and cmd_prefix the command confining the
+    render. See ProcessScheduling.render_cmd_prefix
+    """
+    return [
+        *cmd_prefix,
+        "pixlet",
+        "render",
+        *_RENDER_FORMAT_FLAGS[render_format],
+        "--output",
+        output_path,
+        input_path,
+        *cmd_args,
+    ]
+
+
+def _run_measured(cmd):
+    """
+    Runs cmd to completion like subprocess.run.
+    returns (exit code, RenderUsage of the process). Commands that exec the next one (Ex: the
+    taskset and nice prefixes of ProcessScheduling) are measured along with it.
+    """
+    process = subprocess.Popen(cmd)
+    try:
+        (_, wait_status, rusage) = os.wait4(process.pid, 0)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+
+    # The process is reaped, let Popen know so it doesn't wait for it again
+    process.returncode = os.waitstatus_to_exitcode(wait_status)
+    usage = RenderUsage(rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss)
+    return (process.returncode, usage)
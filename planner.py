@@ -0,0 +1,259 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Capacity planner. Renders every applet of config.json a few times with pixlet, without
+## touching the display, and measures what each render costs. The schedule is then replayed over
+## a virtual day (see simulate.py) with renders taking as long as measured, to project how many
+## renders a day the config asks for and how much CPU they use.
+##
+## Run with:
+##     python main.py --plan [--renders 5] [--workers 4] [--json plan.json]
+
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+from clock import SECS_IN_A_DAY
+from pixlet_wrapper import PixletWrapper
+from scene import decode_scene
+from user_config import UserConfig
+import contextlib
+import io
+import json
+import os
+import statistics
+import time
+
+import simulate
+
+_MS_TO_S = 0.001
+_S_TO_MS = 1000
+# time (in s) renders of applets that never rendered are assumed to take. Same as simulate.py
+_UNMEASURED_RENDER_TIME = 0.5
+
+
+def get_applets(user_config):
+    """
+    returns every scheduled applet, including the applets of rotations, once per name.
+    """
+    applets = {}
+    for _, slot in user_config.get_schedule():
+        for applet in UserConfig.get_rotation(slot):
+            applets.setdefault(applet["name"], applet)
+    return list(applets.values())
+
+
+def profile_applets(pixlet_wrapper, applets, render_count, workers):
+    """
+    Renders every applet render_count times, up to workers applets at a time. Applets rendered
+    from files with the same name share pixlet's input and output paths, so they are rendered
+    one after the other.
+    returns {applet name: profile}, in the order of applets. See profile_applet
+    """
+    groups = {}
+    for applet in applets:
+        file_name = path.basename(applet["path"]).split(".")[0]
+        groups.setdefault(file_name, []).append(applet)
+
+    def profile_group(group):
+        return [
+            (applet["name"], profile_applet(pixlet_wrapper, applet, render_count))
+            for applet in group
+        ]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        profiles = dict(
+            entry
+            for group_profiles in executor.map(profile_group, groups.values())
+            for entry in group_profiles
+        )
+    return {applet["name"]: profiles[applet["name"]] for applet in applets}
+
+
+def profile_applet(pixlet_wrapper, applet, render_count):
+    """
+    Renders applet render_count times, and decodes every render like the display would.
+    returns a dict with the number of successful and failed renders, and the render latency,
+    CPU time and peak resident memory of pixlet, decode time, frames per scene and decoded scene
+    size. Measurements are None if every render failed.
+    """
+    samples = []
+    failures = 0
+    for _ in range(render_count):
+        start = time.perf_counter()
+        (gif_path, _) = pixlet_wrapper.create_gif_from_sketch(applet)
+        render_secs = time.perf_counter() - start
+        if gif_path is None:
+            failures += 1
+            continue
+        usage = pixlet_wrapper.get_last_usage(applet["name"])
+
+        start = time.perf_counter()
+        frames = decode_scene(gif_path)
+        decode_secs = time.perf_counter() - start
+        scene_bytes = sum(
+            len(frame.img.getbands()) * frame.img.width * frame.img.height
+            for frame in frames
+        )
+        samples.append((render_secs, usage, decode_secs, len(frames), scene_bytes))
+
+    profile = {
+        "dynamic": applet["dynamic"],
+        "refresh_interval_ms": applet["refresh_interval_ms"],
+        "renders": len(samples),
+        "failures": failures,
+        "render_ms_mean": None,
+        "render_ms_max": None,
+        "pixlet_cpu_ms": None,
+        "pixlet_max_rss_kb": None,
+        "decode_ms": None,
+        "frames": None,
+        "scene_kb": None,
+    }
+    if not samples:
+        return profile
+
+    (render_secs, usages, decode_secs, frame_counts, scene_bytes) = zip(*samples)
+    profile.update(
+        {
+            "render_ms_mean": _S_TO_MS * statistics.mean(render_secs),
+            "render_ms_max": _S_TO_MS * max(render_secs),
+            "pixlet_cpu_ms": _S_TO_MS
+            * statistics.mean(usage.cpu_secs for usage in usages),
+            "pixlet_max_rss_kb": max(usage.max_rss_kb for usage in usages),
+            "decode_ms": _S_TO_MS * statistics.mean(decode_secs),
+            "frames": max(frame_counts),
+            "scene_kb": max(scene_bytes) / 1024,
+        }
+    )
+    return profile
+
+
+def project_day(config_path, profiles):
+    """
+    Replays a day of the schedule in config_path (see simulate.py), with every applet's renders
+    taking as long as they took on average in profiles.
+    returns {applet name: renders a day}
+    """
+    render_times = {
+        name: profile["render_ms_mean"] * _MS_TO_S
+        for name, profile in profiles.items()
+        if profile["render_ms_mean"] is not None
+    }
+    # The main loop prints every applet it shows
+    with contextlib.redirect_stdout(io.StringIO()):
+        (_, stats, _) = simulate.run_simulation(
+            config_path, 1, 0, _UNMEASURED_RENDER_TIME, render_times=render_times
+        )
+    return stats.renders_per_applet
+
+
+def get_plan(profiles, renders_per_day, cpu_count):
+    """
+    returns the plan: profiles with the renders and CPU time a day of every applet added, along
+    with the totals for the day. The CPU time of a render is the CPU time of pixlet and of
+    decoding its output.
+    """
+    applets = {}
+    totals = {"renders_per_day": 0, "render_secs_per_day": 0.0, "cpu_secs_per_day": 0.0}
+    for name, profile in profiles.items():
+        renders = renders_per_day.get(name, 0)
+        applet_plan = {**profile, "renders_per_day": renders}
+        applet_plan["cpu_secs_per_day"] = None
+        if profile["renders"] > 0:
+            cpu_secs = (
+                renders * (profile["pixlet_cpu_ms"] + profile["decode_ms"]) * _MS_TO_S
+            )
+            applet_plan["cpu_secs_per_day"] = cpu_secs
+            totals["renders_per_day"] += renders
+            totals["render_secs_per_day"] += (
+                renders * profile["render_ms_mean"] * _MS_TO_S
+            )
+            totals["cpu_secs_per_day"] += cpu_secs
+
+        # Renders happen one after the other: an applet that takes longer to render than its
+        # refresh interval is re-rendered back to back, and still shows stale scenes.
+        applet_plan["slower_than_refresh"] = (
+            profile["dynamic"]
+            and profile["render_ms_mean"] is not None
+            and profile["render_ms_mean"] > profile["refresh_interval_ms"]
+        )
+        applets[name] = applet_plan
+
+    totals["render_busy_fraction"] = totals["render_secs_per_day"] / SECS_IN_A_DAY
+    totals["cpu_duty_cycle"] = totals["cpu_secs_per_day"] / SECS_IN_A_DAY
+    totals["cpu_count"] = cpu_count
+    totals["cpu_duty_cycle_all_cores"] = totals["cpu_duty_cycle"] / cpu_count
+    return {"applets": applets, "day": totals}
+
+
+def print_plan(plan, render_count, workers):
+    print(f"Rendered every applet {render_count} times, {workers} applet(s) at a time.\n")
+
+    print(
+        f"{'applet':<20} {'ok/fail':>8} {'render ms':>16} {'cpu ms':>8} {'decode ms':>10} "
+        f"{'frames':>7} {'rss MiB':>8} {'scene KiB':>10} {'refresh ms':>11} "
+        f"{'renders/day':>12} {'cpu s/day':>10}"
+    )
+    for name, applet in plan["applets"].items():
+        status = f"{applet['renders']}/{applet['failures']}"
+        if applet["renders"] == 0:
+            print(f"{name:<20} {status:>8}  every render failed")
+            continue
+
+        render_ms = f"{applet['render_ms_mean']:.0f} (max {applet['render_ms_max']:.0f})"
+        print(
+            f"{name:<20} {status:>8} {render_ms:>16} {applet['pixlet_cpu_ms']:>8.0f} "
+            f"{applet['decode_ms']:>10.1f} {applet['frames']:>7} "
+            f"{applet['pixlet_max_rss_kb'] / 1024:>8.1f} {applet['scene_kb']:>10.1f} "
+            f"{applet['refresh_interval_ms']:>11} {applet['renders_per_day']:>12} "
+            f"{applet['cpu_secs_per_day']:>10.0f}"
+        )
+
+    day = plan["day"]
+    print(
+        f"\nProjected day: {day['renders_per_day']} renders, rendering "
+        f"{100 * day['render_busy_fraction']:.1f}% of the time."
+    )
+    print(
+        f"CPU: {day['cpu_secs_per_day']:.0f}s a day, a duty cycle of "
+        f"{100 * day['cpu_duty_cycle']:.1f}% of one core, "
+        f"{100 * day['cpu_duty_cycle_all_cores']:.1f}% of {day['cpu_count']} cores."
+    )
+
+    slow = [name for name, applet in plan["applets"].items() if applet["slower_than_refresh"]]
+    for name in slow:
+        applet = plan["applets"][name]
+        print(
+            f"WARNING: '{name}' takes {applet['render_ms_mean']:.0f}ms to render, longer than "
+            f"its refresh_interval_ms of {applet['refresh_interval_ms']}."
+        )
+
+
+def run(config_path, render_count, workers, json_path=None):
+    """
+    Profiles every applet of the config at config_path, and prints the plan for a day as a
+    table. The plan is also written to json_path as JSON, if set.
+    """
+    with UserConfig(config_path) as user_config, PixletWrapper(
+        user_config.get_process_scheduling(),
+        user_config.get_render_format(),
+    ) as pixlet_wrapper:
+        profiles = profile_applets(
+            pixlet_wrapper, get_applets(user_config), render_count, workers
+        )
+
+    plan = get_plan(profiles, project_day(config_path, profiles), os.cpu_count() or 1)
+    print_plan(plan, render_count, workers)
+    if json_path is None:
+        return
+
+    with open(json_path, "w") as json_file:
+        json.dump(
+            {"renders_per_applet": render_count, "workers": workers, **plan},
+            json_file,
+            indent=4,
+        )
+    print(f"Wrote plan to {json_path}")
@@ -0,0 +1,163 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+import os
+import subprocess
+from setup_exception import SetupException
+
+_SCHED_POLICIES = {
+    "other": getattr(os, "SCHED_OTHER", None),
+    "fifo": getattr(os, "SCHED_FIFO", None),
+    "rr": getattr(os, "SCHED_RR", None),
+}
+_MIN_RT_PRIORITY = 1
+_MAX_RT_PRIORITY = 99
+_MIN_NICE = -20
+_MAX_NICE = 19
+
+
+class ProcessScheduling:
+    """
+    CPU affinity and scheduling policy for the DisplayController process and the pixlet render
+    subprocesses. Everything here is best effort: if the OS or the user's permissions don't allow
+    a setting, a warning is printed and the process keeps running with the default scheduling.
+    """
+
+    def __init__(self, config=None):
+        config = {} if config is None else config
+
+        # CPUs reserved for the DisplayController process. Empty list means no pinning.
+        self.display_cpus = list(config.get("display_cpus", []))
+        # One of _SCHED_POLICIES
+        self.display_policy = config.get("display_policy", "other")
+        # Real-time priority for "fifo" and "rr" policies. Ignored for "other"
+        self.display_priority = config.get("display_priority", 50)
+        # Niceness added to pixlet render subprocesses. 0 leaves them untouched.
+        self.render_nice = config.get("render_nice", 0)
+
+        self._validate()
+
+        # Command prefix used to confine render subprocesses. Lazily initialized by
+        # render_cmd_prefix()
+        self._render_cmd_prefix = None
+
+    def _validate(self):
+        for cpu in self.display_cpus:
+            if not _is_int(cpu) or cpu < 0:
+                raise SetupException(
+                    f"Invalid display_cpus entry: {cpu}. Must be a non-negative integer."
+                )
+        self.display_cpus = sorted(set(self.display_cpus))
+
+        if self.display_policy not in _SCHED_POLICIES:
+            raise SetupException(
+                f"Invalid display_policy: {self.display_policy}. "
+                f"Must be one of {list(_SCHED_POLICIES.keys())}"
+            )
+
+        if not _is_int(self.display_priority) or (
+            self.display_policy != "other"
+            and not (_MIN_RT_PRIORITY <= self.display_priority <= _MAX_RT_PRIORITY)
+        ):
+            raise SetupException(
+                f"Invalid display_priority: {self.display_priority}. Must be between "
+                f"{_MIN_RT_PRIORITY} and {_MAX_RT_PRIORITY} inclusive."
+            )
+
+        if not _is_int(self.render_nice) or not (
+            _MIN_NICE <= self.render_nice <= _MAX_NICE
+        ):
+            raise SetupException(
+                f"Invalid render_nice: {self.render_nice}. Must be between "
+                f"{_MIN_NICE} and {_MAX_NICE} inclusive."
+            )
+
+    def apply_to_display_process(self):
+        """
+        Pins the calling process to display_cpus and applies the display scheduling policy.
+        Must be called from the DisplayController process before the RGB Matrix is set up, so the
+        matrix refresh thread inherits the affinity and the process still has root privileges.
+        """
+        if self.display_cpus:
+            try:
+                os.sched_setaffinity(0, self.display_cpus)
+                print(f"DisplayController pinned to CPUs: {self.display_cpus}")
+            except (AttributeError, OSError) as e:
+                print(f"Failed to pin DisplayController to {self.display_cpus}: {e}")
+
+        if self.display_policy == "other":
+            return
+
+        policy = _SCHED_POLICIES[self.display_policy]
+        try:
+            os.sched_setscheduler(0, policy, os.sched_param(self.display_priority))
+            print(
+                f"DisplayController scheduling set to {self.display_policy.upper()}, "
+                f"priority {self.display_priority}"
+            )
+        except (AttributeError, TypeError, OSError) as e:
+            print(
+                f"Failed to set DisplayController scheduling to "
+                f"{self.display_policy.upper()}: {e}"
+            )
+            print("Continuing with the default scheduling policy.")
+
+    def render_cmd_prefix(self):
+        """
+        Returns the list of arguments to prepend to a render command so it runs on the CPUs not
+        reserved for the display, with the configured niceness. Returns [] if nothing needs to be
+        (or can be) applied.
+        """
+        if self._render_cmd_prefix is None:
+            self._render_cmd_prefix = self._build_render_cmd_prefix()
+        return self._render_cmd_prefix
+
+    def _build_render_cmd_prefix(self):
+        prefix = []
+
+        render_cpus = self._get_render_cpus()
+        if render_cpus:
+            if _is_cmd_available("taskset"):
+                prefix.extend(["taskset", "-c", ",".join(str(c) for c in render_cpus)])
+            else:
+                print("Command 'taskset' not found. Render processes will not be pinned.")
+
+        if self.render_nice != 0:
+            if _is_cmd_available("nice"):
+                prefix.extend(["nice", "-n", str(self.render_nice)])
+            else:
+                print("Command 'nice' not found. Render niceness will not be applied.")
+
+        return prefix
+
+    def _get_render_cpus(self):
+        """
+        returns the CPUs render processes should run on, or [] if they shouldn't be pinned.
+        """
+        if not self.display_cpus:
+            return []
+
+        try:
+            available_cpus = os.sched_getaffinity(0)
+        except (AttributeError, OSError):
+            return []
+
+        render_cpus = sorted(available_cpus - set(self.display_cpus))
+        if not render_cpus:
+            print("display_cpus covers all available CPUs. Render processes will not be pinned.")
+            return []
+
+        return render_cpus
+
+
+def _is_cmd_available(cmd):
+    return subprocess.run(["which", cmd], capture_output=True).returncode == 0
+
+
+def _is_int(value):
+    # bool is an int too, but true isn't a priority or a CPU
+    return isinstance(value, int) and not isinstance(value, bool)
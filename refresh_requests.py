@@ -0,0 +1,85 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from user_config import UserConfig
+import asyncio
+
+
+class RefreshRequests:
+    """
+    Out-of-band renders requested through POST /applets/{name}/refresh, waiting for the main
+    loop. There is at most one pending request per applet: a request for an applet that is
+    already pending is coalesced into it, so a burst of triggers costs a single render.
+    """
+
+    def __init__(self, applet_names):
+        self._applet_names = set(applet_names)
+        # {applet name: keys of the applet's schema_vals}, for the applets of the time slot on
+        # display. See set_slot
+        self._slot_schema_keys = {}
+        # {applet name: schema_vals overrides, or None}, for every request the main loop hasn't
+        # picked up yet
+        self._pending = {}
+        # Names of applets with a pending request, in the order they were requested. The main
+        # loop waits on this along with the brightness queue.
+        self.queue = asyncio.Queue[str]()
+        self.total_requests = 0
+        self.coalesced_requests = 0
+
+    def set_slot(self, slot):
+        """
+        Called by the main loop as the time slot slot goes on display. Only its applets can be
+        refreshed, with overrides of their own schema_vals.
+        """
+        self._slot_schema_keys = {
+            applet["name"]: set(applet.get("schema_vals", {}))
+            for applet in UserConfig.get_rotation(slot)
+        }
+
+    def has_applet(self, name):
+        return name in self._applet_names
+
+    def is_in_slot(self, name):
+        """
+        returns True if applet name is part of the time slot on display.
+        """
+        return name in self._slot_schema_keys
+
+    def get_invalid_keys(self, name, schema_vals):
+        """
+        returns the keys of schema_vals that can't be overridden for applet name of the time slot
+        on display, sorted.
+        """
+        return UserConfig.get_invalid_schema_keys(
+            self._slot_schema_keys.get(name, set()), schema_vals or {}
+        )
+
+    def request(self, name, schema_vals=None):
+        """
+        Requests a render of the applet name. schema_vals are merged over the applet's own
+        schema_vals for this render only. If a request for the applet is already pending,
+        schema_vals are merged into it instead, later values winning.
+        returns True if a new request was queued, False if it was coalesced.
+        """
+        self.total_requests += 1
+        if name in self._pending:
+            self.coalesced_requests += 1
+            if schema_vals:
+                self._pending[name] = {**(self._pending[name] or {}), **schema_vals}
+            return False
+
+        self._pending[name] = schema_vals or None
+        self.queue.put_nowait(name)
+        return True
+
+    def pop(self, name):
+        """
+        Marks the request for applet name as picked up. Requests made after this queue a new
+        render.
+        returns the schema_vals overrides of the request, or None.
+        """
+        return self._pending.pop(name, None)
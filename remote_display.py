@@ -0,0 +1,334 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from dataclasses import asdict, replace
+from display_controller import BLANK_SCENE_HASH, create_blank_frames
+from filters import FilterSettings
+from scene import Scene, SceneLibrary, decode_scene
+from tracing import Tracer
+import json
+import scene_transport
+import socket
+import threading
+
+# Display backend that streams scenes to display_agent.py instead of drawing them
+REMOTE_BACKEND = "remote"
+# Agents aren't authenticated: only local agents can connect, unless listen_address is set
+DEFAULT_LISTEN_ADDRESS = "127.0.0.1:9090"
+
+# time (in s) a connected agent has to say hello, and a send may block before the agent is
+# considered gone.
+_AGENT_TIMEOUT = 5
+
+
+class RemoteDisplay:
+    """
+    Stands in for DisplayControllerDelegator when the panel is driven by display_agent.py,
+    possibly on another machine. Applets are still rendered and decoded here, and the frames are
+    streamed to the agent delta compressed (see scene_transport.py), so the display machine
+    only has to draw them.
+
+    One agent is served at a time. A new connection replaces the previous one, and is sent the
+    current brightness and scene right away. While no agent is connected, scenes are only
+    remembered.
+
+    The scene library is kept here, decoded: switching back to a scene in it skips decoding,
+    but the scene is still sent to the agent.
+    """
+
+    def __init__(
+        self,
+        listen_address=DEFAULT_LISTEN_ADDRESS,
+        tracer=None,
+        idle_at_zero_brightness=True,
+        scene_library_size=0,
+    ):
+        self._listen_address = listen_address
+        self._tracer = Tracer() if tracer is None else tracer
+        self._idle_at_zero_brightness = idle_at_zero_brightness
+        # Decoded scenes, see SceneLibrary. Only used by the main thread.
+        self._scene_library = SceneLibrary(scene_library_size)
+
+        # Guards everything below, which is shared with the thread accepting agents
+        self._lock = threading.Lock()
+        self._agent_socket = None
+        self._encoder = scene_transport.SceneEncoder()
+        # (scene hash, Scene) of the last scene queued. Sent to agents as they connect.
+        self._last_scene = None
+        # Hash of the scene on display
+        self._current_scene_hash = None
+        # Brightness set by set_brightness. None until it is first set.
+        self._brightness = None
+        # Brightness multiplier of the scheduled applet. See set_scene_brightness()
+        self._scene_brightness = 1.0
+        self._filters = FilterSettings()
+        self._idle = False
+
+        # Transfer statistics. See get_stats()
+        self._scenes_sent = 0
+        self._bytes_sent = 0
+        self._raw_bytes_sent = 0
+
+    def __enter__(self):
+        self._server_socket = scene_transport.listen(self._listen_address)
+        self._accept_thread = threading.Thread(target=self._accept_agents, daemon=True)
+        self._accept_thread.start()
+        print(f"Waiting for display agents on {self._listen_address}")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Unblocks accept() in the accept thread.
+        try:
+            self._server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server_socket.close()
+        self._accept_thread.join()
+        with self._lock:
+            self._disconnect_agent()
+
+    def queue_gif_to_display(self, gif_filepath, gif_hash, scene_id=0, library_name=None):
+        """
+        Decodes the GIF or WebP file at gif_filepath and sends it to the agent, unless it is the
+        same as the scene currently displayed. If library_name is set, the decoded scene is kept
+        in the scene library under that name, or taken from there if it is already kept.
+        """
+        if not self._update_scene_hash_if_needed(gif_hash):
+            return
+
+        scene = self._scene_library.get(library_name, gif_hash)
+        if scene is None:
+            scene = self._decode_scene(gif_filepath, gif_hash, scene_id, library_name)
+        self._queue_scene(gif_hash, replace(scene, scene_id=scene_id))
+
+    def preload_gif(self, library_name, gif_filepath, gif_hash, scene_id=0):
+        """
+        Decodes the GIF or WebP file at gif_filepath into the scene library without sending it.
+        See DisplayControllerDelegator.preload_gif
+        """
+        if gif_hash is None or self._scene_library.has(library_name, gif_hash):
+            return
+        self._decode_scene(gif_filepath, gif_hash, scene_id, library_name)
+
+    def show_cached_scene(self, library_name, gif_hash, scene_id=0):
+        """
+        Sends the scene gif_hash to the agent if it is still kept under library_name in the
+        scene library.
+        returns True if the scene is displayed, False if it isn't in the library.
+        """
+        scene = self._scene_library.get(library_name, gif_hash)
+        if scene is None:
+            return False
+
+        if self._update_scene_hash_if_needed(gif_hash):
+            self._queue_scene(gif_hash, replace(scene, scene_id=scene_id))
+        return True
+
+    def queue_blank_to_display(self, scene_id=0):
+        """
+        Sends a black scene to the agent. Used when there is nothing left worth showing.
+        """
+        if not self._update_scene_hash_if_needed(BLANK_SCENE_HASH):
+            return
+
+        self._queue_scene(BLANK_SCENE_HASH, Scene(create_blank_frames(), scene_id))
+
+    def get_display_pid(self):
+        """
+        returns None. The display process runs on the agent's machine.
+        """
+        return None
+
+    def get_display_trace_spans(self):
+        """
+        returns []. Spans of the display process stay with the agent.
+        """
+        return []
+
+    def set_brightness(self, brightness: float):
+        with self._lock:
+            self._brightness = brightness
+            self._update_idle_state()
+            self._send_brightness()
+
+    def set_filters(self, filters: FilterSettings):
+        """
+        Sets the colour filters the agent applies. See DisplayControllerDelegator.set_filters
+        """
+        with self._lock:
+            if filters == self._filters:
+                return
+            self._filters = filters
+            self._send_filters()
+
+    def set_scene_brightness(self, brightness: float):
+        """
+        Sets the brightness the scheduled applet is shown at. Only the brightness is sent to the
+        agent, see DisplayControllerDelegator.set_scene_brightness
+        """
+        with self._lock:
+            if brightness == self._scene_brightness:
+                return
+            self._scene_brightness = brightness
+            self._update_idle_state()
+            self._send_brightness()
+
+    def is_idle(self):
+        """
+        returns True if the effective brightness is 0. The agent blanks the panel on its own, so
+        there is no point rendering anything.
+        """
+        return self._idle
+
+    def is_agent_connected(self):
+        with self._lock:
+            return self._agent_socket is not None
+
+    def get_stats(self):
+        """
+        returns the number of scenes sent to agents so far, along with their size on the wire and
+        their size as raw RGB frames.
+        """
+        with self._lock:
+            return {
+                "scenes_sent": self._scenes_sent,
+                "bytes_sent": self._bytes_sent,
+                "raw_bytes_sent": self._raw_bytes_sent,
+            }
+
+    def _update_idle_state(self):
+        self._idle = self._idle_at_zero_brightness and (
+            self._scene_brightness <= 0 or self._brightness == 0
+        )
+
+    def _update_scene_hash_if_needed(self, gif_hash):
+        """
+        returns True if gif_hash is a different scene than the one on display, False instead
+        """
+        curr_hash = self._current_scene_hash
+        self._current_scene_hash = gif_hash
+        return curr_hash is None or curr_hash != gif_hash
+
+    def _decode_scene(self, gif_filepath, gif_hash, scene_id, library_name):
+        """
+        returns the decoded Scene, after keeping it in the scene library under library_name.
+        """
+        with self._tracer.span("decode", scene_id=scene_id) as span:
+            frames = decode_scene(gif_filepath)
+            span.set_arg("frame_count", len(frames))
+
+        scene = Scene(frames, scene_id)
+        if library_name is not None and gif_hash is not None:
+            self._scene_library.put(library_name, gif_hash, scene)
+        return scene
+
+    def _queue_scene(self, scene_hash, scene):
+        with self._lock:
+            self._last_scene = (scene_hash, scene)
+            self._send_scene()
+
+    def _accept_agents(self):
+        while True:
+            try:
+                (agent_socket, agent_address) = self._server_socket.accept()
+            except OSError:
+                # Server socket closed by __exit__
+                return
+            # Agents connected over a Unix socket have no address of their own
+            agent_address = agent_address or self._listen_address
+
+            try:
+                scene_transport.configure_socket(agent_socket)
+                agent_socket.settimeout(_AGENT_TIMEOUT)
+                (msg_type, payload) = scene_transport.recv_message(agent_socket)
+                if msg_type != scene_transport.MSG_HELLO:
+                    raise ConnectionError(f"Expected hello, got message {msg_type}")
+                hello = json.loads(payload)
+                if not isinstance(hello, dict):
+                    raise ValueError(f"Malformed hello: {hello}")
+                # Agents from before the protocol was versioned don't send one
+                agent_protocol = hello.get("protocol", 1)
+                if agent_protocol != scene_transport.PROTOCOL_VERSION:
+                    raise ConnectionError(
+                        f"the agent speaks protocol {agent_protocol}, but this render host "
+                        f"speaks {scene_transport.PROTOCOL_VERSION}. Run the same version of "
+                        f"display_agent.py and main.py"
+                    )
+                agent_scene_hash = hello["scene_hash"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Display agent {agent_address} failed to connect: {e}")
+                agent_socket.close()
+                continue
+
+            print(f"Display agent {agent_address} connected.")
+            with self._lock:
+                self._disconnect_agent()
+                self._agent_socket = agent_socket
+                self._encoder.reset()
+                self._send_brightness()
+                self._send_filters()
+                if self._last_scene is not None and self._last_scene[0] != agent_scene_hash:
+                    self._send_scene()
+
+    def _send_brightness(self):
+        """
+        Must be called with self._lock held.
+        """
+        payload = json.dumps(
+            {"brightness": self._brightness, "scene_brightness": self._scene_brightness}
+        ).encode("utf-8")
+        self._send(scene_transport.MSG_BRIGHTNESS, payload)
+
+    def _send_filters(self):
+        """
+        Must be called with self._lock held.
+        """
+        payload = json.dumps(asdict(self._filters)).encode("utf-8")
+        self._send(scene_transport.MSG_FILTERS, payload)
+
+    def _send_scene(self):
+        """
+        Sends the last scene queued. Must be called with self._lock held.
+        """
+        if self._agent_socket is None:
+            return
+
+        (scene_hash, scene) = self._last_scene
+        with self._tracer.span("scene_send", scene_id=scene.scene_id) as span:
+            payload = self._encoder.encode(scene_hash, scene)
+            span.set_arg("bytes", len(payload))
+            if not self._send(scene_transport.MSG_SCENE, payload):
+                return
+
+        self._scenes_sent += 1
+        self._bytes_sent += len(payload)
+        self._raw_bytes_sent += sum(
+            frame.img.width * frame.img.height * 3 for frame in scene.frames
+        )
+
+    def _send(self, msg_type, payload):
+        """
+        returns True if the message was sent to the agent. Must be called with self._lock held.
+        """
+        if self._agent_socket is None:
+            return False
+
+        try:
+            scene_transport.send_message(self._agent_socket, msg_type, payload)
+            return True
+        except OSError as e:
+            print(f"Lost connection to display agent: {e}")
+            self._disconnect_agent()
+            return False
+
+    def _disconnect_agent(self):
+        """
+        Must be called with self._lock held.
+        """
+        if self._agent_socket is not None:
+            self._agent_socket.close()
+            self._agent_socket = None
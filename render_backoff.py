@@ -0,0 +1,215 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from setup_exception import SetupException
+import random
+
+_MS_TO_S = 0.001
+# Doublings of the backoff after which it is past any max_backoff. Keeps 2 ** n from overflowing
+# a float when the circuit breaker is off and failures go on forever.
+_MAX_BACKOFF_DOUBLINGS = 64
+
+# Circuit breaker states
+CIRCUIT_CLOSED = "closed"  # renders are attempted as usual, with backoff after failures
+CIRCUIT_OPEN = "open"  # too many failures, renders are not attempted for a while
+CIRCUIT_HALF_OPEN = "half_open"  # open period is over, the next render is a trial
+
+
+class RenderFailurePolicy:
+    """
+    How to react to failed renders. Built from the "render_failures" section of config.json.
+    """
+
+    def __init__(self, config=None):
+        config = {} if config is None else config
+
+        # Wait after the first failure. Doubles with every consecutive failure.
+        self.initial_backoff = config.get("initial_backoff_ms", 1000) * _MS_TO_S
+        self.max_backoff = config.get("max_backoff_ms", 5 * 60 * 1000) * _MS_TO_S
+        # Fraction of the backoff to randomly add or subtract, so retries don't line up.
+        self.jitter = config.get("jitter", 0.2)
+        # Consecutive failures after which the circuit opens. 0 to never open it.
+        self.circuit_breaker_threshold = config.get("circuit_breaker_threshold", 5)
+        self.circuit_open_time = config.get("circuit_open_ms", 10 * 60 * 1000) * _MS_TO_S
+        # How long the last good scene keeps being shown once renders start failing.
+        self.stale_window = config.get("stale_window_ms", 60 * 60 * 1000) * _MS_TO_S
+        # Applet to show once the stale window expires. None to blank the display instead.
+        # Processed by UserConfig like the scheduled applets.
+        self.fallback_applet = config.get("fallback_applet")
+
+        self._validate()
+
+    def _validate(self):
+        if self.initial_backoff <= 0 or self.max_backoff < self.initial_backoff:
+            raise SetupException(
+                "render_failures: initial_backoff_ms must be positive and no larger than "
+                "max_backoff_ms."
+            )
+        if not (0 <= self.jitter < 1):
+            raise SetupException(
+                f"render_failures: invalid jitter {self.jitter}. Must be in [0, 1)."
+            )
+        if self.circuit_breaker_threshold < 0 or self.circuit_open_time < 0:
+            raise SetupException(
+                "render_failures: circuit_breaker_threshold and circuit_open_ms must not be "
+                "negative."
+            )
+        if self.stale_window < 0:
+            raise SetupException("render_failures: stale_window_ms must not be negative.")
+
+
+class RenderBackoff:
+    """
+    Render failure state of a single applet: exponential backoff with jitter, a circuit breaker,
+    and how long the display has been showing a stale scene because of it.
+    """
+
+    def __init__(self, policy, clock, rng):
+        self._policy = policy
+        self._clock = clock
+        self._rng = rng
+
+        self.total_successes = 0
+        self.total_failures = 0
+        self.consecutive_failures = 0
+        # clock.monotonic() time (in s) of the last successful render. None if never rendered.
+        self.last_success_time = None
+        # clock.monotonic() time (in s) before which no render should be attempted
+        self.next_attempt_time = 0.0
+        # clock.monotonic() time (in s) of the first failure of the current streak. None if the
+        # last render succeeded.
+        self.stale_since = None
+        # True if the fallback has been shown for the current streak
+        self.fallback_shown = False
+        self._circuit_open = False
+
+    def can_attempt(self):
+        return self._clock.monotonic() >= self.next_attempt_time
+
+    def is_failing(self):
+        return self.consecutive_failures > 0
+
+    def get_circuit_state(self):
+        if not self._circuit_open:
+            return CIRCUIT_CLOSED
+        return CIRCUIT_HALF_OPEN if self.can_attempt() else CIRCUIT_OPEN
+
+    def record_success(self):
+        self.total_successes += 1
+        self.consecutive_failures = 0
+        self.last_success_time = self._clock.monotonic()
+        self.next_attempt_time = 0.0
+        self.stale_since = None
+        self.fallback_shown = False
+        self._circuit_open = False
+
+    def record_failure(self):
+        curr_time = self._clock.monotonic()
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        if self.stale_since is None:
+            self.stale_since = curr_time
+
+        threshold = self._policy.circuit_breaker_threshold
+        if threshold > 0 and self.consecutive_failures >= threshold:
+            self._circuit_open = True
+            self.next_attempt_time = curr_time + self._policy.circuit_open_time
+            return
+
+        backoff = min(
+            self._policy.initial_backoff
+            * (2 ** min(self.consecutive_failures - 1, _MAX_BACKOFF_DOUBLINGS)),
+            self._policy.max_backoff,
+        )
+        jitter = self._policy.jitter
+        backoff *= self._rng.uniform(1 - jitter, 1 + jitter)
+        self.next_attempt_time = curr_time + backoff
+
+    def reset_staleness(self):
+        """
+        Called when the applet gets scheduled again. Failures from an earlier time slot should
+        not count towards the stale window of this one. The backoff itself is kept.
+        """
+        self.stale_since = None
+        self.fallback_shown = False
+        if not self._circuit_open:
+            self.next_attempt_time = 0.0
+
+    def get_stale_deadline(self):
+        """
+        returns the clock.monotonic() time (in s) at which the stale window expires, or None if
+        the applet isn't failing.
+        """
+        if self.stale_since is None:
+            return None
+        return self.stale_since + self._policy.stale_window
+
+    def should_show_fallback(self):
+        deadline = self.get_stale_deadline()
+        return (
+            deadline is not None
+            and not self.fallback_shown
+            and self._clock.monotonic() >= deadline
+        )
+
+    def get_next_action_time(self):
+        """
+        returns the clock.monotonic() time (in s) at which something needs to happen for this
+        applet (a retry, or the stale window expiring), or None if the applet isn't failing.
+        """
+        if not self.is_failing():
+            return None
+
+        deadline = self.get_stale_deadline()
+        if self.fallback_shown or deadline is None:
+            return self.next_attempt_time
+        return min(self.next_attempt_time, deadline)
+
+    def get_status(self):
+        curr_time = self._clock.monotonic()
+        return {
+            "total_successes": self.total_successes,
+            "total_failures": self.total_failures,
+            "consecutive_failures": self.consecutive_failures,
+            "circuit": self.get_circuit_state(),
+            "secs_until_next_attempt": max(0.0, self.next_attempt_time - curr_time),
+            "secs_since_last_success": (
+                None
+                if self.last_success_time is None
+                else curr_time - self.last_success_time
+            ),
+            "stale_for_secs": (
+                None if self.stale_since is None else curr_time - self.stale_since
+            ),
+            "fallback_shown": self.fallback_shown,
+        }
+
+
+class RenderFailureTracker:
+    """
+    Keeps a RenderBackoff for every applet that has been rendered.
+    """
+
+    def __init__(self, policy, clock, rng=None):
+        self.policy = policy
+        self._clock = clock
+        self._rng = random.Random() if rng is None else rng
+        # {applet name: RenderBackoff}
+        self._backoffs = {}
+
+    def get(self, applet_name):
+        if applet_name not in self._backoffs:
+            self._backoffs[applet_name] = RenderBackoff(
+                self.policy, self._clock, self._rng
+            )
+        return self._backoffs[applet_name]
+
+    def get_status(self):
+        """
+        returns {applet name: status} of every applet rendered so far.
+        """
+        return {name: backoff.get_status() for name, backoff in self._backoffs.items()}
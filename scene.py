@@ -0,0 +1,330 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from PIL import Image, ImageSequence
+from setup_exception import SetupException
+import io
+
+DEFAULT_DISPLAY_TIME = 1  # default time to wait for next frame, in seconds
+_MS_TO_S = 0.001
+
+# Output formats pixlet can render to, mapped to the file extension of the output.
+RENDER_FORMATS = {"gif": ".gif", "webp": ".webp"}
+
+
+@dataclass
+class Frame:
+    # Image as rendered, without brightness or filters. Should be of size _DISPLAY_SIZE
+    img: Image
+    # time (in s) how long the frame should be on display.
+    duration: float = DEFAULT_DISPLAY_TIME
+    # true if the frames should loop
+    should_loop: bool = False
+    # number of times the frames should loop. 0 for infinite
+    loop_count: int = 0
+    # used and filled by DisplayController. Time (in s) at which the frame was drawn
+    drawn_at: float = 0.0
+    # id of the Scene this frame belongs to
+    scene_id: int = 0
+    # used and filled by DisplayController. Image drawn on the panel: the frame with the display
+    # brightness and filters applied, and the (brightness, FilterSettings) it was filtered for.
+    display_img: Image = None
+    filter_state: tuple = None
+    # False if img is only drawn once: frames a FrameStream decodes and doesn't replay. Their
+    # filtered images aren't cached.
+    resident: bool = True
+
+
+@dataclass
+class Scene:
+    # Frames to display, in order.
+    frames: list
+    # Id of the render that produced this scene. Used to correlate traces across processes.
+    scene_id: int = 0
+    # time.perf_counter() (in s) at which the scene was queued to the display process
+    queued_at: float = 0.0
+    # Name to keep the scene in the display process' SceneLibrary under, and the scene's
+    # key: its scene hash. None to not keep it.
+    library_name: str = None
+    library_key: tuple = None
+    # False to only add the scene to the SceneLibrary, without showing it.
+    show: bool = True
+
+
+@dataclass
+class EncodedScene:
+    """
+    Scene sent to the display process still encoded, to be decoded while it plays. See
+    FrameStream.
+    """
+
+    # Contents of the GIF or WebP file
+    data: bytes
+    scene_id: int = 0
+    # time.perf_counter() (in s) at which the scene was queued to the display process
+    queued_at: float = 0.0
+    # See Scene.library_name, Scene.library_key and Scene.show
+    library_name: str = None
+    library_key: tuple = None
+    show: bool = True
+
+
+@dataclass
+class ShowScene:
+    """
+    Sent to the display process instead of a Scene or EncodedScene it already has in its
+    SceneLibrary.
+    """
+
+    library_name: str
+    library_key: tuple
+    scene_id: int = 0
+    # time.perf_counter() (in s) at which the scene was queued to the display process
+    queued_at: float = 0.0
+
+
+class SceneLibrary:
+    """
+    Scenes kept to be shown again without decoding or sending them again. There is a scene per
+    name (the applet that rendered it): keeping a new scene under a name replaces the previous
+    one. Only the scenes of the capacity most recently used names are kept.
+    Scenes are identified by their scene hash. The brightness is applied by the display process
+    as frames are drawn, so the same scene serves every brightness.
+
+    DisplayControllerDelegator keeps a library of keys only, in step with the library of
+    scenes in the display process: both see the same puts and gets in the same order, so they
+    evict the same scenes, and the delegator knows which scenes it can refer to by key.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # {name: (key, scene)}, least recently used first
+        self._scenes = OrderedDict()
+
+    def __len__(self):
+        return len(self._scenes)
+
+    def has(self, name, key):
+        """
+        returns True if the scene kept under name is the scene key.
+        """
+        entry = self._scenes.get(name)
+        return entry is not None and entry[0] == key
+
+    def get(self, name, key):
+        """
+        returns the scene key if it is kept under name, or None. Marks name as the most recently
+        used.
+        """
+        if not self.has(name, key):
+            return None
+        self._scenes.move_to_end(name)
+        return self._scenes[name][1]
+
+    def put(self, name, key, scene):
+        """
+        Keeps scene under name, evicting the least recently used names if over capacity.
+        """
+        if self.capacity <= 0:
+            return
+        self._scenes[name] = (key, scene)
+        self._scenes.move_to_end(name)
+        while len(self._scenes) > self.capacity:
+            self._scenes.popitem(last=False)
+
+
+class FrameStreamConfig:
+    """
+    Whether, and how, scenes are streamed to the display process instead of being decoded up
+    front. Built from the "streaming" entry of the "display" section of config.json.
+    """
+
+    def __init__(self, config=None):
+        config = {} if config is None else config
+
+        self.enabled = config.get("enabled", False)
+        # Number of frames decoded ahead of the frame on display
+        self.window_frames = config.get("window_frames", 8)
+        # Scenes with up to max_resident_frames frames, taking up to max_resident_bytes once
+        # decoded, are kept decoded after their first pass. Bigger scenes are decoded again
+        # every time they loop.
+        self.max_resident_frames = config.get("max_resident_frames", 120)
+        self.max_resident_bytes = config.get("max_resident_bytes", 16 * 1024 * 1024)
+
+        self._validate()
+
+    def _validate(self):
+        if not isinstance(self.enabled, bool):
+            raise SetupException(
+                f"Invalid streaming enabled: {self.enabled}. Must be true or false."
+            )
+        if not _is_int(self.window_frames) or self.window_frames < 1:
+            raise SetupException(
+                f"Invalid streaming window_frames: {self.window_frames}. Must be an integer of "
+                "at least 1."
+            )
+        for name in ["max_resident_frames", "max_resident_bytes"]:
+            value = getattr(self, name)
+            if not _is_int(value) or value < 0:
+                raise SetupException(
+                    f"Invalid streaming {name}: {value}. Must be a non-negative integer."
+                )
+
+
+class FrameStream:
+    """
+    Decodes the frames of an EncodedScene one at a time, in display order, and starts over as
+    many times as the scene loops. Frames of the first pass are kept for the following passes
+    only if the whole scene fits in the resident budget of config, otherwise every pass decodes
+    the scene again. Either way, memory use is bounded by the budget, and not by the length of
+    the scene.
+    """
+
+    def __init__(self, encoded_scene: EncodedScene, config: FrameStreamConfig):
+        self._scene = encoded_scene
+        self._config = config
+
+        self._image = None
+        self._frame_iterator = None
+        # Frames decoded so far in the first pass. None once the scene is over budget.
+        self._resident_frames = []
+        self._resident_bytes = 0
+        # Index of the next frame to replay from _resident_frames. None while decoding.
+        self._replay_index = None
+        # Number of passes left after the current one. None for infinite. Known once the first
+        # frame is decoded.
+        self._passes_left = 0
+        self._decoded_first_frame = False
+
+        self._open()
+
+    def next_frame(self):
+        """
+        returns the next Frame to display, or None once the scene is over.
+        """
+        if self._replay_index is not None:
+            return self._next_resident_frame()
+
+        im_frame = next(self._frame_iterator, None)
+        if im_frame is None:
+            return self._next_pass()
+
+        # convert() loads the frame, which is needed for frame specific info to be populated
+        raw_img = im_frame.convert("RGB")
+        frame = _create_frame(raw_img, im_frame.info)
+        if not self._decoded_first_frame and frame.should_loop:
+            self._passes_left = None if frame.loop_count == 0 else frame.loop_count
+        self._decoded_first_frame = True
+        # Looping is left to the stream, the display process plays every frame once.
+        frame.should_loop = False
+        # Only replays of _resident_frames are known to be resident, the first pass can still go
+        # over budget.
+        frame.resident = False
+        self._keep_resident(frame)
+        return frame
+
+    def close(self):
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+
+    def _open(self):
+        self.close()
+        self._image = Image.open(io.BytesIO(self._scene.data))
+        self._frame_iterator = iter(ImageSequence.Iterator(self._image))
+
+    def _next_pass(self):
+        if self._passes_left is not None:
+            if self._passes_left == 0:
+                self.close()
+                return None
+            self._passes_left -= 1
+
+        if self._resident_frames is not None and len(self._resident_frames) > 0:
+            # The whole scene fit in the budget, replay it without decoding.
+            self.close()
+            self._replay_index = 0
+            return self._next_resident_frame()
+
+        self._open()
+        return self.next_frame()
+
+    def _next_resident_frame(self):
+        if self._replay_index == len(self._resident_frames):
+            self._replay_index = None
+            return self._next_pass()
+
+        frame = self._resident_frames[self._replay_index]
+        self._replay_index += 1
+        # The same frame can be in the display queue more than once if the scene is shorter
+        # than the window. The copy shares the images.
+        return replace(frame, drawn_at=0.0, resident=True)
+
+    def _keep_resident(self, frame):
+        if self._resident_frames is None:
+            return
+
+        self._resident_bytes += len(frame.img.getbands()) * (
+            frame.img.width * frame.img.height
+        )
+        self._resident_frames.append(frame)
+        if (
+            len(self._resident_frames) > self._config.max_resident_frames
+            or self._resident_bytes > self._config.max_resident_bytes
+        ):
+            # Over budget. Decode every pass instead.
+            self._resident_frames = None
+
+
+def decode_scene(image_path):
+    """
+    Decodes all frames of an animated GIF or WebP file into a list of Frames. Each frame keeps the
+    duration it was encoded with. The file is only walked once, and each frame is converted to
+    RGB once. The brightness is left to the display process, see DisplayController.
+    """
+    frames = []
+    with Image.open(image_path) as im:
+        for im_frame in ImageSequence.Iterator(im):
+            # convert() loads the frame, which is needed for frame specific info to be populated
+            raw_img = im_frame.convert("RGB")
+            frames.append(_create_frame(raw_img, im_frame.info))
+
+    return frames
+
+
+def _is_int(value):
+    # bool is an int too, but true isn't a number of frames
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _create_frame(raw_img, im_info):
+    should_loop = False
+    loop_count = 0
+    if "loop" in im_info:
+        should_loop = True
+        loop_count = im_info["loop"]
+
+    frame_duration = DEFAULT_DISPLAY_TIME
+    if im_info.get("duration"):
+        frame_duration = im_info["duration"] * _MS_TO_S
+
+    return create_frame(raw_img, frame_duration, should_loop, loop_count)
+
+
+def create_frame(raw_img, duration=DEFAULT_DISPLAY_TIME, should_loop=False, loop_count=0):
+    """
+    Creates a Frame from an RGB image that has already been decoded. Ex: frames received by
+    display_agent.py.
+    """
+    return Frame(
+        img=raw_img,
+        should_loop=should_loop,
+        duration=duration,
+        loop_count=loop_count,
+    )
@@ -0,0 +1,293 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Wire protocol between RemoteDisplay (render host) and display_agent.py (display).
+##
+## Every message is a _MESSAGE_HEADER (type, payload length) followed by the payload. Scenes are
+## sent as raw RGB frames, each frame compressed with zlib either as is (key frame) or XORed
+## with a reference frame (delta frame). Consecutive animation frames, and consecutive renders
+## of the same applet, mostly differ in a few pixels, so their XOR is mostly zeros and
+## compresses to a fraction of the key frame.
+
+from PIL import Image
+from scene import Scene, create_frame
+from setup_exception import SetupException
+import numpy as np
+import os
+import socket
+import struct
+import zlib
+
+# Version of the protocol, sent in MSG_HELLO. Bump it on any change to the messages below.
+# 2: frames are sent without the brightness, which follows in MSG_BRIGHTNESS.
+PROTOCOL_VERSION = 2
+
+# agent -> host, right after connecting. JSON: {"protocol": PROTOCOL_VERSION of the agent,
+# "scene_hash": hash of the scene the agent is showing, or null}
+MSG_HELLO = 1
+# host -> agent. Scene encoded by SceneEncoder
+MSG_SCENE = 2
+# host -> agent. JSON: {"brightness": float or null, "scene_brightness": float}. See
+# DisplayControllerDelegator.set_brightness and set_scene_brightness
+MSG_BRIGHTNESS = 3
+# host -> agent. JSON: {"gain": [r, g, b], "gamma": float, "color_temperature": int}. See
+# filters.FilterSettings
+MSG_FILTERS = 4
+
+_MESSAGE_HEADER = struct.Struct("!BI")  # message type, payload length
+_MAX_PAYLOAD_SIZE = 64 * 1024 * 1024  # anything bigger is a corrupted stream
+_SCENE_HEADER = struct.Struct("!QHH")  # scene_id, frame count, scene hash length
+# duration (in ms), should_loop, loop_count, width, height, encoding, compressed data length
+_FRAME_HEADER = struct.Struct("!IBHHHBI")
+_FRAME_KEY = 0  # zlib compressed RGB bytes
+_FRAME_DELTA = 1  # zlib compressed XOR of the RGB bytes with the reference frame
+_S_TO_MS = 1000
+_MS_TO_S = 0.001
+
+_UNIX_PREFIX = "unix:"
+
+
+class SceneEncoder:
+    """
+    Encodes Scenes for MSG_SCENE. The first frame of a scene is delta encoded against the first
+    frame of the previous scene, every other frame against the frame before it. The encoder and
+    the SceneDecoder on the other end must see the same scenes in the same order, so both are
+    reset whenever a connection is (re-)established.
+    """
+
+    def __init__(self, compression_level=6):
+        self._compression_level = compression_level
+        self.reset()
+
+    def reset(self):
+        # (size, RGB bytes) of the first frame of the last scene encoded
+        self._reference = None
+
+    def encode(self, scene_hash, scene: Scene):
+        """
+        returns the MSG_SCENE payload for scene. Frames are sent as rendered, the brightness
+        follows separately in MSG_BRIGHTNESS.
+        """
+        hash_bytes = scene_hash.encode("utf-8")
+        chunks = [
+            _SCENE_HEADER.pack(scene.scene_id, len(scene.frames), len(hash_bytes)),
+            hash_bytes,
+        ]
+
+        reference = self._reference
+        for index, frame in enumerate(scene.frames):
+            raw = (frame.img.size, frame.img.tobytes())
+            (encoding, data) = self._compress(raw, reference)
+            chunks.append(
+                _FRAME_HEADER.pack(
+                    round(frame.duration * _S_TO_MS),
+                    frame.should_loop,
+                    frame.loop_count,
+                    *raw[0],
+                    encoding,
+                    len(data),
+                )
+            )
+            chunks.append(data)
+
+            if index == 0:
+                self._reference = raw
+            reference = raw
+
+        return b"".join(chunks)
+
+    def _compress(self, raw, reference):
+        """
+        returns (encoding, data) for the frame raw, whichever of a key or delta frame is smaller.
+        """
+        key = zlib.compress(raw[1], self._compression_level)
+        if reference is None or reference[0] != raw[0]:
+            return (_FRAME_KEY, key)
+
+        delta = zlib.compress(_xor(raw[1], reference[1]), self._compression_level)
+        return (_FRAME_DELTA, delta) if len(delta) < len(key) else (_FRAME_KEY, key)
+
+
+class SceneDecoder:
+    """
+    Decodes MSG_SCENE payloads produced by SceneEncoder.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # RGB bytes of the first frame of the last scene decoded
+        self._reference = None
+
+    def decode(self, payload):
+        """
+        returns (scene_hash, Scene). Raises ValueError if payload is malformed.
+        """
+        try:
+            return self._decode(memoryview(payload))
+        except (struct.error, zlib.error, UnicodeDecodeError) as e:
+            raise ValueError(f"Malformed scene: {e}") from e
+
+    def _decode(self, payload):
+        (scene_id, frame_count, hash_length) = _SCENE_HEADER.unpack_from(payload)
+        offset = _SCENE_HEADER.size
+        scene_hash = bytes(payload[offset : offset + hash_length]).decode("utf-8")
+        offset += hash_length
+
+        frames = []
+        reference = self._reference
+        for index in range(frame_count):
+            (
+                duration_ms,
+                should_loop,
+                loop_count,
+                width,
+                height,
+                encoding,
+                data_length,
+            ) = _FRAME_HEADER.unpack_from(payload, offset)
+            offset += _FRAME_HEADER.size
+            data = _decompress(
+                payload[offset : offset + data_length], 3 * width * height
+            )
+            offset += data_length
+
+            if encoding == _FRAME_DELTA:
+                if reference is None or len(reference) != len(data):
+                    raise ValueError("Delta frame without a matching reference frame")
+                data = _xor(data, reference)
+            elif encoding != _FRAME_KEY:
+                raise ValueError(f"Unknown frame encoding {encoding}")
+
+            raw_img = Image.frombytes("RGB", (width, height), data)
+            frames.append(
+                create_frame(
+                    raw_img,
+                    duration_ms * _MS_TO_S,
+                    bool(should_loop),
+                    loop_count,
+                )
+            )
+
+            if index == 0:
+                self._reference = data
+            reference = data
+
+        return (scene_hash, Scene(frames, scene_id))
+
+
+def _decompress(data, size):
+    """
+    returns data decompressed, if it decompresses to exactly size bytes. Decompresses at most
+    size + 1 bytes, so a malicious frame can't take up more memory than a legit one.
+    """
+    if size > _MAX_PAYLOAD_SIZE:
+        raise ValueError(f"Frame too large: {size} bytes")
+    decompressor = zlib.decompressobj()
+    decompressed = decompressor.decompress(data, size + 1)
+    if len(decompressed) != size or not decompressor.eof:
+        raise ValueError(f"Frame doesn't decompress to {size} bytes")
+    return decompressed
+
+
+def _xor(data, other):
+    return np.bitwise_xor(
+        np.frombuffer(data, dtype=np.uint8), np.frombuffer(other, dtype=np.uint8)
+    ).tobytes()
+
+
+def parse_address(address):
+    """
+    Parses "unix:<path>" or "<host>:<port>".
+    returns (socket family, address to bind or connect to)
+    """
+    if address.startswith(_UNIX_PREFIX):
+        return (socket.AF_UNIX, address[len(_UNIX_PREFIX) :])
+
+    (host, _, port) = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise SetupException(
+            f"Invalid address: {address}. Must be <host>:<port> or unix:<path>"
+        )
+    return (socket.AF_INET, (host, int(port)))
+
+
+def listen(address):
+    """
+    returns a socket listening on address. See parse_address
+    """
+    (family, sock_address) = parse_address(address)
+    server_socket = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_UNIX:
+        _remove_stale_unix_socket(sock_address)
+    else:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind(sock_address)
+    server_socket.listen(1)
+    return server_socket
+
+
+def connect(address, timeout=None):
+    """
+    returns a socket connected to address. See parse_address
+    """
+    (family, sock_address) = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(sock_address)
+        sock.settimeout(None)
+    except OSError:
+        sock.close()
+        raise
+    configure_socket(sock)
+    return sock
+
+
+def configure_socket(sock):
+    """
+    Sends small messages (Ex: brightness changes) right away, and lets dead peers be noticed
+    even if the connection is otherwise idle.
+    """
+    if sock.family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+
+def send_message(sock, msg_type, payload):
+    sock.sendall(_MESSAGE_HEADER.pack(msg_type, len(payload)) + payload)
+
+
+def recv_message(sock):
+    """
+    Blocks until a complete message is received.
+    returns (message type, payload). Raises ConnectionError if the connection was closed.
+    """
+    (msg_type, length) = _MESSAGE_HEADER.unpack(_recv_exactly(sock, _MESSAGE_HEADER.size))
+    if length > _MAX_PAYLOAD_SIZE:
+        raise ConnectionError(f"Message too large: {length} bytes")
+    return (msg_type, _recv_exactly(sock, length))
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Connection closed")
+        received += count
+    return buffer
+
+
+def _remove_stale_unix_socket(socket_path):
+    try:
+        os.unlink(socket_path)
+    except FileNotFoundError:
+        pass
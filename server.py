@@ -1,5 +1,7 @@
 from fastapi import FastAPI, HTTPException, status
 from pydantic import BaseModel
+from refresh_requests import RefreshRequests
+from typing import Callable, Optional
 import asyncio
 
 
@@ -7,13 +9,86 @@ class Brightness(BaseModel):
     brightness: float
 
 
+class Refresh(BaseModel):
+    # Merged over the applet's schema_vals for this render only
+    schema_vals: Optional[dict] = None
+
+
 class Server:
-    def __init__(self, brightness_update_queue: asyncio.Queue[Brightness]):
+    def __init__(
+        self,
+        brightness_update_queue: Optional[asyncio.Queue[Brightness]] = None,
+        trace_exporter: Optional[Callable[[], dict]] = None,
+        render_status_provider: Optional[Callable[[], dict]] = None,
+        refresh_requests: Optional[RefreshRequests] = None,
+    ):
+        """
+        brightness_update_queue: queue to post brightness updates to. None to not expose the
+                                 brightness API.
+        trace_exporter: blocking function that returns the current trace in the Chrome trace
+                        format. None to not expose the trace API.
+        render_status_provider: function that returns the render failure state of every
+                                applet. None to not expose the render status API.
+        refresh_requests: RefreshRequests to post applet refreshes to. None to not expose the
+                          refresh API.
+        """
         self.app = FastAPI()
         self._brightness_update_queue = brightness_update_queue
+        self._trace_exporter = trace_exporter
+        self._render_status_provider = render_status_provider
+        self._refresh_requests = refresh_requests
         self._setup_routes()
 
     def _setup_routes(self):
+        if self._brightness_update_queue is not None:
+            self._setup_brightness_routes()
+        if self._trace_exporter is not None:
+            self._setup_trace_routes()
+        if self._render_status_provider is not None:
+            self._setup_render_status_routes()
+        if self._refresh_requests is not None:
+            self._setup_refresh_routes()
+
+    def _setup_refresh_routes(self):
+        @self.app.post("/applets/{name}/refresh", status_code=status.HTTP_202_ACCEPTED)
+        async def refresh_applet(name: str, refresh: Optional[Refresh] = None):
+            if not self._refresh_requests.has_applet(name):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"No applet named '{name}'",
+                )
+
+            if not self._refresh_requests.is_in_slot(name):
+                # Applets are rendered afresh when their time slot comes
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"'{name}' isn't scheduled right now",
+                )
+
+            schema_vals = None if refresh is None else refresh.schema_vals
+            invalid_keys = self._refresh_requests.get_invalid_keys(name, schema_vals)
+            if invalid_keys:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"'{name}' has no schema_vals {invalid_keys} to override",
+                )
+
+            if self._refresh_requests.request(name, schema_vals):
+                return {"message": f"Refresh of '{name}' queued"}
+            return {"message": f"Refresh of '{name}' already queued"}
+
+    def _setup_render_status_routes(self):
+        @self.app.get("/render_status")
+        async def get_render_status():
+            return self._render_status_provider()
+
+    def _setup_trace_routes(self):
+        @self.app.get("/trace")
+        async def get_trace():
+            # Collecting spans from the display process blocks, keep it off the event loop.
+            return await asyncio.to_thread(self._trace_exporter)
+
+    def _setup_brightness_routes(self):
         # Define routes here
         @self.app.post("/brightness")
         async def set_brightness(brightness: Brightness):
@@ -0,0 +1,438 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Replays a config.json over a virtual day (or more) to check the schedule without waiting for
+## it. Neither pixlet nor the display are needed: renders are faked and take a fixed amount of
+## virtual time, and scenes are recorded instead of displayed.
+##
+## Run with:
+##     python simulate.py [--config config.json] [--days 1] [--start 00:00] [--json]
+
+from clock import SECS_IN_A_DAY, VirtualClock
+from refresh_requests import RefreshRequests
+from render_backoff import RenderFailureTracker
+from scene import SceneLibrary
+from tracing import Tracer
+from user_config import UserConfig
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+import main
+
+_MS_TO_S = 0.001
+_MIN_WAKEUP = 0.001  # shortest wait the main loop asks for. See main.run_display_loop
+
+
+class SimulationFinished(Exception):
+    pass
+
+
+class SimulationClock(VirtualClock):
+    """
+    VirtualClock that counts the main loop's wakeups and ends the simulation at stop_at.
+    """
+
+    def __init__(self, start_day_time_secs, stop_at, stats):
+        super().__init__(start_day_time_secs)
+        self._stop_at = stop_at
+        self._stats = stats
+        self._renders_at_last_wakeup = 0
+
+    async def wait_for_items(self, queues, timeout):
+        if self.monotonic() >= self._stop_at:
+            raise SimulationFinished()
+
+        # Waits of _MIN_WAKEUP only make up for floating point error in the wakeup time, they
+        # are part of the previous wakeup.
+        if timeout > _MIN_WAKEUP:
+            self._stats.wakeups += 1
+            if self._stats.render_count == self._renders_at_last_wakeup:
+                self._stats.idle_wakeups += 1
+            self._renders_at_last_wakeup = self._stats.render_count
+
+        return await super().wait_for_items(queues, timeout)
+
+
+class SimulationStats:
+    def __init__(self):
+        self.render_count = 0
+        # {applet name: number of renders}
+        self.renders_per_applet = {}
+        self.wakeups = 0
+        # wakeups after which nothing was rendered
+        self.idle_wakeups = 0
+        self.failed_renders = 0
+        # renders that went to the scene library instead of the display, and scenes shown from
+        # the library
+        self.preloads = 0
+        self.library_hits = 0
+        # scenes queued to the display, rendered or from the library
+        self.scenes_queued = 0
+        # list of (virtual time, applet name, brightness) of every change to what the display
+        # shows. brightness is 0 while the display is idle.
+        self.states = []
+
+
+class FakePixletWrapper:
+    """
+    Stands in for PixletWrapper. Every render takes render_time seconds of virtual time (or the
+    applet's entry in render_times, if any), and fails with probability failure_rate.
+    """
+
+    def __init__(
+        self, clock, stats, render_time, failure_rate=0.0, rng=None, render_times=None
+    ):
+        self._clock = clock
+        self._stats = stats
+        self._render_time = render_time
+        self._render_times = {} if render_times is None else render_times
+        self._failure_rate = failure_rate
+        self._rng = random.Random(0) if rng is None else rng
+
+    def create_gif_from_sketch(self, applet, render_id=0):
+        name = applet["name"]
+        self._clock.advance(self._render_times.get(name, self._render_time))
+
+        self._stats.render_count += 1
+        self._stats.renders_per_applet[name] = (
+            self._stats.renders_per_applet.get(name, 0) + 1
+        )
+        if self._rng.random() < self._failure_rate:
+            self._stats.failed_renders += 1
+            return (None, None)
+
+        # Dynamic applets are assumed to change on every render
+        gif_hash = f"{name}:{render_id}" if applet["dynamic"] else name
+        return (name, gif_hash)
+
+
+class RecordingDisplay:
+    """
+    Stands in for DisplayControllerDelegator, and records every change to what it shows.
+    """
+
+    def __init__(self, clock, stats, scene_library_size=0):
+        self._clock = clock
+        self._stats = stats
+        # scene names, kept by applet name
+        self._scene_library = SceneLibrary(scene_library_size)
+        # name of the last scene queued
+        self._scene_name = None
+        # brightness of the scheduled applet
+        self._scene_brightness = 1.0
+
+    def queue_gif_to_display(self, gif_filepath, gif_hash, scene_id=0, library_name=None):
+        # FakePixletWrapper uses the applet name as the file path
+        if library_name is not None:
+            self._scene_library.put(library_name, gif_hash, gif_filepath)
+        self._show_scene(gif_filepath)
+
+    def preload_gif(self, library_name, gif_filepath, gif_hash, scene_id=0):
+        self._stats.preloads += 1
+        self._scene_library.put(library_name, gif_hash, gif_filepath)
+
+    def show_cached_scene(self, library_name, gif_hash, scene_id=0):
+        scene_name = self._scene_library.get(library_name, gif_hash)
+        if scene_name is None:
+            return False
+
+        self._stats.library_hits += 1
+        self._show_scene(scene_name)
+        return True
+
+    def queue_blank_to_display(self, scene_id=0):
+        self._show_scene("<blank>")
+
+    def set_scene_brightness(self, brightness):
+        self._scene_brightness = brightness
+        self._record_state()
+
+    def set_brightness(self, brightness):
+        pass
+
+    def set_filters(self, filters):
+        pass
+
+    def is_idle(self):
+        return self._scene_brightness <= 0
+
+    def _show_scene(self, scene_name):
+        self._stats.scenes_queued += 1
+        self._scene_name = scene_name
+        self._record_state()
+
+    def _record_state(self):
+        state = (self._scene_name, 0 if self.is_idle() else self._scene_brightness)
+        if self._scene_name is None or (
+            self._stats.states and self._stats.states[-1][1:] == state
+        ):
+            return
+        self._stats.states.append((self._clock.monotonic(), *state))
+
+    def get_display_pid(self):
+        return os.getpid()
+
+    def get_display_trace_spans(self):
+        return []
+
+
+def run_simulation(
+    config_path,
+    days,
+    start_day_time_secs,
+    render_time,
+    failure_rate=0.0,
+    render_times=None,
+):
+    """
+    render_times maps applet names to the time (in s) their renders take, instead of
+    render_time. Ex: render times measured by planner.py
+    returns (user_config, stats, wall clock time the simulation took)
+    """
+    stats = SimulationStats()
+    clock = SimulationClock(start_day_time_secs, days * SECS_IN_A_DAY, stats)
+
+    with UserConfig(config_path, clock) as user_config:
+        # Seeded, so runs are repeatable
+        rng = random.Random(0)
+        pixlet_wrapper = FakePixletWrapper(
+            clock, stats, render_time, failure_rate, rng, render_times
+        )
+        display = RecordingDisplay(clock, stats, user_config.get_scene_library_size())
+        render_tracker = RenderFailureTracker(
+            user_config.get_render_failure_policy(), clock, rng
+        )
+
+        async def simulate():
+            try:
+                await main.run_display_loop(
+                    user_config,
+                    display,
+                    pixlet_wrapper,
+                    Tracer(),
+                    render_tracker,
+                    asyncio.Queue(),
+                    RefreshRequests(user_config.get_applet_names()),
+                    clock,
+                )
+            except SimulationFinished:
+                pass
+
+        start = time.perf_counter()
+        asyncio.run(simulate())
+        return (user_config, stats, time.perf_counter() - start)
+
+
+def get_switches(stats):
+    """
+    returns a list of (virtual time, kind, value) for every time the displayed applet or the
+    brightness changed. kind is "applet" or "brightness".
+    """
+    switches = []
+    (curr_name, curr_brightness) = (None, None)
+    for scene_time, name, brightness in stats.states:
+        if name != curr_name:
+            switches.append((scene_time, "applet", name))
+        if brightness != curr_brightness:
+            switches.append((scene_time, "brightness", brightness))
+        (curr_name, curr_brightness) = (name, brightness)
+    return switches
+
+
+def get_lateness(user_config, stats, days, start_day_time_secs):
+    """
+    returns a list of (scheduled virtual time, kind, value, lateness in s) for every scheduled
+    applet and brightness change that falls inside the simulation. kind is "applet" (value is
+    the slot's name) or "brightness". lateness is None if the change never made it to the
+    display.
+    """
+    changes = []
+    for start_time, applet in user_config.get_schedule():
+        # A rotation starts with its first applet. Nothing is shown at 0 brightness, so any
+        # applet will do then.
+        first_name = UserConfig.get_rotation(applet)[0]["name"]
+        changes.append(
+            (
+                start_time,
+                "applet",
+                applet["name"],
+                lambda name, brightness, first_name=first_name: name == first_name
+                or brightness == 0,
+            )
+        )
+    for start_time, value in user_config.get_brightness_schedule():
+        changes.append(
+            (
+                start_time,
+                "brightness",
+                value,
+                lambda name, brightness, value=value: brightness == max(0, value),
+            )
+        )
+
+    lateness = []
+    for day in range(days + 1):
+        for start_time, kind, value, is_shown in changes:
+            scheduled_at = day * SECS_IN_A_DAY + start_time - start_day_time_secs
+            if scheduled_at <= 0 or scheduled_at >= days * SECS_IN_A_DAY:
+                continue
+
+            shown_at = _get_shown_at(stats, scheduled_at, is_shown)
+            lateness.append(
+                (
+                    scheduled_at,
+                    kind,
+                    value,
+                    None if shown_at is None else shown_at - scheduled_at,
+                )
+            )
+
+    return sorted(lateness, key=lambda entry: entry[0])
+
+
+def _get_shown_at(stats, scheduled_at, is_shown):
+    """
+    returns the first virtual time, from scheduled_at on, at which the display state (scene name,
+    brightness) was one is_shown accepts, or None if it never was.
+    """
+    # state on display at scheduled_at. The change might have nothing to do.
+    curr_state = None
+    for state_time, name, brightness in stats.states:
+        if state_time <= scheduled_at:
+            curr_state = (name, brightness)
+            continue
+        if curr_state is not None and is_shown(*curr_state):
+            return scheduled_at
+        curr_state = None
+        if is_shown(name, brightness):
+            return state_time
+
+    if curr_state is not None and is_shown(*curr_state):
+        return scheduled_at
+    return None
+
+
+def _format_time(virtual_time, start_day_time_secs):
+    day_time = int(start_day_time_secs + virtual_time)
+    (day, secs) = divmod(day_time, SECS_IN_A_DAY)
+    return f"day {day} {secs // 3600:02}:{(secs // 60) % 60:02}:{secs % 60:02}"
+
+
+def print_report(stats, switches, lateness, start_day_time_secs, wall_time, days):
+    print(f"Simulated {days} day(s) in {wall_time:.2f}s\n")
+
+    print("Switches:")
+    for switch_time, kind, value in switches:
+        print(f"  {_format_time(switch_time, start_day_time_secs)}  {kind:<10} {value}")
+
+    print("\nScheduled changes:")
+    for scheduled_at, kind, value, late_by in lateness:
+        status = "never shown" if late_by is None else f"late by {late_by:.1f}s"
+        print(
+            f"  {_format_time(scheduled_at, start_day_time_secs)}  {kind:<10} {value}: "
+            f"{status}"
+        )
+
+    print("\nRenders:")
+    for name, count in sorted(stats.renders_per_applet.items()):
+        print(f"  {name}: {count} ({count / days:.0f} per day)")
+    print(
+        f"  total: {stats.render_count} ({stats.render_count / days:.0f} per day), "
+        f"failed: {stats.failed_renders}"
+    )
+    print(
+        f"  rendered ahead: {stats.preloads}, "
+        f"shown from the scene library: {stats.library_hits}"
+    )
+    print(f"  scenes queued to the display: {stats.scenes_queued}")
+
+    print(f"\nWakeups: {stats.wakeups}, idle: {stats.idle_wakeups}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(
+        description="Replays a config over a virtual day to check the schedule."
+    )
+    parser.add_argument("--config", default=main.JSON_PATH)
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--start", default="00:00", help="time of day to start at. hh:mm")
+    parser.add_argument(
+        "--render-time-ms",
+        type=int,
+        default=500,
+        help="virtual time every render takes",
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="fraction of renders that fail, to check the render_failures config",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument(
+        "--verbose", action="store_true", help="show output of the main loop"
+    )
+    args = parser.parse_args()
+
+    start_day_time_secs = UserConfig._parse_and_assert_time(args.start)
+    loop_output = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(loop_output):
+        (user_config, stats, wall_time) = run_simulation(
+            args.config,
+            args.days,
+            start_day_time_secs,
+            args.render_time_ms * _MS_TO_S,
+            args.failure_rate,
+        )
+
+    switches = get_switches(stats)
+    lateness = get_lateness(user_config, stats, args.days, start_day_time_secs)
+
+    if not args.json:
+        print_report(
+            stats, switches, lateness, start_day_time_secs, wall_time, args.days
+        )
+        return
+
+    report = {
+        "days": args.days,
+        "wall_time_secs": wall_time,
+        "switches": [
+            {"time": switch_time, "kind": kind, "value": value}
+            for switch_time, kind, value in switches
+        ],
+        "scheduled_changes": [
+            {
+                "time": scheduled_at,
+                "kind": kind,
+                "value": value,
+                "lateness_secs": late_by,
+            }
+            for scheduled_at, kind, value, late_by in lateness
+        ],
+        "renders_per_applet": stats.renders_per_applet,
+        "render_count": stats.render_count,
+        "renders_per_day": stats.render_count / args.days,
+        "failed_renders": stats.failed_renders,
+        "preloads": stats.preloads,
+        "library_hits": stats.library_hits,
+        "scenes_queued": stats.scenes_queued,
+        "wakeups": stats.wakeups,
+        "idle_wakeups": stats.idle_wakeups,
+    }
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,179 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+## Runs main.run_display_loop on the simulate.py fakes, with callbacks at given virtual times
+## standing in for the API server. Shared by the tests of the main loop.
+
+from refresh_requests import RefreshRequests
+from render_backoff import RenderFailureTracker
+from simulate import (
+    FakePixletWrapper,
+    RecordingDisplay,
+    SimulationClock,
+    SimulationFinished,
+    SimulationStats,
+)
+from tracing import Tracer
+from user_config import UserConfig
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+
+import main
+
+APPLETS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "applets"
+)
+
+
+def hours(hours, minutes=0):
+    return hours * 60 * 60 + minutes * 60
+
+
+def applet(name, start_time=None, dynamic=False, refresh_interval_ms=0, **options):
+    applet = {
+        "name": name,
+        "path": os.path.join(APPLETS_DIR, "hello_world.star"),
+        "dynamic": dynamic,
+        "refresh_interval_ms": refresh_interval_ms,
+        **options,
+    }
+    if start_time is not None:
+        applet["start_time"] = start_time
+    return applet
+
+
+class ScriptedClock(SimulationClock):
+    """
+    SimulationClock that calls back at given virtual times, while the main loop waits.
+    """
+
+    def __init__(self, start_day_time_secs, stop_at, stats):
+        super().__init__(start_day_time_secs, stop_at, stats)
+        # [(clock.monotonic() time, callback)], sorted by time
+        self._callbacks = []
+
+    def call_at(self, callback_time, callback):
+        self._callbacks.append((callback_time, callback))
+        self._callbacks.sort(key=lambda entry: entry[0])
+
+    async def wait_for_items(self, queues, timeout):
+        if self._callbacks and self._callbacks[0][0] <= self.monotonic() + timeout:
+            (callback_time, callback) = self._callbacks.pop(0)
+            self.advance(callback_time - self.monotonic())
+            callback()
+            timeout = 0.0
+        return await super().wait_for_items(queues, timeout)
+
+
+class RecordingPixletWrapper(FakePixletWrapper):
+    """
+    FakePixletWrapper that keeps the (clock.monotonic() time, applet) of every render. Renders
+    of the applets named in failing_applets always fail.
+    """
+
+    def __init__(self, clock, stats, render_time, failure_rate=0.0, failing_applets=()):
+        super().__init__(clock, stats, render_time, failure_rate, random.Random(0))
+        self._failing_applets = set(failing_applets)
+        self.renders = []
+
+    def create_gif_from_sketch(self, applet, render_id=0):
+        self.renders.append((self._clock.monotonic(), applet))
+        (gif_path, gif_hash) = super().create_gif_from_sketch(applet, render_id)
+        if gif_path is not None and applet["name"] in self._failing_applets:
+            self._stats.failed_renders += 1
+            return (None, None)
+        return (gif_path, gif_hash)
+
+    def get_render_times(self, name):
+        return [
+            render_time
+            for (render_time, applet) in self.renders
+            if applet["name"] == name
+        ]
+
+
+class DisplayLoop:
+    """
+    The main loop on the config json_data (written to directory), starting at
+    start_day_time_secs. Renders take render_time and fail with probability failure_rate, or
+    always for the applets in failing_applets.
+    """
+
+    def __init__(
+        self,
+        directory,
+        json_data,
+        start_day_time_secs=0,
+        render_time=0.5,
+        failure_rate=0.0,
+        failing_applets=(),
+    ):
+        self._json_path = os.path.join(directory, "config.json")
+        with open(self._json_path, "w") as json_file:
+            json.dump(json_data, json_file)
+        self._start_day_time_secs = start_day_time_secs
+        self._render_time = render_time
+        self._failure_rate = failure_rate
+        self._failing_applets = failing_applets
+        self._callbacks = []
+        self.brightness_queue = asyncio.Queue()
+        self.output = io.StringIO()
+
+    def call_at(self, callback_time, callback):
+        """
+        Calls callback once the loop waits past callback_time (in s since the start).
+        """
+        self._callbacks.append((callback_time, callback))
+
+    def run(self, secs):
+        """
+        Runs the loop for secs of virtual time.
+        returns self, with the fakes the loop ran on as attributes.
+        """
+        self.stats = SimulationStats()
+        self.clock = ScriptedClock(self._start_day_time_secs, secs, self.stats)
+        for callback_time, callback in self._callbacks:
+            self.clock.call_at(callback_time, callback)
+        self.pixlet_wrapper = RecordingPixletWrapper(
+            self.clock,
+            self.stats,
+            self._render_time,
+            self._failure_rate,
+            self._failing_applets,
+        )
+
+        with UserConfig(self._json_path, self.clock) as user_config:
+            self.display = RecordingDisplay(
+                self.clock, self.stats, user_config.get_scene_library_size()
+            )
+            self.render_tracker = RenderFailureTracker(
+                user_config.get_render_failure_policy(), self.clock, random.Random(0)
+            )
+            self.refresh_requests = RefreshRequests(user_config.get_applet_names())
+
+            async def run_loop():
+                try:
+                    await main.run_display_loop(
+                        user_config,
+                        self.display,
+                        self.pixlet_wrapper,
+                        Tracer(),
+                        self.render_tracker,
+                        self.brightness_queue,
+                        self.refresh_requests,
+                        self.clock,
+                    )
+                except SimulationFinished:
+                    pass
+
+            with contextlib.redirect_stdout(self.output):
+                asyncio.run(run_loop())
+        return self
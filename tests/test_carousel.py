@@ -0,0 +1,118 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from carousel import Carousel
+from clock import VirtualClock
+
+
+def _applet(name, dynamic=True, refresh_interval_ms=5000, dwell_ms=10000):
+    return {
+        "name": name,
+        "dynamic": dynamic,
+        "refresh_interval_ms": refresh_interval_ms,
+        "dwell_ms": dwell_ms,
+    }
+
+
+def _carousel(*applets):
+    clock = VirtualClock()
+    return (clock, Carousel({"rotation": list(applets)}, clock))
+
+
+def test_single_applet_never_rotates():
+    clock = VirtualClock()
+    carousel = Carousel(_applet("clock"), clock)
+
+    clock.advance(60 * 60)
+
+    assert carousel.get_upcoming_index() is None
+    assert carousel.get_rotation_time() is None
+    assert not carousel.should_rotate()
+    assert carousel.get_preload_time() is None
+
+
+def test_rotates_after_each_dwell():
+    (clock, carousel) = _carousel(
+        _applet("a", dwell_ms=10000), _applet("b", dwell_ms=5000), _applet("c")
+    )
+
+    shown = []
+    for _ in range(4):
+        shown.append(carousel.current()["name"])
+        clock.advance(carousel.get_rotation_time() - clock.monotonic() - 1)
+        assert not carousel.should_rotate()
+        clock.advance(1)
+        assert carousel.should_rotate()
+        carousel.rotate()
+
+    assert shown == ["a", "b", "c", "a"]
+    assert clock.monotonic() == 10 + 5 + 10 + 10
+
+
+def test_dwell_starts_once_shown():
+    (clock, carousel) = _carousel(_applet("a"), _applet("b"))
+
+    # The first render took 3s
+    clock.advance(3)
+    carousel.start_dwell()
+
+    assert carousel.get_rotation_time() == 13
+
+
+def test_renders_are_tracked_per_applet():
+    (clock, carousel) = _carousel(_applet("a"), _applet("b"))
+    clock.advance(1)
+    carousel.record_render("hash_b", 0.5, index=carousel.find("b"))
+
+    assert carousel.get_render_time() is None
+    assert carousel.get_render_time(1) == 1
+    assert carousel.get_scene_hash(1) == "hash_b"
+    assert carousel.find("c") is None
+
+    carousel.forget_render(1)
+    assert carousel.get_render_time(1) is None
+    assert carousel.get_scene_hash(1) is None
+
+
+def test_preload_never_rendered_applet_right_away():
+    (clock, carousel) = _carousel(_applet("a"), _applet("b"))
+    clock.advance(1)
+
+    assert carousel.get_preload_time() == 1
+
+
+def test_no_preload_of_static_applets():
+    (clock, carousel) = _carousel(_applet("a"), _applet("b", dynamic=False))
+    carousel.record_render("hash_b", 0.5, index=1)
+    clock.advance(5)
+
+    assert carousel.get_preload_time() is None
+
+
+def test_no_preload_while_still_up_to_date():
+    (clock, carousel) = _carousel(_applet("a"), _applet("b", refresh_interval_ms=20000))
+    carousel.record_render("hash_b", 0.5, index=1)
+
+    # Rotation at 10s, expiry at 20s
+    assert carousel.get_preload_time() is None
+
+
+def test_preload_ahead_of_rotation():
+    (clock, carousel) = _carousel(_applet("a"), _applet("b", refresh_interval_ms=2000))
+    # The render takes 1.5s, and is done twice as long before the rotation at 10s
+    carousel.record_render("hash_b", 1.5, index=1)
+
+    assert carousel.get_preload_time() == 10 - 2 * 1.5
+
+
+def test_preload_not_before_expiry():
+    (clock, carousel) = _carousel(_applet("a"), _applet("b", refresh_interval_ms=2000))
+    clock.advance(7.5)
+    carousel.record_render("hash_b", 1.5, index=1)
+
+    # Expires at 9.5s, after 10 - 2 * 1.5
+    assert carousel.get_preload_time() == 9.5
@@ -0,0 +1,63 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from clock import SECS_IN_A_DAY, VirtualClock, secs_until_day_time
+import asyncio
+import pytest
+
+
+def _hours(hours):
+    return hours * 60 * 60
+
+
+def test_advance():
+    clock = VirtualClock(_hours(23))
+
+    clock.advance(_hours(2))
+    # Never moves back
+    clock.advance(-10)
+
+    assert clock.monotonic() == _hours(2)
+    assert clock.day_time_secs() == _hours(1)
+    assert clock.day() == 1
+
+
+def test_secs_until_day_time():
+    clock = VirtualClock(_hours(6))
+
+    assert secs_until_day_time(clock, _hours(7)) == _hours(1)
+    assert secs_until_day_time(clock, _hours(5)) == _hours(23)
+    assert secs_until_day_time(clock, _hours(6)) == SECS_IN_A_DAY
+
+
+def test_wait_returns_queued_items_without_advancing():
+    clock = VirtualClock()
+    (first, second, empty) = (asyncio.Queue(), asyncio.Queue(), asyncio.Queue())
+    first.put_nowait("a")
+    first.put_nowait("b")
+    second.put_nowait("c")
+
+    items = asyncio.run(clock.wait_for_items([first, second, empty], 10))
+
+    # One item from each queue that has one, in order
+    assert items == [(first, "a"), (second, "c")]
+    assert first.qsize() == 1
+    assert clock.monotonic() == 0
+
+
+def test_wait_advances_by_timeout_when_nothing_is_queued():
+    clock = VirtualClock()
+    queue = asyncio.Queue()
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(clock.wait_for_items([queue], 10))
+    assert clock.monotonic() == 10
+
+    # Items queued while "waiting" are returned by the next wait
+    queue.put_nowait("a")
+    assert asyncio.run(clock.wait_for_items([queue], 10)) == [(queue, "a")]
+    assert clock.monotonic() == 10
@@ -0,0 +1,188 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from filters import (
+    FilteredImageCache,
+    FilterSchedule,
+    FilterSettings,
+    apply_filters,
+    apply_lut,
+    build_lut,
+)
+from PIL import Image
+from setup_exception import SetupException
+from user_config import UserConfig
+import numpy as np
+import pytest
+
+_VALUES = np.arange(256)
+
+
+def _schedule(config):
+    return FilterSchedule(config, UserConfig._parse_and_assert_time)
+
+
+def _hours(hours):
+    return hours * 60 * 60
+
+
+def test_identity_lut():
+    lut = build_lut(FilterSettings())
+
+    assert FilterSettings().is_identity()
+    assert lut.shape == (3, 256)
+    assert lut.dtype == np.uint8
+    for channel in lut:
+        np.testing.assert_array_equal(channel, _VALUES)
+
+
+def test_gain_lut():
+    lut = build_lut(FilterSettings(gain=(0.5, 1.0, 2.0)))
+
+    np.testing.assert_array_equal(lut[0], np.rint(_VALUES * 0.5))
+    np.testing.assert_array_equal(lut[1], _VALUES)
+    # Clipped to 255
+    np.testing.assert_array_equal(lut[2], np.minimum(_VALUES * 2, 255))
+
+
+def test_gamma_lut():
+    lut = build_lut(FilterSettings(gamma=2.0))
+
+    expected = np.rint((_VALUES / 255) ** 2 * 255)
+    for channel in lut:
+        np.testing.assert_array_equal(channel, expected)
+    assert (lut[:, 1:255] < _VALUES[1:255]).all()
+
+
+def test_brightness_lut():
+    lut = build_lut(FilterSettings(), 0.25)
+
+    for channel in lut:
+        np.testing.assert_array_equal(channel, np.rint(_VALUES * 0.25))
+    assert not build_lut(FilterSettings(), 0.0).any()
+
+
+def test_warm_color_temperature_lut():
+    lut = build_lut(FilterSettings(color_temperature=3000))
+
+    assert lut[0][255] == 255
+    assert lut[2][255] < lut[1][255] < 255
+
+
+def test_apply_lut():
+    img = Image.new("RGB", (64, 32), (200, 100, 50))
+    lut = build_lut(FilterSettings(gain=(0.5, 1.0, 2.0)))
+
+    filtered = apply_lut(img, lut)
+
+    assert filtered.size == img.size
+    assert filtered.getpixel((10, 10)) == (100, 100, 100)
+    assert img.getpixel((10, 10)) == (200, 100, 50)
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [FilterSettings(), FilterSettings(gain=(1.0, 0.9, 0.85), gamma=1.2)],
+)
+def test_apply_filters_matches_lut(settings):
+    rng = np.random.default_rng(0)
+    img = Image.fromarray(rng.integers(0, 256, (32, 64, 3), dtype=np.uint8))
+
+    filtered = apply_filters(img, settings, 0.4)
+
+    expected = apply_lut(img, build_lut(settings, 0.4))
+    assert filtered.mode == "RGB"
+    # ImageEnhance rounds differently from the lookup table
+    difference = np.asarray(filtered).astype(int) - np.asarray(expected)
+    assert np.abs(difference).max() <= 1
+
+
+def test_schedule_without_entries():
+    schedule = _schedule({"gamma": 1.5})
+
+    assert schedule.get_settings(_hours(12)) == FilterSettings(gamma=1.5)
+    assert schedule.get_next_change(_hours(12)) is None
+
+
+def test_schedule_entries_override_the_base():
+    schedule = _schedule(
+        {
+            "gain": [1.0, 0.9, 0.8],
+            "schedule": [
+                {"start_time": "20:00", "color_temperature": 3000},
+                {"start_time": "07:00", "gamma": 1.2},
+            ],
+        }
+    )
+    base_gain = (1.0, 0.9, 0.8)
+
+    assert schedule.get_settings(_hours(12)) == FilterSettings(
+        gain=base_gain, gamma=1.2
+    )
+    assert schedule.get_settings(_hours(21)) == FilterSettings(
+        gain=base_gain, color_temperature=3000
+    )
+    # The last entry of the day carries over past midnight
+    assert schedule.get_settings(_hours(3)) == schedule.get_settings(_hours(21))
+
+
+def test_schedule_next_change_wraps_around():
+    schedule = _schedule(
+        {
+            "schedule": [
+                {"start_time": "07:00", "gamma": 1.2},
+                {"start_time": "20:00", "gamma": 1.5},
+            ]
+        }
+    )
+
+    assert schedule.get_next_change(_hours(3)) == _hours(7)
+    assert schedule.get_next_change(_hours(7)) == _hours(20)
+    assert schedule.get_next_change(_hours(21)) == _hours(7)
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"gain": [1.0, 1.0]},
+        {"gain": [1.0, -1.0, 1.0]},
+        {"gain": 1.2},
+        {"gain": [1.0, "1.0", 1.0]},
+        {"gain": [1.0, True, 1.0]},
+        {"gamma": 0},
+        {"gamma": "2"},
+        {"gamma": None},
+        {"color_temperature": 500},
+        {"color_temperature": "4000"},
+        {"schedule": [{"start_time": "07:00", "gamma": "2"}]},
+        {
+            "schedule": [
+                {"start_time": "07:00", "gamma": 1.2},
+                {"start_time": "07:00", "gamma": 1.5},
+            ]
+        },
+    ],
+)
+def test_invalid_config(config):
+    with pytest.raises(SetupException):
+        _schedule(config)
+
+
+def test_filtered_image_cache_evicts_least_recently_used():
+    cache = FilteredImageCache(2)
+    images = [Image.new("RGB", (1, 1)) for _ in range(3)]
+    state = (1.0, FilterSettings())
+
+    cache.put(images[0], state, "filtered_0")
+    cache.put(images[1], state, "filtered_1")
+    assert cache.get(images[0], state) == "filtered_0"
+    cache.put(images[2], state, "filtered_2")
+
+    assert cache.get(images[0], state) == "filtered_0"
+    assert cache.get(images[1], state) is None
+    assert cache.get(images[2], state) == "filtered_2"
+    assert cache.get(images[2], (0.5, FilterSettings())) is None
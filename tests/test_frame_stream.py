@@ -0,0 +1,127 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from PIL import Image
+from scene import EncodedScene, FrameStream, FrameStreamConfig
+from setup_exception import SetupException
+import io
+import pytest
+
+_FRAME_COUNT = 5
+_FRAME_BYTES = 3 * 64 * 32
+
+
+def _encode_gif(loop=None, frame_count=_FRAME_COUNT):
+    frames = [Image.new("RGB", (64, 32), (40 * i, 0, 0)) for i in range(frame_count)]
+    options = {} if loop is None else {"loop": loop}
+    gif = io.BytesIO()
+    frames[0].save(
+        gif,
+        format="GIF",
+        save_all=True,
+        append_images=frames[1:],
+        duration=50,
+        **options,
+    )
+    return gif.getvalue()
+
+
+def _play(stream, max_frames=100):
+    frames = []
+    while len(frames) < max_frames:
+        frame = stream.next_frame()
+        if frame is None:
+            break
+        frames.append(frame)
+    stream.close()
+    return frames
+
+
+def _red(frames):
+    return [frame.img.getpixel((0, 0))[0] for frame in frames]
+
+
+def test_plays_once_without_loop():
+    frames = _play(FrameStream(EncodedScene(_encode_gif()), FrameStreamConfig()))
+
+    assert _red(frames) == [0, 40, 80, 120, 160]
+    assert all(frame.duration == pytest.approx(0.05) for frame in frames)
+    assert not any(frame.should_loop for frame in frames)
+
+
+def test_plays_loop_count_more_times():
+    frames = _play(FrameStream(EncodedScene(_encode_gif(loop=2)), FrameStreamConfig()))
+
+    assert _red(frames) == [0, 40, 80, 120, 160] * 3
+
+
+def test_loops_forever():
+    stream = FrameStream(EncodedScene(_encode_gif(loop=0)), FrameStreamConfig())
+
+    assert len(_play(stream, max_frames=50)) == 50
+
+
+def test_replays_resident_frames():
+    frames = _play(FrameStream(EncodedScene(_encode_gif(loop=1)), FrameStreamConfig()))
+    (first_pass, second_pass) = (frames[:_FRAME_COUNT], frames[_FRAME_COUNT:])
+
+    assert all(
+        second.img is first.img for (first, second) in zip(first_pass, second_pass)
+    )
+    assert not any(frame.resident for frame in first_pass)
+    assert all(frame.resident for frame in second_pass)
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"max_resident_frames": _FRAME_COUNT - 1},
+        {"max_resident_bytes": (_FRAME_COUNT - 1) * _FRAME_BYTES},
+    ],
+)
+def test_decodes_every_pass_over_budget(config):
+    stream = FrameStream(EncodedScene(_encode_gif(loop=1)), FrameStreamConfig(config))
+    frames = _play(stream)
+    (first_pass, second_pass) = (frames[:_FRAME_COUNT], frames[_FRAME_COUNT:])
+
+    assert _red(second_pass) == _red(first_pass)
+    assert not any(
+        first.img is second.img for (first, second) in zip(first_pass, second_pass)
+    )
+    assert not any(frame.resident for frame in frames)
+
+
+def test_scene_at_budget_is_resident():
+    config = FrameStreamConfig(
+        {
+            "max_resident_frames": _FRAME_COUNT,
+            "max_resident_bytes": _FRAME_COUNT * _FRAME_BYTES,
+        }
+    )
+    frames = _play(FrameStream(EncodedScene(_encode_gif(loop=1)), config))
+
+    assert all(frame.resident for frame in frames[_FRAME_COUNT:])
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"enabled": "yes"},
+        {"window_frames": 0},
+        {"window_frames": "8"},
+        {"window_frames": 2.5},
+        {"window_frames": True},
+        {"max_resident_frames": -1},
+        {"max_resident_frames": "120"},
+        {"max_resident_frames": None},
+        {"max_resident_bytes": -1},
+        {"max_resident_bytes": 1.5e6},
+    ],
+)
+def test_invalid_config(config):
+    with pytest.raises(SetupException):
+        FrameStreamConfig(config)
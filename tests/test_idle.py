@@ -0,0 +1,74 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from display_loop import DisplayLoop, applet, hours
+
+# Starts 2 minutes before the display goes idle at 22:00, and runs until 07:05
+_START = hours(21, 58)
+_IDLE_AT = hours(0, 2)
+_WAKE_AT = hours(9, 2)
+_DURATION = hours(9, 5)
+
+
+def _config(*applets):
+    return {
+        "applets": list(applets),
+        "brightness": {
+            "source": "schedule",
+            "schedule": [
+                {"start_time": "07:00", "value": 1.0},
+                {"start_time": "22:00", "value": 0},
+            ],
+        },
+    }
+
+
+def _clock(start_time="00:00"):
+    return applet("clock", start_time, dynamic=True, refresh_interval_ms=60 * 1000)
+
+
+def test_blanks_and_stops_rendering_at_zero_brightness(tmp_path):
+    loop = DisplayLoop(tmp_path, _config(_clock()), _START).run(_DURATION)
+
+    assert (_IDLE_AT, "clock", 0) in loop.stats.states
+    render_times = loop.pixlet_wrapper.get_render_times("clock")
+    assert not [
+        render_time
+        for render_time in render_times
+        if _IDLE_AT <= render_time < _WAKE_AT
+    ]
+
+
+def test_wakes_up_when_the_brightness_returns(tmp_path):
+    loop = DisplayLoop(tmp_path, _config(_clock()), _START).run(_DURATION)
+
+    assert loop.stats.states[-1] == (_WAKE_AT, "clock", 1.0)
+    # Rendered right away, and then every minute (+ the 0.5s render) again
+    render_times = [
+        render_time
+        for render_time in loop.pixlet_wrapper.get_render_times("clock")
+        if render_time >= _WAKE_AT
+    ]
+    assert render_times[:4] == [_WAKE_AT + 60.5 * i for i in range(4)]
+
+
+def test_sleeps_while_idle(tmp_path):
+    loop = DisplayLoop(tmp_path, _config(_clock()), _START).run(_DURATION)
+
+    # Woken up about once an hour for the 9 idle hours, instead of every minute
+    assert loop.stats.idle_wakeups <= 10
+
+
+def test_applet_scheduled_while_idle_renders_on_wake_up(tmp_path):
+    loop = DisplayLoop(
+        tmp_path, _config(_clock("06:00"), applet("hello", "23:00")), _START
+    ).run(_DURATION)
+
+    # hello's slot is entirely spent idle, clock's starts idle
+    assert loop.pixlet_wrapper.get_render_times("hello") == []
+    assert _WAKE_AT in loop.pixlet_wrapper.get_render_times("clock")
+    assert [name for (_, name, _) in loop.stats.states] == ["clock"] * 3
@@ -0,0 +1,92 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from clock import SECS_IN_A_DAY
+import planner
+import pytest
+
+
+def _profile(dynamic=True, refresh_interval_ms=1000, render_ms_mean=500, renders=5):
+    profile = {
+        "dynamic": dynamic,
+        "refresh_interval_ms": refresh_interval_ms,
+        "renders": renders,
+        "failures": 5 - renders,
+        "render_ms_mean": None,
+        "render_ms_max": None,
+        "pixlet_cpu_ms": None,
+        "pixlet_max_rss_kb": None,
+        "decode_ms": None,
+        "frames": None,
+        "scene_kb": None,
+    }
+    if renders > 0:
+        profile.update(
+            {
+                "render_ms_mean": render_ms_mean,
+                "render_ms_max": 2 * render_ms_mean,
+                "pixlet_cpu_ms": 300,
+                "pixlet_max_rss_kb": 50 * 1024,
+                "decode_ms": 100,
+                "frames": 10,
+                "scene_kb": 60,
+            }
+        )
+    return profile
+
+
+def test_totals():
+    profiles = {
+        "clock": _profile(render_ms_mean=500),
+        "weather": _profile(render_ms_mean=1000, refresh_interval_ms=60000),
+    }
+
+    plan = planner.get_plan(profiles, {"clock": 1000, "weather": 200}, 4)
+
+    assert plan["applets"]["clock"]["renders_per_day"] == 1000
+    # (300ms of pixlet + 100ms of decoding) per render
+    assert plan["applets"]["clock"]["cpu_secs_per_day"] == pytest.approx(400)
+    assert plan["applets"]["weather"]["cpu_secs_per_day"] == pytest.approx(80)
+
+    day = plan["day"]
+    assert day["renders_per_day"] == 1200
+    assert day["render_secs_per_day"] == pytest.approx(500 + 200)
+    assert day["cpu_secs_per_day"] == pytest.approx(480)
+    assert day["render_busy_fraction"] == pytest.approx(700 / SECS_IN_A_DAY)
+    assert day["cpu_duty_cycle"] == pytest.approx(480 / SECS_IN_A_DAY)
+    assert day["cpu_count"] == 4
+    assert day["cpu_duty_cycle_all_cores"] == pytest.approx(480 / SECS_IN_A_DAY / 4)
+
+
+def test_unscheduled_and_failed_applets():
+    profiles = {"clock": _profile(), "broken": _profile(renders=0)}
+
+    plan = planner.get_plan(profiles, {"broken": 100}, 1)
+
+    assert plan["applets"]["clock"]["renders_per_day"] == 0
+    assert plan["applets"]["clock"]["cpu_secs_per_day"] == 0
+    assert plan["applets"]["broken"]["cpu_secs_per_day"] is None
+    assert not plan["applets"]["broken"]["slower_than_refresh"]
+    # Renders that can't be measured don't count towards the totals
+    assert plan["day"]["renders_per_day"] == 0
+    assert plan["day"]["cpu_secs_per_day"] == 0
+
+
+@pytest.mark.parametrize(
+    "profile, slower_than_refresh",
+    [
+        (_profile(refresh_interval_ms=1000, render_ms_mean=1500), True),
+        (_profile(refresh_interval_ms=1000, render_ms_mean=1000), False),
+        (_profile(refresh_interval_ms=1000, render_ms_mean=500), False),
+        # Static applets are never re-rendered
+        (_profile(dynamic=False, refresh_interval_ms=0, render_ms_mean=500), False),
+    ],
+)
+def test_slower_than_refresh(profile, slower_than_refresh):
+    plan = planner.get_plan({"clock": profile}, {"clock": 10}, 1)
+
+    assert plan["applets"]["clock"]["slower_than_refresh"] == slower_than_refresh
@@ -0,0 +1,38 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from process_scheduling import ProcessScheduling
+from setup_exception import SetupException
+import pytest
+
+
+def test_defaults():
+    scheduling = ProcessScheduling()
+
+    assert scheduling.display_cpus == []
+    assert scheduling.display_policy == "other"
+    assert scheduling.render_nice == 0
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"display_cpus": [-1]},
+        {"display_cpus": ["0"]},
+        {"display_policy": "idle"},
+        {"display_policy": "fifo", "display_priority": 100},
+        {"display_policy": "fifo", "display_priority": "50"},
+        {"display_priority": "50"},
+        {"display_priority": True},
+        {"render_nice": 20},
+        {"render_nice": "10"},
+        {"render_nice": 1.5},
+    ],
+)
+def test_invalid_config(config):
+    with pytest.raises(SetupException):
+        ProcessScheduling(config)
@@ -0,0 +1,103 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from display_loop import DisplayLoop, applet, hours
+from fastapi.testclient import TestClient
+from refresh_requests import RefreshRequests
+from server import Server
+from user_config import UserConfig
+import pytest
+
+
+@pytest.fixture
+def refresh_requests():
+    refresh_requests = RefreshRequests({"clock", "weather"})
+    refresh_requests.set_slot({"name": "clock", "schema_vals": {"timezone": "UTC"}})
+    return refresh_requests
+
+
+@pytest.fixture
+def client(refresh_requests):
+    return TestClient(Server(refresh_requests=refresh_requests).app)
+
+
+def test_refresh_queues_configured_keys(client, refresh_requests):
+    response = client.post(
+        "/applets/clock/refresh", json={"schema_vals": {"timezone": "Asia/Tokyo"}}
+    )
+
+    assert response.status_code == 202
+    assert refresh_requests.pop("clock") == {"timezone": "Asia/Tokyo"}
+
+
+def test_refresh_rejects_flags(client, refresh_requests):
+    response = client.post(
+        "/applets/clock/refresh", json={"schema_vals": {"--output": "/etc/passwd"}}
+    )
+
+    assert response.status_code == 400
+    assert refresh_requests.pop("clock") is None
+
+
+def test_refresh_rejects_unknown_keys(client, refresh_requests):
+    response = client.post(
+        "/applets/clock/refresh", json={"schema_vals": {"location": "Tokyo"}}
+    )
+
+    assert response.status_code == 400
+    assert refresh_requests.pop("clock") is None
+
+
+def test_refresh_of_unknown_applet(client):
+    assert client.post("/applets/news/refresh").status_code == 404
+
+
+def test_refresh_of_applet_not_scheduled_now(client, refresh_requests):
+    assert client.post("/applets/weather/refresh").status_code == 409
+    assert refresh_requests.pop("weather") is None
+
+
+def test_keys_are_checked_against_the_current_slot(refresh_requests):
+    refresh_requests.set_slot({"name": "clock", "schema_vals": {"location": "Tokyo"}})
+
+    assert refresh_requests.get_invalid_keys("clock", {"location": "Paris"}) == []
+    assert refresh_requests.get_invalid_keys("clock", {"timezone": "UTC"}) == [
+        "timezone"
+    ]
+
+
+def test_with_schema_vals_rejects_flags():
+    applet = {"name": "clock", "schema_vals": {"timezone": "UTC"}}
+
+    with pytest.raises(ValueError):
+        UserConfig.with_schema_vals(applet, {"--output": "/etc/passwd"})
+
+
+def test_refresh_from_an_earlier_slot_drops_its_overrides(tmp_path):
+    # Both slots show "clock", with different schema_vals
+    loop = DisplayLoop(
+        tmp_path,
+        {
+            "applets": [
+                applet("clock", "07:00", schema_vals={"timezone": "UTC"}),
+                applet("clock", "22:00", schema_vals={"location": "Tokyo"}),
+            ]
+        },
+        start_day_time_secs=hours(21, 59),
+    )
+    # Accepted for the 22:00 slot, but picked up after the 07:00 slot went on display
+    loop.call_at(
+        hours(9, 1) + 10,
+        lambda: loop.refresh_requests.request("clock", {"location": "Paris"}),
+    )
+
+    loop.run(hours(9, 2))
+
+    (render_time, rendered) = loop.pixlet_wrapper.renders[-1]
+    assert render_time == hours(9, 1) + 10
+    assert rendered["schema_vals"] == {"timezone": "UTC"}
+    assert "Ignoring schema_vals of the refresh" in loop.output.getvalue()
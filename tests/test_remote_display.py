@@ -0,0 +1,49 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from remote_display import RemoteDisplay
+import json
+import os
+import pytest
+import scene_transport
+
+
+@pytest.fixture
+def address(tmp_path):
+    address = "unix:" + os.path.join(tmp_path, "display.sock")
+    with RemoteDisplay(address):
+        yield address
+
+
+def _say_hello(address, hello):
+    sock = scene_transport.connect(address, 5)
+    sock.settimeout(5)
+    scene_transport.send_message(
+        sock, scene_transport.MSG_HELLO, json.dumps(hello).encode("utf-8")
+    )
+    return sock
+
+
+def test_agent_with_same_protocol_is_accepted(address):
+    hello = {"protocol": scene_transport.PROTOCOL_VERSION, "scene_hash": None}
+    with _say_hello(address, hello) as sock:
+        (msg_type, _) = scene_transport.recv_message(sock)
+
+    assert msg_type == scene_transport.MSG_BRIGHTNESS
+
+
+@pytest.mark.parametrize(
+    "hello",
+    [
+        {"scene_hash": None},
+        {"protocol": scene_transport.PROTOCOL_VERSION + 1, "scene_hash": None},
+    ],
+)
+def test_agent_with_other_protocol_is_refused(address, hello):
+    with _say_hello(address, hello) as sock:
+        with pytest.raises(ConnectionError):
+            scene_transport.recv_message(sock)
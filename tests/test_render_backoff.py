@@ -0,0 +1,153 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from clock import VirtualClock
+from render_backoff import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    RenderFailurePolicy,
+    RenderFailureTracker,
+)
+from setup_exception import SetupException
+import pytest
+import random
+
+
+def _backoff(config=None):
+    clock = VirtualClock()
+    policy = RenderFailurePolicy(
+        {
+            "initial_backoff_ms": 1000,
+            "max_backoff_ms": 4000,
+            "jitter": 0,
+            "circuit_breaker_threshold": 3,
+            "circuit_open_ms": 60 * 1000,
+            "stale_window_ms": 10 * 1000,
+            **(config or {}),
+        }
+    )
+    tracker = RenderFailureTracker(policy, clock, random.Random(0))
+    return (clock, tracker.get("clock"))
+
+
+def test_backoff_doubles_up_to_the_max():
+    (clock, backoff) = _backoff(
+        {"circuit_breaker_threshold": 0, "stale_window_ms": 60 * 1000}
+    )
+
+    waits = []
+    for _ in range(5):
+        backoff.record_failure()
+        waits.append(backoff.next_attempt_time - clock.monotonic())
+        clock.advance(waits[-1])
+        assert backoff.can_attempt()
+
+    assert waits == [1, 2, 4, 4, 4]
+    assert backoff.get_circuit_state() == CIRCUIT_CLOSED
+
+
+def test_backoff_without_circuit_breaker_never_overflows():
+    (clock, backoff) = _backoff({"circuit_breaker_threshold": 0})
+
+    for _ in range(2000):
+        clock.advance(backoff.next_attempt_time - clock.monotonic())
+        backoff.record_failure()
+
+    assert backoff.consecutive_failures == 2000
+    assert backoff.get_circuit_state() == CIRCUIT_CLOSED
+    assert backoff.next_attempt_time - clock.monotonic() == 4
+
+
+def test_jitter_stays_in_range():
+    (clock, backoff) = _backoff({"jitter": 0.2})
+
+    backoff.record_failure()
+
+    assert 0.8 <= backoff.next_attempt_time - clock.monotonic() <= 1.2
+
+
+def test_circuit_transitions():
+    (clock, backoff) = _backoff()
+    assert backoff.get_circuit_state() == CIRCUIT_CLOSED
+
+    for _ in range(2):
+        backoff.record_failure()
+        clock.advance(backoff.next_attempt_time - clock.monotonic())
+    assert backoff.get_circuit_state() == CIRCUIT_CLOSED
+
+    backoff.record_failure()
+    assert backoff.get_circuit_state() == CIRCUIT_OPEN
+    assert not backoff.can_attempt()
+
+    clock.advance(59)
+    assert backoff.get_circuit_state() == CIRCUIT_OPEN
+    clock.advance(1)
+    assert backoff.get_circuit_state() == CIRCUIT_HALF_OPEN
+    assert backoff.can_attempt()
+
+    # The trial render fails: open again for another period
+    backoff.record_failure()
+    assert backoff.get_circuit_state() == CIRCUIT_OPEN
+    clock.advance(60)
+    assert backoff.get_circuit_state() == CIRCUIT_HALF_OPEN
+
+    backoff.record_success()
+    assert backoff.get_circuit_state() == CIRCUIT_CLOSED
+    assert not backoff.is_failing()
+    assert backoff.can_attempt()
+
+
+def test_stale_window_and_fallback():
+    (clock, backoff) = _backoff()
+    backoff.record_success()
+    assert backoff.get_next_action_time() is None
+
+    backoff.record_failure()
+    assert backoff.get_stale_deadline() == 10
+    assert backoff.get_next_action_time() == 1
+    assert not backoff.should_show_fallback()
+
+    clock.advance(10)
+    assert backoff.should_show_fallback()
+    backoff.fallback_shown = True
+    assert not backoff.should_show_fallback()
+
+    backoff.reset_staleness()
+    assert backoff.get_stale_deadline() is None
+    assert backoff.can_attempt()
+
+
+def test_status():
+    (clock, backoff) = _backoff()
+    backoff.record_success()
+    clock.advance(5)
+    backoff.record_failure()
+
+    status = backoff.get_status()
+
+    assert status["total_successes"] == 1
+    assert status["consecutive_failures"] == 1
+    assert status["circuit"] == CIRCUIT_CLOSED
+    assert status["secs_until_next_attempt"] == 1
+    assert status["secs_since_last_success"] == 5
+    assert status["stale_for_secs"] == 0
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"initial_backoff_ms": 0},
+        {"initial_backoff_ms": 2000, "max_backoff_ms": 1000},
+        {"jitter": 1},
+        {"circuit_breaker_threshold": -1},
+        {"stale_window_ms": -1},
+    ],
+)
+def test_invalid_policy(config):
+    with pytest.raises(SetupException):
+        RenderFailurePolicy(config)
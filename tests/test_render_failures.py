@@ -0,0 +1,65 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from display_loop import DisplayLoop, applet, hours
+
+
+def _config(**render_failures):
+    return {
+        "applets": [
+            {
+                "start_time": "00:00",
+                "rotation": [
+                    applet(
+                        "clock", dynamic=True, refresh_interval_ms=1000, dwell_ms=10000
+                    ),
+                    applet("hello", dwell_ms=10000),
+                ],
+            }
+        ],
+        "render_failures": {
+            "initial_backoff_ms": 60 * 1000,
+            "max_backoff_ms": 10 * 60 * 1000,
+            "jitter": 0,
+            "circuit_breaker_threshold": 0,
+            **render_failures,
+        },
+    }
+
+
+def _scenes_shown(loop):
+    return [name for (_, name, _) in loop.stats.states]
+
+
+def test_rotation_member_keeps_backing_off(tmp_path):
+    loop = DisplayLoop(
+        tmp_path, _config(stale_window_ms=hours(2) * 1000), failing_applets=["clock"]
+    ).run(hours(1))
+
+    attempts = loop.pixlet_wrapper.get_render_times("clock")
+    # Retried 1, 2, 4 and 8 minutes after the end of the failed render (0.5s), and then every
+    # 10 minutes: not on every turn of the rotation
+    waits = [
+        next_attempt - attempt - 0.5
+        for (attempt, next_attempt) in zip(attempts, attempts[1:])
+    ]
+    assert waits[:4] == [60, 120, 240, 480]
+    assert len(attempts) <= 10
+    assert loop.render_tracker.get("clock").consecutive_failures == len(attempts)
+
+
+def test_fallback_is_shown_on_every_turn_past_the_stale_window(tmp_path):
+    config = _config(stale_window_ms=60 * 1000)
+    config["render_failures"]["fallback_applet"] = applet("fallback")
+    loop = DisplayLoop(tmp_path, config, failing_applets=["clock"]).run(hours(0, 5))
+
+    scenes = _scenes_shown(loop)
+    first_fallback = scenes.index("fallback")
+    assert loop.stats.states[first_fallback][0] >= 60
+    # From then on, the turns of "clock" show the fallback
+    assert set(scenes[first_fallback:]) == {"fallback", "hello"}
+    assert scenes[first_fallback:].count("fallback") >= 10
@@ -0,0 +1,87 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from PIL import Image
+from pixlet_wrapper import _RENDER_FORMAT_FLAGS, _get_render_cmd
+from scene import DEFAULT_DISPLAY_TIME, RENDER_FORMATS, decode_scene
+import os
+import pytest
+
+_COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+
+
+def _save_animation(directory, render_format, durations, loop=0):
+    frames = [Image.new("RGB", (64, 32), color) for color in _COLORS[: len(durations)]]
+    output_path = os.path.join(directory, "applet" + RENDER_FORMATS[render_format])
+    options = {"lossless": True} if render_format == "webp" else {}
+    frames[0].save(
+        output_path,
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        loop=loop,
+        **options,
+    )
+    return output_path
+
+
+def test_gif_render_cmd():
+    cmd = _get_render_cmd("gif", "in/clock.star", "out/clock.gif", ["timezone=UTC"])
+
+    assert cmd == [
+        "pixlet",
+        "render",
+        "--gif",
+        "--output",
+        "out/clock.gif",
+        "in/clock.star",
+        "timezone=UTC",
+    ]
+
+
+def test_webp_render_cmd():
+    # WebP is pixlet's default output, there is no --webp flag
+    cmd = _get_render_cmd("webp", "in/clock.star", "out/clock.webp", [])
+
+    assert cmd == ["pixlet", "render", "--output", "out/clock.webp", "in/clock.star"]
+
+
+def test_render_cmd_prefix():
+    cmd = _get_render_cmd(
+        "gif", "in/clock.star", "out/clock.gif", [], ["nice", "-n", "10"]
+    )
+
+    assert cmd[:5] == ["nice", "-n", "10", "pixlet", "render"]
+
+
+def test_every_render_format_has_flags():
+    assert set(_RENDER_FORMAT_FLAGS) == set(RENDER_FORMATS)
+
+
+@pytest.mark.parametrize("render_format", list(RENDER_FORMATS))
+def test_decode_animation(tmp_path, render_format):
+    output_path = _save_animation(tmp_path, render_format, [100, 200, 300], loop=2)
+
+    frames = decode_scene(output_path)
+
+    assert [frame.img.getpixel((0, 0)) for frame in frames] == _COLORS
+    assert [frame.duration for frame in frames] == pytest.approx([0.1, 0.2, 0.3])
+    assert all(frame.img.mode == "RGB" for frame in frames)
+    assert all(frame.should_loop for frame in frames)
+    assert frames[0].loop_count == 2
+
+
+@pytest.mark.parametrize("render_format", list(RENDER_FORMATS))
+def test_decode_still(tmp_path, render_format):
+    output_path = os.path.join(tmp_path, "applet" + RENDER_FORMATS[render_format])
+    Image.new("RGB", (64, 32), _COLORS[0]).save(output_path, lossless=True)
+
+    frames = decode_scene(output_path)
+
+    assert len(frames) == 1
+    assert frames[0].img.getpixel((0, 0)) == _COLORS[0]
+    assert frames[0].duration == DEFAULT_DISPLAY_TIME
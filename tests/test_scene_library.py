@@ -0,0 +1,40 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from scene import SceneLibrary
+
+
+def test_evicts_least_recently_used():
+    library = SceneLibrary(2)
+    library.put("a", "hash_a", "scene_a")
+    library.put("b", "hash_b", "scene_b")
+
+    assert library.get("a", "hash_a") == "scene_a"
+    library.put("c", "hash_c", "scene_c")
+
+    assert len(library) == 2
+    assert library.has("a", "hash_a")
+    assert not library.has("b", "hash_b")
+    assert library.has("c", "hash_c")
+
+
+def test_keeps_one_scene_per_name():
+    library = SceneLibrary(2)
+    library.put("a", "hash_1", "scene_1")
+    library.put("a", "hash_2", "scene_2")
+
+    assert len(library) == 1
+    assert library.get("a", "hash_1") is None
+    assert library.get("a", "hash_2") == "scene_2"
+
+
+def test_of_zero_capacity_keeps_nothing():
+    library = SceneLibrary(0)
+    library.put("a", "hash_a", "scene_a")
+
+    assert len(library) == 0
+    assert not library.has("a", "hash_a")
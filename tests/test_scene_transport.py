@@ -0,0 +1,130 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from PIL import Image
+from scene import Scene, create_frame
+from scene_transport import SceneDecoder, SceneEncoder
+import pytest
+import scene_transport
+import zlib
+
+_SIZE = (64, 32)
+
+
+def _scene(colors, scene_id=1):
+    frames = []
+    for index, color in enumerate(colors):
+        img = Image.new("RGB", _SIZE, color)
+        # A pixel that changes from frame to frame, like the seconds of a clock
+        img.putpixel((index, 0), (255, 255, 255))
+        frames.append(create_frame(img, 0.1 * (index + 1), True, 3))
+    return Scene(frames, scene_id)
+
+
+def _assert_same_frames(decoded, scene):
+    assert len(decoded.frames) == len(scene.frames)
+    for decoded_frame, frame in zip(decoded.frames, scene.frames):
+        assert decoded_frame.img.tobytes() == frame.img.tobytes()
+        assert decoded_frame.duration == pytest.approx(frame.duration)
+        assert decoded_frame.should_loop == frame.should_loop
+        assert decoded_frame.loop_count == frame.loop_count
+
+
+def _frame_payload(data, width=_SIZE[0], height=_SIZE[1], encoding=0):
+    """
+    returns a MSG_SCENE payload with a single frame of compressed data.
+    """
+    return (
+        scene_transport._SCENE_HEADER.pack(1, 1, 1)
+        + b"h"
+        + scene_transport._FRAME_HEADER.pack(
+            100, 0, 0, width, height, encoding, len(data)
+        )
+        + data
+    )
+
+
+def test_round_trip():
+    (encoder, decoder) = (SceneEncoder(), SceneDecoder())
+    scene = _scene([(10, 20, 30)] * 4, scene_id=7)
+
+    (scene_hash, decoded) = decoder.decode(encoder.encode("hash", scene))
+
+    assert scene_hash == "hash"
+    assert decoded.scene_id == 7
+    _assert_same_frames(decoded, scene)
+
+
+def test_round_trip_with_delta_frames():
+    (encoder, decoder) = (SceneEncoder(), SceneDecoder())
+    first = _scene([(10, 20, 30)] * 3)
+    # Same background: the first frame is delta encoded against the previous scene
+    second = _scene([(10, 20, 30)] * 3, scene_id=2)
+
+    decoder.decode(encoder.encode("first", first))
+    (_, decoded) = decoder.decode(encoder.encode("second", second))
+
+    _assert_same_frames(decoded, second)
+
+
+def test_delta_frames_are_smaller_than_key_frames():
+    scene = _scene([(10, 20, 30)] * 2)
+    encoder = SceneEncoder()
+    encoder.encode("first", scene)
+
+    assert len(encoder.encode("second", scene)) < len(
+        SceneEncoder().encode("second", scene)
+    )
+
+
+def test_delta_frame_without_reference_is_malformed():
+    encoder = SceneEncoder()
+    encoder.encode("first", _scene([(10, 20, 30)]))
+    payload = encoder.encode("second", _scene([(10, 20, 30)]))
+
+    with pytest.raises(ValueError):
+        SceneDecoder().decode(payload)
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        b"",
+        b"\x00" * 5,
+        # Truncated frame data
+        SceneEncoder().encode("hash", _scene([(1, 2, 3)]))[:-10],
+        # Not zlib
+        _frame_payload(b"not zlib data"),
+        # Unknown encoding
+        _frame_payload(zlib.compress(b"\x00" * 3 * _SIZE[0] * _SIZE[1]), encoding=9),
+        # Hash that isn't UTF-8
+        scene_transport._SCENE_HEADER.pack(1, 0, 1) + b"\xff",
+    ],
+)
+def test_malformed_payloads(payload):
+    with pytest.raises(ValueError):
+        SceneDecoder().decode(payload)
+
+
+@pytest.mark.parametrize(
+    "size", [3 * _SIZE[0] * _SIZE[1] - 1, 3 * _SIZE[0] * _SIZE[1] + 1]
+)
+def test_frames_of_the_wrong_size_are_malformed(size):
+    with pytest.raises(ValueError):
+        SceneDecoder().decode(_frame_payload(zlib.compress(b"\x00" * size)))
+
+
+def test_oversized_frames_are_not_decompressed():
+    # 128 MiB of zeros compress to 128 KiB
+    compressor = zlib.compressobj()
+    chunk = b"\x00" * (1024 * 1024)
+    data = b"".join(compressor.compress(chunk) for _ in range(128)) + compressor.flush()
+
+    with pytest.raises(ValueError):
+        SceneDecoder().decode(_frame_payload(data))
+    with pytest.raises(ValueError):
+        SceneDecoder().decode(_frame_payload(data, width=32768, height=32768))
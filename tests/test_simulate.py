@@ -0,0 +1,71 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from display_loop import applet, hours
+from simulate import get_lateness, get_switches, run_simulation
+import contextlib
+import io
+import json
+import os
+
+
+def _simulate(tmp_path, render_time=0.5, failure_rate=0.0, render_times=None):
+    config = {
+        "applets": [
+            applet("clock", "06:00", dynamic=True, refresh_interval_ms=60 * 1000),
+            applet("hello", "22:00"),
+        ]
+    }
+    config_path = os.path.join(tmp_path, "config.json")
+    with open(config_path, "w") as json_file:
+        json.dump(config, json_file)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_simulation(
+            config_path, 1, 0, render_time, failure_rate, render_times
+        )
+
+
+def test_render_counts(tmp_path):
+    (_, stats, _) = _simulate(tmp_path)
+
+    # clock is rendered every 60s (+ the 0.5s render) from 06:00 to 22:00, hello once at the
+    # start and once at 22:00
+    assert stats.renders_per_applet == {"clock": 953, "hello": 2}
+    assert stats.render_count == 955
+    assert stats.scenes_queued == 955
+    assert stats.failed_renders == 0
+
+
+def test_render_times_override_render_time(tmp_path):
+    (_, stats, _) = _simulate(tmp_path, render_times={"clock": 2.5})
+
+    assert stats.renders_per_applet == {"clock": 922, "hello": 2}
+
+
+def test_failed_renders(tmp_path):
+    (_, stats, _) = _simulate(tmp_path, failure_rate=1.0)
+
+    assert stats.failed_renders == stats.render_count
+    # Backed off, instead of retrying every minute: at most once per max_backoff (5 min by
+    # default) from 06:00 to 22:00
+    assert stats.renders_per_applet["clock"] <= hours(16) / (5 * 60)
+
+
+def test_switches_and_lateness(tmp_path):
+    (user_config, stats, _) = _simulate(tmp_path)
+
+    assert [
+        (kind, value) for (_, kind, value) in get_switches(stats) if kind == "applet"
+    ] == [("applet", "hello"), ("applet", "clock"), ("applet", "hello")]
+    lateness = get_lateness(user_config, stats, 1, 0)
+    assert [(time, value) for (time, _, value, _) in lateness] == [
+        (hours(6), "clock"),
+        (hours(22), "hello"),
+    ]
+    # Shown within the 0.5s render, plus the wait rounded up to the second
+    assert all(late is not None and late <= 1.0 for (_, _, _, late) in lateness)
@@ -0,0 +1,133 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from setup_exception import SetupException
+from tracing import Span, Tracer
+import asyncio
+import contextlib
+import io
+import os
+import pytest
+
+import main
+
+
+def _span(name, start, duration=0.5, pid=1, tid=2, **args):
+    return Span(name, start, duration, pid, tid, args)
+
+
+def test_ring_drops_oldest_spans():
+    tracer = Tracer(enabled=True, buffer_size=3)
+
+    for i in range(5):
+        tracer.add_span(f"span_{i}", i, 0.1)
+
+    assert [span.name for span in tracer.get_spans()] == ["span_2", "span_3", "span_4"]
+
+
+def test_span_records_duration_and_args():
+    tracer = Tracer(enabled=True)
+
+    with tracer.span("render", render_id=7) as span:
+        span.set_arg("frames", 3)
+
+    [recorded] = tracer.get_spans()
+    assert recorded.name == "render"
+    assert recorded.duration >= 0
+    assert recorded.pid == os.getpid()
+    assert recorded.args == {"render_id": 7, "frames": 3}
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+
+    with tracer.span("render", render_id=7) as span:
+        span.set_arg("frames", 3)
+    tracer.add_span("transit", 0.0, 1.0)
+
+    assert tracer.get_spans() == []
+
+
+@pytest.mark.parametrize("buffer_size", [0, -1, "8", 1.5])
+def test_invalid_buffer_size(buffer_size):
+    with pytest.raises(SetupException):
+        Tracer.from_config({"enabled": True, "buffer_size": buffer_size})
+
+
+def test_chrome_trace():
+    spans = [
+        _span("decode", 2.0, pid=20, tid=21, scene_id=1),
+        _span("render", 1.0, duration=0.25, render_id=1),
+    ]
+
+    trace = Tracer.to_chrome_trace(spans, {1: "main", 20: "display"})
+
+    assert trace["displayTimeUnit"] == "ms"
+    assert trace["traceEvents"] == [
+        {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "main"}},
+        {"name": "process_name", "ph": "M", "pid": 20, "args": {"name": "display"}},
+        # Sorted by start, in us
+        {
+            "name": "render",
+            "cat": "rpi-retro-display",
+            "ph": "X",
+            "ts": 1000000.0,
+            "dur": 250000.0,
+            "pid": 1,
+            "tid": 2,
+            "args": {"render_id": 1},
+        },
+        {
+            "name": "decode",
+            "cat": "rpi-retro-display",
+            "ph": "X",
+            "ts": 2000000.0,
+            "dur": 500000.0,
+            "pid": 20,
+            "tid": 21,
+            "args": {"scene_id": 1},
+        },
+    ]
+
+
+def test_trace_write_is_kept_until_done(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trace_writes = set()
+
+    async def write():
+        task = main._start_trace_write(lambda: {"traceEvents": []}, trace_writes)
+        assert trace_writes == {task}
+        await task
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(write())
+
+    assert trace_writes == set()
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_failed_trace_write_is_logged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trace_writes = set()
+
+    def export_trace():
+        raise RuntimeError("display process is gone")
+
+    async def write():
+        task = main._start_trace_write(export_trace, trace_writes)
+        await asyncio.wait([task])
+        # Done callbacks run on the next loop iteration
+        await asyncio.sleep(0)
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        asyncio.run(write())
+
+    assert trace_writes == set()
+    assert "Failed to write trace: RuntimeError('display process is gone')" in (
+        output.getvalue()
+    )
@@ -0,0 +1,174 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from clock import VirtualClock
+from setup_exception import SetupException
+from user_config import UserConfig
+import json
+import os
+import pytest
+
+_APPLETS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "applets"
+)
+
+
+def _applet(name, start_time=None, **options):
+    applet = {
+        "name": name,
+        "path": os.path.join(_APPLETS_DIR, "hello_world.star"),
+        "dynamic": False,
+        "refresh_interval_ms": 0,
+        **options,
+    }
+    if start_time is not None:
+        applet["start_time"] = start_time
+    return applet
+
+
+def _brightness(*entries):
+    return {
+        "source": "schedule",
+        "schedule": [
+            {"start_time": start_time, "value": value}
+            for (start_time, value) in entries
+        ],
+    }
+
+
+def _hours(hours, minutes=0):
+    return hours * 60 * 60 + minutes * 60
+
+
+@pytest.fixture
+def load_config(tmp_path):
+    def load_config(json_data, day_time_secs=0):
+        json_path = os.path.join(tmp_path, "config.json")
+        with open(json_path, "w") as json_file:
+            json.dump(json_data, json_file)
+        clock = VirtualClock(day_time_secs)
+        with UserConfig(json_path, clock) as user_config:
+            return (clock, user_config)
+
+    return load_config
+
+
+def test_single_applet_is_shown_all_day(load_config):
+    (_, user_config) = load_config({"applets": [_applet("clock", "07:00")]})
+
+    (applet, next_time) = user_config.get_current_applet()
+
+    assert applet["name"] == "clock"
+    assert next_time is None
+
+
+def test_applets_wrap_around_the_day(load_config):
+    (clock, user_config) = load_config(
+        {"applets": [_applet("day", "07:00"), _applet("night", "22:00")]},
+        _hours(3),
+    )
+
+    # The last applet of the day carries over past midnight
+    (applet, next_time) = user_config.get_current_applet()
+    assert (applet["name"], next_time) == ("night", _hours(7))
+
+    clock.advance(_hours(4))
+    (applet, next_time) = user_config.get_current_applet()
+    assert (applet["name"], next_time) == ("day", _hours(22))
+
+    clock.advance(_hours(15))
+    (applet, next_time) = user_config.get_current_applet()
+    assert (applet["name"], next_time) == ("night", _hours(7))
+
+
+def test_brightness_defaults_to_full(load_config):
+    (_, user_config) = load_config({"applets": [_applet("clock", "07:00")]})
+
+    assert user_config.get_current_brightness() == (1.0, None)
+
+
+def test_constant_brightness(load_config):
+    (_, user_config) = load_config(
+        {
+            "applets": [_applet("clock", "07:00")],
+            "brightness": _brightness(("12:00", 0.5)),
+        }
+    )
+
+    assert user_config.get_current_brightness() == (0.5, None)
+
+
+def test_brightness_wraps_around_the_day(load_config):
+    (clock, user_config) = load_config(
+        {
+            "applets": [_applet("clock", "07:00")],
+            "brightness": _brightness(("07:00", 1), ("20:00", 0.3), ("23:30", 0.1)),
+        },
+        _hours(1),
+    )
+
+    assert user_config.get_current_brightness() == (0.1, _hours(7))
+    clock.advance(_hours(6))
+    assert user_config.get_current_brightness() == (1, _hours(20))
+    clock.advance(_hours(13, 30))
+    assert user_config.get_current_brightness() == (0.3, _hours(23, 30))
+    clock.advance(_hours(3))
+    assert user_config.get_current_brightness() == (0.1, _hours(7))
+
+
+def test_brightness_doesnt_change_the_applet_timeline(load_config):
+    (_, user_config) = load_config(
+        {
+            "applets": [_applet("clock", "07:00")],
+            "brightness": _brightness(("07:00", 1), ("20:00", 0.3)),
+        },
+        _hours(21),
+    )
+
+    assert len(user_config.get_schedule()) == 1
+    assert user_config.get_current_applet()[1] is None
+
+
+def test_rotation_defaults(load_config):
+    (_, user_config) = load_config(
+        {
+            "applets": [
+                {
+                    "start_time": "07:00",
+                    "rotation": [_applet("a"), _applet("b", dwell_ms=5000)],
+                }
+            ]
+        }
+    )
+
+    (slot, _) = user_config.get_current_applet()
+    rotation = UserConfig.get_rotation(slot)
+
+    assert slot["name"] == "a + b"
+    assert [applet["dwell_ms"] for applet in rotation] == [15000, 5000]
+
+
+@pytest.mark.parametrize(
+    "json_data",
+    [
+        {"applets": [_applet("a", "07:00"), _applet("b", "07:00")]},
+        {
+            "applets": [_applet("a", "07:00")],
+            "brightness": _brightness(("07:00", 1), ("07:00", 0.5)),
+        },
+        {"applets": [{"start_time": "07:00", "rotation": []}]},
+        {
+            "applets": [
+                {"start_time": "07:00", "rotation": [_applet("a"), _applet("a")]}
+            ]
+        },
+        {"applets": [_applet("a", "07:00", path="applets/missing.star")]},
+    ],
+)
+def test_invalid_config(load_config, json_data):
+    with pytest.raises(SetupException):
+        load_config(json_data)
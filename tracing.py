@@ -0,0 +1,175 @@
+###############################################################################
+# "THE BEER-WARE LICENSE" (Revision 42):
+# Avichal Rakesh wrote this file. As long as you retain this notice you
+# can do whatever you want with this stuff. If we meet some day, and you think
+# this stuff is worth it, you can buy me a beer in return. Avichal Rakesh
+###############################################################################
+
+from collections import deque
+from dataclasses import dataclass, field
+from setup_exception import SetupException
+import itertools
+import os
+import threading
+import time
+
+_DEFAULT_BUFFER_SIZE = 8192
+_S_TO_US = 1000 * 1000
+
+
+@dataclass
+class Span:
+    name: str
+    # time.perf_counter() (in s) at which the span started. perf_counter is based on
+    # CLOCK_MONOTONIC on Linux, which makes timestamps comparable across processes.
+    start: float
+    # time (in s) the span lasted
+    duration: float
+    # process and (native) thread the span was recorded on
+    pid: int
+    tid: int
+    # extra information to show with the span. Ex: the render_id
+    args: dict = field(default_factory=dict)
+
+
+class _NullSpan:
+    """
+    No-op span returned when tracing is disabled. It holds no state, so a single instance is
+    shared by all callers.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def set_arg(self, key, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ActiveSpan:
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._tracer.add_span(
+            self._name,
+            self._start,
+            time.perf_counter() - self._start,
+            self._args,
+        )
+
+    def set_arg(self, key, value):
+        """
+        Adds extra information to the span after it started. Ex: number of decoded frames.
+        """
+        self._args[key] = value
+
+
+class Tracer:
+    """
+    Records spans of work into a bounded in-memory ring. Oldest spans are dropped once the ring is
+    full. When tracing is disabled, span() returns a shared no-op context manager, so leaving the
+    instrumentation in place costs next to nothing.
+
+    Each process has its own Tracer. Spans from different processes are correlated by the
+    render_id/scene_id args.
+    """
+
+    def __init__(self, enabled=False, buffer_size=_DEFAULT_BUFFER_SIZE):
+        self.enabled = enabled
+        self._spans = deque(maxlen=buffer_size)
+        self._id_counter = itertools.count(1)
+
+    @staticmethod
+    def from_config(config):
+        """
+        Creates a Tracer from the "tracing" section of config.json. config can be None.
+        """
+        config = {} if config is None else config
+        buffer_size = config.get("buffer_size", _DEFAULT_BUFFER_SIZE)
+        if not isinstance(buffer_size, int) or buffer_size <= 0:
+            raise SetupException(
+                f"Invalid tracing buffer_size: {buffer_size}. Must be a positive integer."
+            )
+        return Tracer(config.get("enabled", False), buffer_size)
+
+    def new_id(self):
+        """
+        returns a new id to correlate spans of one render across processes.
+        """
+        return next(self._id_counter)
+
+    def span(self, name, **args):
+        """
+        returns a context manager that records a span called name for the duration of the
+        'with' block.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _ActiveSpan(self, name, args)
+
+    def add_span(self, name, start, duration, args=None):
+        """
+        Records a span that was measured outside of span(). Ex: time a scene spent in transit
+        between processes.
+        """
+        if not self.enabled:
+            return
+        self._spans.append(
+            Span(
+                name=name,
+                start=start,
+                duration=duration,
+                pid=os.getpid(),
+                tid=threading.get_native_id(),
+                args={} if args is None else args,
+            )
+        )
+
+    def get_spans(self):
+        """
+        returns a copy of all spans currently in the ring, oldest first.
+        """
+        return list(self._spans)
+
+    @staticmethod
+    def to_chrome_trace(spans, process_names=None):
+        """
+        Converts spans into the Chrome trace event format, which can be loaded by
+        chrome://tracing and https://ui.perfetto.dev
+
+        process_names is an optional dict of {pid: name} used to label processes in the trace.
+        """
+        events = []
+        for pid, name in (process_names or {}).items():
+            events.append(
+                {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}
+            )
+
+        for span in sorted(spans, key=lambda s: s.start):
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": "rpi-retro-display",
+                    "ph": "X",
+                    "ts": span.start * _S_TO_US,
+                    "dur": span.duration * _S_TO_US,
+                    "pid": span.pid,
+                    "tid": span.tid,
+                    "args": span.args,
+                }
+            )
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
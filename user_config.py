@@ -8,22 +8,44 @@
 from sortedcontainers import SortedDict
 from os import path
 from setup_exception import SetupException
+from clock import SystemClock
+from display_controller import DISPLAY_BACKENDS
+from filters import FilterSchedule
+from process_scheduling import ProcessScheduling
+from remote_display import DEFAULT_LISTEN_ADDRESS, REMOTE_BACKEND
+from render_backoff import RenderFailurePolicy
+from scene import RENDER_FORMATS, FrameStreamConfig
+from tracing import Tracer
 import copy
+import scene_transport
 import json
 import re
-import time
 
 _TIME_REGEX = r"(\d\d):(\d\d)"  # pattern for hh:mm
+_DEFAULT_DWELL_MS = 15000  # time each applet of a rotation is shown for, if not set
+_DEFAULT_SCENE_LIBRARY_SIZE = 8
 
 
 class UserConfig:
-    def __init__(self, json_path):
+    def __init__(self, json_path, clock=None):
         self._json_path = json_path
+        # Clock used to pick the current applet. SystemClock or VirtualClock.
+        self._clock = SystemClock() if clock is None else clock
 
     def __enter__(self):
         with open(self._json_path) as json_file:
             json_data = json.load(json_file)
             self._init_applets(json_data)
+            self._process_scheduling = ProcessScheduling(
+                json_data.get("process_scheduling")
+            )
+            self._init_render_format(json_data)
+            self._init_display(json_data)
+            self._init_render_failure_policy(json_data)
+            self._filter_schedule = FilterSchedule(
+                json_data.get("filters"), UserConfig._parse_and_assert_time
+            )
+            self._tracer = Tracer.from_config(json_data.get("tracing"))
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -40,6 +62,8 @@ class UserConfig:
 
         start_time_to_applet = {}
         for applet in applets:
+            if "rotation" in applet:
+                UserConfig._init_rotation(applet)
             start_time = applet["start_time"]
 
             if start_time_to_applet.get(start_time) is not None:
@@ -88,67 +112,131 @@ class UserConfig:
         self._validate_applets(start_time_to_applet)
         self._process_config(start_time_to_applet, start_time_to_brightness)
 
-    def _validate_applets(self, start_time_to_applet):
-        # Check that all applets have a valid path.
-        for applet in start_time_to_applet.values():
-            applet_path = path.abspath(applet["path"])
-            if not path.exists(applet_path):
-                applet_name = applet["name"]
+    @staticmethod
+    def _init_rotation(slot):
+        """
+        Checks the "rotation" of a time slot, and sets the defaults of the slot and its applets.
+        """
+        rotation = slot["rotation"]
+        if not isinstance(rotation, list) or len(rotation) == 0:
+            raise SetupException(
+                f"Invalid rotation at {slot.get('start_time')}. Must be a non-empty list of "
+                "applets."
+            )
+
+        names = [applet["name"] for applet in rotation]
+        if len(set(names)) != len(names):
+            # Renders, and the scenes kept for the rotation, are tracked by applet name
+            raise SetupException(f"Found duplicate applet names in rotation: {names}")
+
+        for applet in rotation:
+            applet.setdefault("dwell_ms", _DEFAULT_DWELL_MS)
+            if applet["dwell_ms"] <= 0:
                 raise SetupException(
-                    f"Applet path '{applet_path}', for applet '{applet_name}', does not exist."
+                    f"Invalid dwell_ms for applet '{applet['name']}': {applet['dwell_ms']}. "
+                    "Must be positive."
                 )
+        slot.setdefault("name", " + ".join(names))
+
+    def _init_render_format(self, json_data):
+        self._render_format = json_data.get("render_format", "gif")
+        if self._render_format not in RENDER_FORMATS:
+            raise SetupException(
+                f"Invalid render_format: {self._render_format}. "
+                f"Must be one of {list(RENDER_FORMATS.keys())}"
+            )
+
+    def _init_display(self, json_data):
+        display = json_data.get("display", {})
+        self._display_backend = display.get("backend", "rgbmatrix")
+        if self._display_backend not in DISPLAY_BACKENDS + [REMOTE_BACKEND]:
+            raise SetupException(
+                f"Invalid display backend: {self._display_backend}. "
+                f"Must be one of {DISPLAY_BACKENDS + [REMOTE_BACKEND]}"
+            )
+        self._display_listen_address = display.get(
+            "listen_address", DEFAULT_LISTEN_ADDRESS
+        )
+        # Raises SetupException if the address is invalid
+        scene_transport.parse_address(self._display_listen_address)
+        self._idle_at_zero_brightness = display.get("idle_at_zero_brightness", True)
+        self._frame_stream_config = FrameStreamConfig(display.get("streaming"))
+        self._scene_library_size = display.get(
+            "scene_library_size", _DEFAULT_SCENE_LIBRARY_SIZE
+        )
+        if self._scene_library_size < 0:
+            raise SetupException(
+                f"Invalid scene_library_size: {self._scene_library_size}. "
+                "Must not be negative."
+            )
+        self._server_enabled = json_data.get("server", {}).get("enabled", False)
+
+    def _init_render_failure_policy(self, json_data):
+        self._render_failure_policy = RenderFailurePolicy(
+            json_data.get("render_failures")
+        )
+
+        fallback_applet = self._render_failure_policy.fallback_applet
+        if fallback_applet is None:
+            return
+
+        fallback_applet.setdefault("name", "fallback")
+        UserConfig._validate_applet_path(fallback_applet)
+        UserConfig._setup_cmd_args(fallback_applet)
+        # The fallback is rendered once per failure streak
+        fallback_applet["dynamic"] = False
+        fallback_applet["refresh_interval_ms"] = 0
+
+    def _validate_applets(self, start_time_to_applet):
+        # Check that all applets have a valid path.
+        for slot in start_time_to_applet.values():
+            for applet in UserConfig.get_rotation(slot):
+                UserConfig._validate_applet_path(applet)
+
+    @staticmethod
+    def _validate_applet_path(applet):
+        applet_path = path.abspath(applet["path"])
+        if not path.exists(applet_path):
+            applet_name = applet["name"]
+            raise SetupException(
+                f"Applet path '{applet_path}', for applet '{applet_name}', does not exist."
+            )
+
+    @staticmethod
+    def _setup_cmd_args(applet):
+        """
+        Sets applet["cmd_args"] to the pixlet arguments for the applet's schema_vals
+        """
+        cmd_args = []
+        if "schema_vals" in applet:
+            for key, val in applet["schema_vals"].items():
+                if isinstance(val, dict):
+                    cmd_args.append(f"{key}={json.dumps(val)}")
+                else:
+                    cmd_args.append(f"{key}={val}")
+
+        applet["cmd_args"] = cmd_args
 
     def _process_config(self, start_time_to_applet, start_time_to_brightness):
-        applets = SortedDict(UserConfig.identity_fn)
-        brightness = SortedDict(UserConfig.identity_fn)
+        # Applets and brightness are separate timelines: a brightness change doesn't change the
+        # applet on display, so it shouldn't cost a render.
+        self._applets = SortedDict(UserConfig.identity_fn)
+        self._brightness_schedule = SortedDict(UserConfig.identity_fn)
 
         # Setup applet specific information required to render the applet
         for start_time_str, applet in start_time_to_applet.items():
             start_time = UserConfig._parse_and_assert_time(start_time_str)
             applet["start_time"] = start_time
 
-            cmd_args = []
-            if "schema_vals" in applet:
-                for key, val in applet["schema_vals"].items():
-                    if isinstance(val, dict):
-                        cmd_args.append(f"{key}={json.dumps(val)}")
-                    else:
-                        cmd_args.append(f"{key}={val}")
-
-            applet["cmd_args"] = cmd_args
+            for member in UserConfig.get_rotation(applet):
+                UserConfig._setup_cmd_args(member)
 
-            applets[start_time] = applet
-
-        # If no brightness is provided, all applets have the default brightness.
-        if not start_time_to_brightness:
-            self._applets = applets
-            for start_time, applet in self._applets.items():
-                applet["brightness"] = 1.0
-            return
+            self._applets[start_time] = applet
 
-        # We have some brightness information.
-        brightness = SortedDict(UserConfig.identity_fn)
+        # If no brightness is provided, the schedule is empty and the brightness stays at 1.
         for start_time_str, entry in start_time_to_brightness.items():
             start_time = UserConfig._parse_and_assert_time(start_time_str)
-            brightness[start_time] = entry["value"]
-
-        start_times = set()
-        start_times.update(brightness.keys())
-        start_times.update(applets.keys())
-
-        self._applets = SortedDict(UserConfig.identity_fn)
-        # Start with the last applet and brightness of the day
-        last_applet = applets.peekitem(-1)[1]
-        last_brightness = brightness.peekitem(-1)[1]
-        for start_time in sorted(start_times):
-            if start_time in brightness:
-                last_brightness = brightness[start_time]
-            if start_time in applets:
-                last_applet = applets[start_time]
-
-            last_applet["brightness"] = last_brightness
-            last_applet["start_time"] = start_time
-            self._applets[start_time] = copy.deepcopy(last_applet)
+            self._brightness_schedule[start_time] = entry["value"]
 
     def should_setup_brightness_api(self):
         """
@@ -156,12 +244,154 @@ class UserConfig:
         """
         return self._should_setup_brightness_api
 
+    def get_process_scheduling(self):
+        """
+        Returns the ProcessScheduling object describing how the display and render processes
+        should be scheduled.
+        """
+        return self._process_scheduling
+
+    def get_render_format(self):
+        """
+        Returns the format pixlet should render applets to. One of scene.RENDER_FORMATS
+        """
+        return self._render_format
+
+    def get_display_backend(self):
+        """
+        Returns the backend the display should draw to. One of
+        display_controller.DISPLAY_BACKENDS, or remote_display.REMOTE_BACKEND
+        """
+        return self._display_backend
+
+    def get_display_listen_address(self):
+        """
+        Returns the address display agents connect to if the display backend is
+        remote_display.REMOTE_BACKEND. See scene_transport.parse_address
+        """
+        return self._display_listen_address
+
+    def should_idle_at_zero_brightness(self):
+        """
+        Returns True if rendering and panel refreshes should stop while the brightness is 0.
+        """
+        return self._idle_at_zero_brightness
+
+    def get_frame_stream_config(self):
+        """
+        Returns the FrameStreamConfig configured by "display" > "streaming". Streaming is
+        disabled if it is missing.
+        """
+        return self._frame_stream_config
+
+    def get_scene_library_size(self):
+        """
+        Returns the number of scenes the display keeps around to switch back to without
+        rendering or decoding them again. 0 if scenes shouldn't be kept.
+        """
+        return self._scene_library_size
+
+    def get_filter_schedule(self):
+        """
+        Returns the FilterSchedule configured by the "filters" section of the config. No filters
+        are applied if the section is missing.
+        """
+        return self._filter_schedule
+
+    def get_render_failure_policy(self):
+        """
+        Returns the RenderFailurePolicy configured by the "render_failures" section of the
+        config. Defaults are used if the section is missing.
+        """
+        return self._render_failure_policy
+
+    def should_setup_server(self):
+        """
+        Returns True if the REST API server should be started. The server is needed for the
+        brightness API, and can be enabled explicitly to query the script's state.
+        """
+        return self._should_setup_brightness_api or self._server_enabled
+
+    def get_tracer(self):
+        """
+        Returns the Tracer configured by the "tracing" section of the config. The Tracer is
+        disabled if the section is missing.
+        """
+        return self._tracer
+
+    def get_schedule(self):
+        """
+        returns a list of (start_time, applet) of every scheduled applet change, sorted by
+        start_time. start_time is in seconds since midnight.
+        """
+        return list(self._applets.items())
+
+    def get_brightness_schedule(self):
+        """
+        returns a list of (start_time, brightness) of every scheduled brightness change, sorted
+        by start_time. start_time is in seconds since midnight. Empty if the brightness isn't
+        scheduled.
+        """
+        return list(self._brightness_schedule.items())
+
+    def get_applet_names(self):
+        """
+        returns the names of all scheduled applets, including the applets of rotations.
+        """
+        return {
+            applet["name"]
+            for slot in self._applets.values()
+            for applet in UserConfig.get_rotation(slot)
+        }
+
+    @staticmethod
+    def get_rotation(slot):
+        """
+        returns the applets shown during the time slot, in order. A slot without a "rotation" is
+        a rotation of its own applet.
+        """
+        return slot.get("rotation", [slot])
+
+    @staticmethod
+    def get_invalid_schema_keys(allowed_keys, schema_vals):
+        """
+        returns the keys of schema_vals that aren't in allowed_keys or look like command line
+        flags, sorted.
+        """
+        return sorted(
+            key for key in schema_vals if key not in allowed_keys or key.startswith("-")
+        )
+
+    @staticmethod
+    def with_schema_vals(applet, schema_vals):
+        """
+        returns a copy of applet with schema_vals merged over its own, or applet itself if
+        schema_vals is empty. Used for one-off renders with different schema_vals.
+        Only keys the applet already has can be overridden: keys end up in pixlet's command
+        line, and anything else could pass it arbitrary flags.
+        """
+        if not schema_vals:
+            return applet
+
+        invalid_keys = UserConfig.get_invalid_schema_keys(
+            applet.get("schema_vals", {}), schema_vals
+        )
+        if invalid_keys:
+            raise ValueError(
+                f"Can't override schema_vals {invalid_keys} of '{applet['name']}'"
+            )
+
+        applet = copy.copy(applet)
+        applet["schema_vals"] = {**applet.get("schema_vals", {}), **schema_vals}
+        UserConfig._setup_cmd_args(applet)
+        return applet
+
     def get_current_applet(self):
         """
         returns (current_applet, next_applet_time)
         returns (current_applet, None) if there is only one applet
 
-        Called by main.py at the start and then again when get_day_time_secs() returns a
+        Called by main.py at the start and then again when clock.day_time_secs() returns a
         value >= the returned next_applet_time. For simplicity, this function doesn't make assumtions
         based on previous calls.
         """
@@ -171,22 +401,43 @@ class UserConfig:
         if len(self._applets) == 1:
             return (self._applets.peekitem(0)[1], None)
 
-        curr_time = UserConfig.get_day_time_secs()
-        curr_applet_idx = self._get_current_applet_idx(curr_time)
-        next_applet_idx = (curr_applet_idx + 1) % len(self._applets)
+        return self._get_current_entry(self._applets)
+
+    def get_current_brightness(self):
+        """
+        returns (current_brightness, next_brightness_time)
+        returns (current_brightness, None) if the brightness never changes
+
+        Like get_current_applet, but for the brightness schedule. Called by main.py at the start
+        and then again when clock.day_time_secs() returns a value >= next_brightness_time.
+        """
+        if len(self._brightness_schedule) == 0:
+            return (1.0, None)
+
+        if len(self._brightness_schedule) == 1:
+            return (self._brightness_schedule.peekitem(0)[1], None)
+
+        return self._get_current_entry(self._brightness_schedule)
 
-        curr_applet = self._applets.peekitem(curr_applet_idx)[1]
-        next_applet_time = self._applets.peekitem(next_applet_idx)[0]
+    def _get_current_entry(self, timeline):
+        """
+        returns (entry of timeline in effect now, start time of the entry after it). The last
+        entry of the day stays in effect until the first entry of the next day.
+        """
+        curr_time = self._clock.day_time_secs()
+        curr_idx = UserConfig._get_current_idx(timeline, curr_time)
+        next_idx = (curr_idx + 1) % len(timeline)
 
-        return (curr_applet, next_applet_time)
+        return (timeline.peekitem(curr_idx)[1], timeline.peekitem(next_idx)[0])
 
-    def _get_current_applet_idx(self, curr_time):
-        curr_idx = self._applets.bisect_key_left(curr_time)
+    @staticmethod
+    def _get_current_idx(timeline, curr_time):
+        curr_idx = timeline.bisect_key_left(curr_time)
 
-        if curr_idx == len(self._applets):
+        if curr_idx == len(timeline):
             return -1
 
-        if self._applets.peekitem(curr_idx)[0] == curr_time:
+        if timeline.peekitem(curr_idx)[0] == curr_time:
             return curr_idx
 
         return curr_idx - 1
@@ -209,19 +460,6 @@ class UserConfig:
 
         return (60 * 60 * hh) + (mm * 60)
 
-    @staticmethod
-    def get_day_time_secs():
-        """
-        returns the time passed in seconds since 00:00:00 hrs (midnight)
-        Time resolution is of seconds
-        output range: [0, 86340)
-        """
-        curr_time = time.localtime()
-        hh = int(time.strftime("%H", curr_time))
-        mm = int(time.strftime("%M", curr_time))
-        ss = int(time.strftime("%S", curr_time))
-        return (hh * 60 * 60) + (mm * 60) + ss
-
     @staticmethod
     def identity_fn(x):
         return x